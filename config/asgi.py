@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_asgi_application()
+
+# Граф лайков загружается при старте сервера, а не первым запросом.
+from matches.graph import start_like_graph  # noqa: E402
+
+start_like_graph()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -104,6 +105,10 @@ DATABASES = {
     "default": env.db()
 }
 
+# Кэш: по умолчанию в памяти процесса; для нескольких воркеров задайте
+# общий бэкенд через CACHE_URL (например, redis://... или filecache://...).
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -204,6 +209,86 @@ CORS_ALLOW_CREDENTIALS = True
 
 MAX_UPLOAD_SIZE = 5242880
 
+# Загрузка фотографий по частям (см. gallery.uploads): каталог временных
+# файлов и время жизни незавершенной загрузки (секунды)
+PHOTO_UPLOAD_TEMP_DIR = env(
+    "PHOTO_UPLOAD_TEMP_DIR",
+    default=os.path.join(tempfile.gettempdir(), "relatehub_uploads"),
+)
+PHOTO_UPLOAD_EXPIRY = 86400
+
+# Уменьшенные копии фотографий (см. gallery.renditions): длинная сторона в px
+PHOTO_RENDITION_SIZES = (128, 480, 1080)
+PHOTO_RENDITION_QUALITY = 80
+# Через сколько секунд фотография, забранная упавшим обработчиком
+# process_photos, снова попадает в очередь (см. gallery.processing)
+PHOTO_PROCESSING_CLAIM_TIMEOUT = 10 * 60
+
+# Файлы фотографий хранятся под хэшем содержимого (см. gallery.storage) и не
+# меняются, поэтому отдаются с Cache-Control: immutable на этот срок (секунды)
+PHOTO_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Материализованная колода рекомендаций (см. matches.models.DeckCard)
+DISCOVER_DECK_SIZE = 200
+DISCOVER_DECK_LOW_WATERMARK = 50
+# Сколько пользователей просматривается за одно пополнение колоды при обходе
+# по id (см. matches.models.DeckCardManager._scan)
+DISCOVER_REFILL_SCAN_LIMIT = 5000
+# Сколько новых кандидатов оценивается за пополнение вместе с карточками
+# колоды (в колоде остаются DISCOVER_DECK_SIZE лучших) и через сколько секунд
+# колода пополняется и переоценивается, даже если карточек достаточно
+DISCOVER_REFILL_POOL = 1000
+DISCOVER_DECK_RESCORE_SECONDS = 60 * 60
+# Ранжирование кандидатов при пополнении колоды (см. matches.ranking):
+# класс ранжирования и веса признаков
+DISCOVER_RANKER = "matches.ranking.CandidateRanker"
+DISCOVER_RANKING_WEIGHTS = {
+    "age": 1.0,
+    "city": 0.5,
+    "popularity": 0.3,
+    "recency": 0.7,
+    "reciprocal": 1.0,
+    "collaborative": 1.0,
+}
+# За сколько последних дней свайпы кандидата учитываются в признаке reciprocal
+DISCOVER_RANKING_STATS_DAYS = 30
+# Время жизни множества просмотренных пользователей в кэше (секунды)
+SEEN_SET_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Коллаборативные рекомендации (см. matches.recommendations): снимок индекса
+# лайков между запусками build_recommendations, размер top-K на пользователя,
+# предел соседей на кандидата и сколько рекомендаций подмешивать в колоду
+RECOMMENDATION_MATRIX_PATH = env(
+    "RECOMMENDATION_MATRIX_PATH",
+    default=os.path.join(BASE_DIR, "var", "swipe_matrix.npz"),
+)
+RECOMMENDATION_TOP_K = 100
+RECOMMENDATION_MAX_NEIGHBORS = 500
+DISCOVER_RECOMMENDED_PER_REFILL = 50
+
+# Граф лайков в памяти процесса (см. matches.graph): включение, как часто
+# догружать свайпы других процессов (секунды) и сколько изменений копить
+# поверх CSR до перестройки
+LIKE_GRAPH_ENABLED = env.bool("LIKE_GRAPH_ENABLED", default=False)
+LIKE_GRAPH_REFRESH_SECONDS = 5
+LIKE_GRAPH_MAX_DELTA = 100000
+# Через сколько секунд без догрузки граф перестает использоваться (столько же
+# хранятся удаленные лайки), как часто сверять живой граф с базой и сколько
+# пользователей проверять за раз
+LIKE_GRAPH_STALE_SECONDS = 60 * 60
+LIKE_GRAPH_CHECK_SECONDS = 10 * 60
+LIKE_GRAPH_CHECK_SAMPLE = 100
+
+# Количество шардов счетчика лайков (см. profiles.models.LikeCounterShard)
+LIKE_COUNTER_SHARDS = 8
+
+# Как часто перестраивать индекс автодополнения городов (секунды)
+CITY_INDEX_TTL = 300
+
+# Время жизни закэшированных страниц discover (секунды). Свои изменения
+# пользователя сбрасывают кэш сразу, изменения чужих профилей — по таймауту.
+DISCOVER_CACHE_TIMEOUT = 60
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'RelateHub Dating API',
     'DESCRIPTION': 'Документация для приложения знакомств RelateHub.',
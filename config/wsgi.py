@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+# Граф лайков загружается при старте сервера, а не первым запросом.
+from matches.graph import start_like_graph  # noqa: E402
+
+start_like_graph()
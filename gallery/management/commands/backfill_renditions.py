@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from gallery.models import Photo, sync_main_photo
+from gallery.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Строит уменьшенные копии для обработанных фотографий, у которых их еще нет."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Перестроить копии для всех фотографий.",
+        )
+
+    def handle(self, *args, **options):
+        photos = Photo.objects.ready().order_by("id")
+        if not options["all"]:
+            photos = photos.filter(renditions={})
+
+        generated = 0
+        failed = 0
+        users = set()
+        for photo in photos.iterator(chunk_size=100):
+            if generate_renditions(photo):
+                generated += 1
+                users.add(photo.user_id)
+            else:
+                failed += 1
+
+        for user_id in users:
+            sync_main_photo(user_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Построены копии для фотографий: {generated}, ошибок: {failed}."
+            )
+        )
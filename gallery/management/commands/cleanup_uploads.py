@@ -0,0 +1,41 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gallery.models import PhotoUpload
+
+
+class Command(BaseCommand):
+    help = "Удаляет незавершенные загрузки фотографий и их временные файлы."
+
+    def handle(self, *args, **options):
+        expiry = settings.PHOTO_UPLOAD_EXPIRY
+        cutoff = timezone.now() - timedelta(seconds=expiry)
+
+        deleted, _ = PhotoUpload.objects.filter(created_at__lt=cutoff).delete()
+
+        # Временные файлы, для которых записи уже нет (например, после сбоя).
+        orphaned = 0
+        temp_dir = settings.PHOTO_UPLOAD_TEMP_DIR
+        if os.path.isdir(temp_dir):
+            active = {
+                f"{pk}.part" for pk in PhotoUpload.objects.values_list("pk", flat=True)
+            }
+            for entry in os.scandir(temp_dir):
+                if (
+                    entry.is_file()
+                    and entry.name not in active
+                    and entry.stat().st_mtime < time.time() - expiry
+                ):
+                    os.remove(entry.path)
+                    orphaned += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено загрузок: {deleted}, временных файлов: {orphaned}."
+            )
+        )
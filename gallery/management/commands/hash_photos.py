@@ -0,0 +1,42 @@
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+
+from gallery.models import Photo, sync_main_photo
+from gallery.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит файлы фотографий, загруженных до контентно-адресуемого "
+        "хранения, под имена по хэшу содержимого и перестраивает их копии."
+    )
+
+    def handle(self, *args, **options):
+        moved = 0
+        missing = 0
+        users = set()
+        photos = Photo.objects.filter(content_hash="").order_by("id")
+        for photo in photos.iterator(chunk_size=100):
+            try:
+                with photo.image.open("rb") as source:
+                    data = source.read()
+            except OSError:
+                missing += 1
+                continue
+
+            # Старый файл освобождается в post_save, если он больше не нужен.
+            photo.image.save(photo.image.name, ContentFile(data), save=False)
+            photo.save(update_fields=["image", "content_hash", "updated_at"])
+            if photo.status == Photo.Status.READY:
+                generate_renditions(photo)
+            moved += 1
+            users.add(photo.user_id)
+
+        for user_id in users:
+            sync_main_photo(user_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Перенесено фотографий: {moved}, файлов не найдено: {missing}."
+            )
+        )
@@ -0,0 +1,70 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from gallery.processing import process_pending_photos
+
+
+class Command(BaseCommand):
+    help = (
+        "Обрабатывает загруженные фотографии: проверка, удаление EXIF и "
+        "построение копий в пуле процессов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Размер пула процессов; 0 — обрабатывать в текущем процессе.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Сколько фотографий забирать за один проход.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Пауза (секунды) между проверками, когда очередь пуста.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать текущую очередь и завершиться.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        batch_size = options["batch_size"] or max(workers, 1) * 4
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        processed = 0
+        try:
+            while True:
+                try:
+                    count = process_pending_photos(executor, batch_size=batch_size)
+                except BrokenProcessPool:
+                    # Фотографии упавшего пула уже отмечены неудачными.
+                    self.stderr.write("Пул процессов упал, создается заново.")
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers=workers)
+                    continue
+                processed += count
+                if count:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано фотографий: {processed}."))
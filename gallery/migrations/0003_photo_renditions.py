@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0002_photo_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0003_photo_renditions"),
+    ]
+
+    operations = [
+        # Уже загруженные фотографии считаются обработанными.
+        migrations.AddField(
+            model_name="photo",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готова"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="ready",
+                editable=False,
+                max_length=10,
+                verbose_name="Статус обработки",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("processing", "Обрабатывается"),
+                    ("ready", "Готова"),
+                    ("failed", "Ошибка обработки"),
+                ],
+                default="processing",
+                editable=False,
+                max_length=10,
+                verbose_name="Статус обработки",
+            ),
+        ),
+    ]
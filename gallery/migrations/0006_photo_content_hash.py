@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+import gallery.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0005_photoupload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, editable=False, max_length=64
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="image",
+            field=gallery.storage.ContentAddressedImageField(
+                db_index=True,
+                hash_field="content_hash",
+                storage=gallery.storage.ContentAddressedStorage(),
+                upload_to="profile_photos/",
+                verbose_name="Файл изображения",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_positions(apps, schema_editor):
+    """
+    Нумерует фотографии каждого пользователя в порядке загрузки и оставляет
+    одну главную (измененную последней) перед созданием уникального индекса.
+    """
+    Photo = apps.get_model("gallery", "Photo")
+
+    photos = list(
+        Photo.objects.order_by("user_id", "uploaded_at", "id").only(
+            "id", "user_id", "is_main", "updated_at"
+        )
+    )
+    positions = {}
+    main = {}
+    for photo in photos:
+        photo.position = positions.get(photo.user_id, 0)
+        positions[photo.user_id] = photo.position + 1
+        current = main.get(photo.user_id)
+        if photo.is_main and (
+            current is None or photo.updated_at >= current.updated_at
+        ):
+            main[photo.user_id] = photo
+
+    for photo in photos:
+        photo.is_main = main.get(photo.user_id) is photo
+    Photo.objects.bulk_update(photos, ["position", "is_main"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0006_photo_content_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="photo",
+            options={
+                "ordering": ["-is_main", "position", "id"],
+                "verbose_name": "Фотография профиля",
+                "verbose_name_plural": "Фотографии профилей",
+            },
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="position",
+            field=models.PositiveIntegerField(default=0, verbose_name="Порядок"),
+        ),
+        migrations.RunPython(fill_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="photo",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_main", True)),
+                fields=("user",),
+                name="photo_one_main_per_user",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0007_photo_position"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,12 +1,119 @@
+import os
+import uuid
+
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import pre_save
+from django.db import models, transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django_cleanup import cleanup
+
+from users.cache import bump_cache_version
+
+from .storage import ContentAddressedImageField, photo_storage
+
+
+class PhotoQuerySet(models.QuerySet):
+    def ready(self):
+        """Фотографии, прошедшие обработку; только они видны другим пользователям."""
+        return self.filter(status=Photo.Status.READY)
+
+    def gallery_state(self, user):
+        """Количество фотографий пользователя и следующая свободная позиция."""
+        return self.filter(user=user).aggregate(
+            count=Count("id"), next_position=Coalesce(Max("position") + 1, 0)
+        )
+
+    def apply_changes(
+        self, user, images=(), order=None, main=None, main_index=None, limit=None
+    ):
+        """
+        Добавляет пачку фотографий, меняет порядок и главную фотографию
+        пользователя в одной транзакции за постоянное число запросов: выборка
+        текущих фотографий с блокировкой, сброс прежней главной, bulk_create
+        новых и один bulk_update позиций.
+
+        order — id всех существующих фотографий в новом порядке (новые
+        добавляются следом в порядке images); main — id существующей
+        фотографии или main_index — индекс новой среди images, которая станет
+        главной. Возвращает все фотографии пользователя в новом порядке; при
+        некорректных данных возбуждает ValueError.
+        """
+        images = list(images)
+        with transaction.atomic():
+            existing = list(
+                self.select_for_update().filter(user=user).order_by("position", "id")
+            )
+            if limit is not None and len(existing) + len(images) > limit:
+                raise ValueError(
+                    f"Вы достигли лимита в {limit} фотографий. Удалите старые фото, чтобы добавить новые."
+                )
+
+            by_id = {photo.pk: photo for photo in existing}
+            if order is not None:
+                if len(order) != len(by_id) or set(order) != set(by_id):
+                    raise ValueError(
+                        "Порядок должен содержать каждую фотографию пользователя ровно один раз."
+                    )
+                existing = [by_id[pk] for pk in order]
+            if main is not None and main not in by_id:
+                raise ValueError("Фотография не найдена.")
+            if main_index is not None and main_index >= len(images):
+                raise ValueError("Нет загружаемой фотографии с таким индексом.")
+            if not existing and main_index is None and images:
+                # Первая фотография пользователя становится главной.
+                main_index = 0
+
+            now = timezone.now()
+            if main is not None or main_index is not None:
+                # Прежняя главная сбрасывается до вставки новой: уникальный
+                # индекс проверяется построчно.
+                self.filter(user=user, is_main=True).update(
+                    is_main=False, updated_at=now
+                )
+                for photo in existing:
+                    photo.is_main = photo.pk == main
+
+            new = [
+                self.model(user=user, image=image, is_main=index == main_index)
+                for index, image in enumerate(images)
+            ]
+            photos = existing + new
+            for position, photo in enumerate(photos):
+                photo.position = position
+                photo.updated_at = now
+
+            if existing:
+                self.bulk_update(existing, ["position", "is_main", "updated_at"])
+            if new:
+                self.bulk_create(new)
+
+            # bulk-операции не отправляют сигналы сохранения.
+            for photo in new:
+                keep_stored_files(photo)
+            sync_main_photo(user.pk)
+        bump_cache_version(user.pk)
+        return photos
+
+
+def ready_photos_prefetch(lookup):
+    """Prefetch фотографий по lookup, ограниченный обработанными фотографиями."""
+    return Prefetch(lookup, queryset=Photo.objects.ready())
 
 
 # Create your models here.
+# Файлы фотографий общие для одинаковых загрузок, поэтому удаляются по
+# подсчету ссылок (release_photo_files), а не django_cleanup.
+@cleanup.ignore
 class Photo(models.Model):
+    class Status(models.TextChoices):
+        PROCESSING = "processing", _("Обрабатывается")
+        READY = "ready", _("Готова")
+        FAILED = "failed", _("Ошибка обработки")
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -14,27 +121,211 @@ class Photo(models.Model):
         verbose_name=_("Пользователь"),
     )
 
-    # Само изображение
-    image = models.ImageField(
-        upload_to="profile_photos/", verbose_name=_("Файл изображения")
+    # Само изображение, хранится под SHA-256 содержимого (см. gallery.storage)
+    image = ContentAddressedImageField(
+        upload_to="profile_photos/",
+        storage=photo_storage,
+        hash_field="content_hash",
+        db_index=True,
+        verbose_name=_("Файл изображения"),
+    )
+    content_hash = models.CharField(
+        max_length=64, blank=True, db_index=True, editable=False
     )
 
     is_main = models.BooleanField(default=False, verbose_name=_("Главная фотография"))
+    position = models.PositiveIntegerField(default=0, verbose_name=_("Порядок"))
+
+    # Уменьшенные копии: {"128": "profile_photos/renditions/...webp", ...}
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Проверка, очистка EXIF и построение копий выполняются вне запроса
+    # командой process_photos.
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PROCESSING,
+        editable=False,
+        verbose_name=_("Статус обработки"),
+    )
+    # Когда фотографию забрал обработчик process_photos; забранные и не
+    # обработанные за PHOTO_PROCESSING_CLAIM_TIMEOUT забираются снова.
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PhotoQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Фотография профиля")
         verbose_name_plural = _("Фотографии профилей")
-        ordering = ["-is_main", "-uploaded_at"]
+        ordering = ["-is_main", "position", "id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                condition=Q(is_main=True),
+                name="photo_one_main_per_user",
+            ),
+        ]
 
     def __str__(self):
         return f"Фото {self.id} пользователя {self.user.email}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+
+    def _remember_state(self):
+        # Файлы, на которые ссылалась загруженная из базы строка: после
+        # замены изображения старые файлы освобождаются в post_save.
+        image = self.__dict__.get("image")
+        self._loaded_files = (
+            getattr(image, "name", image) or "",
+            self.__dict__.get("renditions") or {},
+        )
+        self._loaded_is_main = self.__dict__.get("is_main", False)
+
+
+class PhotoUpload(models.Model):
+    """
+    Незавершенная загрузка фотографии по частям. Данные накапливаются во
+    временном файле temp_path, received — сколько байт уже принято подряд
+    с начала файла (см. gallery.uploads).
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="photo_uploads",
+    )
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveIntegerField()
+    received = models.PositiveIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Загрузка фотографии")
+        verbose_name_plural = _("Загрузки фотографий")
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.PHOTO_UPLOAD_TEMP_DIR, f"{self.pk}.part")
+
+
+@receiver(post_delete, sender=PhotoUpload)
+def remove_upload_temp_file(sender, instance, **kwargs):
+    try:
+        os.remove(instance.temp_path)
+    except FileNotFoundError:
+        pass
+
+
+def _referenced_renditions(names):
+    # Имя копии начинается с хэша оригинала, поэтому ссылаться на нее могут
+    # только фотографии с тем же content_hash.
+    sources = {os.path.basename(name).split("_")[0] for name in names}
+    referenced = set()
+    for renditions in Photo.objects.filter(content_hash__in=sources).values_list(
+        "renditions", flat=True
+    ):
+        referenced.update(renditions.values())
+    return referenced
+
+
+def release_photo_files(image_name="", renditions=None):
+    """
+    После фиксации транзакции удаляет оригинал и копии, если на них больше
+    не ссылается ни одна фотография. Число ссылок считается по индексам
+    image и content_hash в момент удаления.
+    """
+    names = list((renditions or {}).values())
+    if not image_name and not names:
+        return
+
+    def release():
+        if image_name:
+            photo_storage.delete_unreferenced(
+                image_name, Photo.objects.filter(image=image_name).exists
+            )
+        for name in names:
+            photo_storage.delete_unreferenced(
+                name, lambda: name in _referenced_renditions([name])
+            )
+
+    transaction.on_commit(release)
+
+
+def keep_stored_files(photo):
+    """
+    После фиксации транзакции восстанавливает файлы, сохраненные для photo,
+    если параллельный release_photo_files удалил их до того, как ссылка
+    стала видна (см. gallery.storage).
+    """
+    stored = photo.__dict__.pop("_stored_files", {})
+    referenced = {photo.image.name, *(photo.renditions or {}).values()}
+    stored = {name: content for name, content in stored.items() if name in referenced}
+    if not stored:
+        return
+
+    def restore():
+        for name, content in stored.items():
+            photo_storage.restore(name, content)
+
+    transaction.on_commit(restore)
+
 
 @receiver(pre_save, sender=Photo)
 def set_main_photo_unique(sender, instance, **kwargs):
-    if instance.is_main:
+    # Прежняя главная сбрасывается, только когда фотография становится
+    # главной, а не при каждом сохранении главной фотографии.
+    if instance.is_main and not getattr(instance, "_loaded_is_main", False):
         Photo.objects.filter(user=instance.user, is_main=True).exclude(
             pk=instance.pk
-        ).update(is_main=False)
+        ).update(is_main=False, updated_at=timezone.now())
+
+
+def sync_main_photo(user_id):
+    """
+    Сохраняет в профиль путь главной фотографии пользователя (или первой
+    фотографии, если главная не выбрана), чтобы списки профилей не делали
+    отдельных запросов за фотографиями. Учитываются только обработанные
+    фотографии.
+    """
+    from profiles.models import Profile
+
+    image, renditions = Photo.objects.ready().filter(user_id=user_id).values_list(
+        "image", "renditions"
+    ).first() or ("", {})
+    Profile.objects.filter(user_id=user_id).update(
+        main_photo_path=image,
+        main_photo_renditions=renditions,
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=Photo)
+def sync_main_photo_on_save(sender, instance, **kwargs):
+    image_name, renditions = getattr(instance, "_loaded_files", ("", {}))
+    current = set((instance.renditions or {}).values())
+    release_photo_files(
+        image_name if image_name != instance.image.name else "",
+        {size: name for size, name in renditions.items() if name not in current},
+    )
+    keep_stored_files(instance)
+    instance._remember_state()
+
+    sync_main_photo(instance.user_id)
+    bump_cache_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Photo)
+def sync_main_photo_on_delete(sender, instance, **kwargs):
+    release_photo_files(instance.image.name, instance.renditions)
+    sync_main_photo(instance.user_id)
+    bump_cache_version(instance.user_id)
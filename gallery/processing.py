@@ -0,0 +1,177 @@
+"""
+Обработка загруженных фотографий вне HTTP-запроса.
+
+Запрос только сохраняет файл и создает Photo в статусе processing. Команда
+process_photos забирает такие фотографии пачками, отдает байты в пул
+процессов (декодирование, проверка, удаление EXIF, построение копий — чистая
+CPU-работа без обращений к базе), а результаты записывает в основном процессе.
+
+Пачка забирается под SELECT ... FOR UPDATE SKIP LOCKED с отметкой claimed_at,
+поэтому несколько обработчиков не берут одни и те же фотографии. Результат
+записывается, только если фотография все еще забрана этим обработчиком: ее
+не удалили и не заменили изображение за время обработки.
+"""
+
+import io
+import logging
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Photo, release_photo_files
+from .renditions import render_renditions, store_renditions
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF"}
+# Параметры повторного сохранения оригинала без метаданных.
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 90, "optimize": True},
+    "PNG": {"optimize": True},
+}
+
+PROCESSING_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+
+
+def process_image(data, sizes, quality):
+    """
+    Проверяет изображение, удаляет EXIF (с учетом ориентации) и строит копии.
+
+    Возвращает (очищенный оригинал или None, если оригинал не менялся;
+    словарь копий). Выполняется в процессе пула, поэтому получает все
+    параметры явно и не обращается к настройкам Django.
+    """
+    with Image.open(io.BytesIO(data)) as probe:
+        if probe.format not in ALLOWED_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат изображения: {probe.format}")
+        probe.verify()
+
+    cleaned = None
+    with Image.open(io.BytesIO(data)) as source:
+        # В GIF нет EXIF, а пересохранение потеряло бы анимацию.
+        if source.format != "GIF":
+            image_format = source.format
+            image = ImageOps.exif_transpose(source)
+            output = io.BytesIO()
+            image.save(output, format=image_format, **SAVE_OPTIONS[image_format])
+            cleaned = output.getvalue()
+
+    return cleaned, render_renditions(cleaned or data, sizes=sizes, quality=quality)
+
+
+def _read(photo):
+    with photo.image.open("rb") as source:
+        return source.read()
+
+
+def _claim(batch_size):
+    """
+    Забирает до batch_size фотографий в статусе processing, которые никто
+    не обрабатывает (или чей обработчик не уложился в таймаут).
+    """
+    stale = timezone.now() - timedelta(seconds=settings.PHOTO_PROCESSING_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        photos = list(
+            Photo.objects.select_for_update(skip_locked=True)
+            .filter(status=Photo.Status.PROCESSING)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+            .order_by("id")[:batch_size]
+        )
+        claimed_at = timezone.now()
+        Photo.objects.filter(pk__in=[photo.pk for photo in photos]).update(
+            claimed_at=claimed_at
+        )
+    for photo in photos:
+        photo.claimed_at = claimed_at
+    return photos
+
+
+def _claimed(photo):
+    return Photo.objects.filter(
+        pk=photo.pk, status=Photo.Status.PROCESSING, claimed_at=photo.claimed_at
+    )
+
+
+def _finish(photo, cleaned, renditions):
+    # Очищенный оригинал сохраняется под новым хэшем; файл исходной загрузки
+    # и прежние копии освобождает post_save, если на них нет других ссылок.
+    if cleaned is not None:
+        photo.image.save(photo.image.name, ContentFile(cleaned), save=False)
+
+    photo.renditions = store_renditions(photo, renditions)
+    photo.status = Photo.Status.READY
+    try:
+        with transaction.atomic():
+            if not _claimed(photo).select_for_update().exists():
+                raise DatabaseError("Фотография больше не забрана обработчиком.")
+            photo.save(
+                update_fields=[
+                    "image",
+                    "content_hash",
+                    "renditions",
+                    "status",
+                    "updated_at",
+                ]
+            )
+    except DatabaseError:
+        # Фотографию удалили или заменили изображение, пока она обрабатывалась.
+        release_photo_files(photo.image.name, photo.renditions)
+
+
+def _fail(photo):
+    logger.warning("Фотография %s не прошла обработку", photo.pk)
+    _claimed(photo).update(status=Photo.Status.FAILED, updated_at=timezone.now())
+
+
+def process_pending_photos(executor=None, batch_size=20):
+    """
+    Обрабатывает до batch_size фотографий в статусе processing. Если executor
+    не передан, работа выполняется в текущем процессе. Возвращает количество
+    обработанных фотографий (включая неудачные).
+
+    Если процесс пула упал (например, при декодировании изображения), его
+    фотографии отмечаются неудачными, а после записи остальных результатов
+    поднимается BrokenProcessPool, чтобы вызывающий код пересоздал пул.
+    """
+    photos = _claim(batch_size)
+    args = (tuple(settings.PHOTO_RENDITION_SIZES), settings.PHOTO_RENDITION_QUALITY)
+
+    pending = []
+    for photo in photos:
+        try:
+            data = _read(photo)
+        except OSError:
+            _fail(photo)
+            continue
+
+        if executor is None:
+            try:
+                result = process_image(data, *args)
+            except PROCESSING_ERRORS:
+                _fail(photo)
+            else:
+                _finish(photo, *result)
+        else:
+            pending.append((photo, executor.submit(process_image, data, *args)))
+
+    broken = None
+    for photo, future in pending:
+        try:
+            result = future.result()
+        except PROCESSING_ERRORS:
+            _fail(photo)
+        except BrokenProcessPool as error:
+            _fail(photo)
+            broken = error
+        else:
+            _finish(photo, *result)
+
+    if broken is not None:
+        raise broken
+    return len(photos)
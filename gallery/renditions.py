@@ -0,0 +1,121 @@
+"""
+Уменьшенные копии (rendition) фотографий профиля.
+
+Для каждой фотографии хранится набор копий фиксированных размеров по длинной
+стороне (settings.PHOTO_RENDITION_SIZES) в формате WEBP. Карточки и списки
+запрашивают подходящий размер вместо оригинала.
+
+Имя копии строится из хэша оригинала, размера и хэша самой копии
+(profile_photos/renditions/ab/<хэш оригинала>_480_<хэш копии>.webp): копии
+одинаковых оригиналов общие, а перестроенная копия получает новое имя, так
+что URL копии можно кэшировать бессрочно.
+
+render_renditions работает только с байтами и не обращается к базе и
+хранилищу, поэтому его можно вызывать в отдельном процессе.
+"""
+
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .storage import remember_stored_file
+
+logger = logging.getLogger(__name__)
+
+RENDITION_DIR = "profile_photos/renditions"
+RENDITION_EXTENSION = "webp"
+
+
+def render_renditions(data, sizes=None, quality=None):
+    """
+    Строит копии изображения для каждого размера. Возвращает словарь
+    {размер: байты WEBP}. Изображение не увеличивается: если оригинал меньше
+    размера, копия получается размером с оригинал.
+    """
+    sizes = sizes or settings.PHOTO_RENDITION_SIZES
+    quality = quality or settings.PHOTO_RENDITION_QUALITY
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert(
+                "RGBA" if "transparency" in image.info or "A" in image.mode else "RGB"
+            )
+
+        renditions = {}
+        for size in sorted(sizes, reverse=True):
+            # Каждая следующая копия строится из предыдущей, большей.
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            image.save(
+                output,
+                format=RENDITION_EXTENSION.upper(),
+                quality=quality,
+                method=4,
+            )
+            renditions[size] = output.getvalue()
+    return renditions
+
+
+def rendition_name(photo, size, data):
+    source = (
+        photo.content_hash or os.path.splitext(os.path.basename(photo.image.name))[0]
+    )
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    return (
+        f"{RENDITION_DIR}/{source[:2]}/{source}_{size}_{digest}.{RENDITION_EXTENSION}"
+    )
+
+
+def store_renditions(photo, renditions):
+    """
+    Сохраняет копии в хранилище фотографий и возвращает словарь
+    {размер (строкой): имя файла} для поля Photo.renditions.
+    """
+    storage = photo.image.storage
+    stored = {}
+    for size, data in sorted(renditions.items()):
+        content = ContentFile(data)
+        stored[str(size)] = storage.save(rendition_name(photo, size, data), content)
+        remember_stored_file(photo, stored[str(size)], content)
+    return stored
+
+
+def generate_renditions(photo):
+    """
+    Строит и сохраняет копии фотографии, заменяя существующие. Возвращает
+    False, если файл не удалось прочитать как изображение.
+    """
+    from .models import Photo, keep_stored_files, release_photo_files
+
+    try:
+        with photo.image.open("rb") as source:
+            data = source.read()
+        renditions = render_renditions(data)
+    except (OSError, Image.DecompressionBombError, SyntaxError, ValueError):
+        logger.warning("Не удалось построить копии фотографии %s", photo.pk)
+        return False
+
+    previous = photo.renditions
+    photo.renditions = store_renditions(photo, renditions)
+    Photo.objects.filter(pk=photo.pk).update(
+        renditions=photo.renditions, updated_at=timezone.now()
+    )
+    keep_stored_files(photo)
+    release_photo_files(renditions=previous)
+    return True
+
+
+def rendition_urls(renditions, storage, request=None):
+    """Превращает словарь {размер: имя файла} в словарь {размер: URL}."""
+    urls = {}
+    for size, name in (renditions or {}).items():
+        url = storage.url(name)
+        urls[size] = request.build_absolute_uri(url) if request else url
+    return urls
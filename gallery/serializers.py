@@ -1,14 +1,20 @@
+from django.conf import settings
 from django.template.defaultfilters import filesizeformat
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from .models import Photo
+from .models import Photo, PhotoUpload
+from .renditions import rendition_urls
 
-MAX_UPLOAD_SIZE = 5242880
+MAX_UPLOAD_SIZE = settings.MAX_UPLOAD_SIZE
 ALLOWED_CONTENT_TYPES = ["image/jpeg", "image/png", "image/gif"]
 
 
 class PhotoSerializer(serializers.ModelSerializer):
+    # FileField вместо ImageField: изображение декодируется и проверяется
+    # не в запросе, а командой process_photos (см. gallery.processing).
+    image = serializers.FileField()
+    sizes = serializers.SerializerMethodField()
 
     class Meta:
         model = Photo
@@ -16,7 +22,17 @@ class PhotoSerializer(serializers.ModelSerializer):
             "id",
             "image",
             "is_main",
+            "position",
+            "status",
+            "sizes",
         ]
+        read_only_fields = ["position", "status"]
+
+    def get_sizes(self, obj):
+        """Уменьшенные копии фотографии: {"128": URL, "480": URL, ...}."""
+        return rendition_urls(
+            obj.renditions, obj.image.storage, self.context.get("request")
+        )
 
     @staticmethod
     def validate_image(value):
@@ -33,3 +49,68 @@ class PhotoSerializer(serializers.ModelSerializer):
                 f"Поддерживаются только форматы: {', '.join(ALLOWED_CONTENT_TYPES)}."
             )
         return value
+
+
+class PhotoBulkSerializer(serializers.Serializer):
+    """
+    Пакетное изменение галереи: новые файлы, порядок существующих фотографий
+    (id всех фотографий пользователя) и главная фотография — существующая
+    (main) или одна из загружаемых (main_index).
+    """
+
+    images = serializers.ListField(
+        child=serializers.FileField(validators=[PhotoSerializer.validate_image]),
+        required=False,
+        default=list,
+    )
+    order = serializers.ListField(child=serializers.IntegerField(), required=False)
+    main = serializers.IntegerField(required=False)
+    main_index = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        if "main" in attrs and "main_index" in attrs:
+            raise ValidationError("Укажите только main или main_index.")
+        return attrs
+
+
+class PhotoUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source="received", read_only=True)
+
+    class Meta:
+        model = PhotoUpload
+        fields = [
+            "id",
+            "filename",
+            "content_type",
+            "size",
+            "sha256",
+            "offset",
+            "created_at",
+        ]
+        extra_kwargs = {"sha256": {"write_only": True}}
+
+    @staticmethod
+    def validate_size(value):
+        """Размер проверяется до передачи данных."""
+        if value <= 0:
+            raise ValidationError("Размер файла должен быть больше нуля.")
+        if value > MAX_UPLOAD_SIZE:
+            raise ValidationError(
+                f"Размер файла слишком большой. Максимальный размер: {filesizeformat(MAX_UPLOAD_SIZE)}."
+            )
+        return value
+
+    @staticmethod
+    def validate_content_type(value):
+        if value not in ALLOWED_CONTENT_TYPES:
+            raise ValidationError(
+                f"Поддерживаются только форматы: {', '.join(ALLOWED_CONTENT_TYPES)}."
+            )
+        return value
+
+    @staticmethod
+    def validate_sha256(value):
+        value = value.lower()
+        if value and (len(value) != 64 or set(value) - set("0123456789abcdef")):
+            raise ValidationError("Ожидается SHA-256 в шестнадцатеричном виде.")
+        return value
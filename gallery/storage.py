@@ -0,0 +1,169 @@
+"""
+Контентно-адресуемое хранение файлов фотографий.
+
+Оригинал хранится под именем, производным от SHA-256 содержимого
+(profile_photos/ab/abcdef....jpg), копии — под именем, производным от хэша
+оригинала и собственного содержимого. Повторная загрузка той же картинки не
+дублирует байты на диске, а содержимое файла под данным именем никогда не
+меняется, поэтому URL можно кэшировать бессрочно (Cache-Control: immutable).
+
+Один файл могут использовать несколько фотографий, поэтому django_cleanup
+для Photo отключен: файлы удаляет gallery.models.release_photo_files, когда
+на них не остается ссылок.
+
+Удаление неиспользуемого файла и запись переиспользованного идут под
+файловой блокировкой имени. Ссылка на переиспользованный файл становится
+видна только после фиксации транзакции, поэтому после фиксации сохранивший
+его код под той же блокировкой проверяет файл и записывает заново, если
+параллельное удаление успело его убрать (см. gallery.models.keep_stored_files).
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import ImageField, ImageFieldFile
+
+HASH_READ_SIZE = 64 * 1024
+# Файлы с такими именами неизменяемы: содержимое определяет имя.
+CONTENT_ADDRESSED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}[^/]*$")
+# Блокировки имен распределяются по стольким файлам в LOCK_DIR.
+LOCK_STRIPES = 256
+LOCK_DIR = ".locks"
+
+
+def content_hash(content):
+    """Считает SHA-256 файла блоками и возвращает позицию чтения в начало."""
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks(HASH_READ_SIZE):
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def sharded_name(directory, digest, suffix):
+    """Имя файла в подкаталоге по первым двум символам хэша."""
+    return f"{directory}/{digest[:2]}/{digest}{suffix}"
+
+
+def is_immutable_name(name):
+    return bool(CONTENT_ADDRESSED_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя однозначно определяет содержимое: если файл с
+    таким именем уже есть, он переиспользуется, а не сохраняется рядом под
+    новым именем. Запись атомарна (через временный файл и os.replace), так
+    что параллельная загрузка одинаковых файлов не оставляет обрезанных копий.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    @contextmanager
+    def lock(self, name):
+        """Эксклюзивная блокировка имени между процессами одного хранилища."""
+        stripe = int(hashlib.sha256(name.encode()).hexdigest(), 16) % LOCK_STRIPES
+        directory = os.path.join(self.location, LOCK_DIR)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{stripe:02x}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def delete_unreferenced(self, name, is_referenced):
+        """Удаляет файл, если is_referenced() под блокировкой имени ложно."""
+        with self.lock(name):
+            if not is_referenced():
+                self.delete(name)
+
+    def restore(self, name, content):
+        """Записывает файл заново, если его удалили после сохранения."""
+        with self.lock(name):
+            if not self.exists(name):
+                self._save(name, content)
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                for chunk in content.chunks():
+                    target.write(chunk)
+            os.chmod(
+                temp_path,
+                (
+                    self.file_permissions_mode
+                    if self.file_permissions_mode is not None
+                    else 0o644
+                ),
+            )
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+photo_storage = ContentAddressedStorage()
+
+
+class ContentAddressedImageFieldFile(ImageFieldFile):
+    def save(self, name, content, save=True):
+        digest = content_hash(content)
+        suffix = os.path.splitext(name)[1].lower()
+        if self.field.hash_field:
+            setattr(self.instance, self.field.hash_field, digest)
+        super().save(f"{digest}{suffix}", content, save)
+        remember_stored_file(self.instance, self.name, content)
+
+
+def remember_stored_file(instance, name, content):
+    """
+    Запоминает содержимое сохраненного файла модели до фиксации транзакции,
+    чтобы восстановить файл, если его успеют удалить (см. модуль).
+    """
+    instance.__dict__.setdefault("_stored_files", {})[name] = content
+
+
+class ContentAddressedImageField(ImageField):
+    """
+    ImageField, сохраняющий файл под SHA-256 содержимого. Хэш дополнительно
+    записывается в поле модели hash_field (по аналогии с width_field).
+    """
+
+    attr_class = ContentAddressedImageFieldFile
+
+    def __init__(self, *args, hash_field=None, **kwargs):
+        self.hash_field = hash_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.hash_field:
+            kwargs["hash_field"] = self.hash_field
+        return name, path, args, kwargs
+
+    def generate_filename(self, instance, filename):
+        # upload_to задает только каталог; имя уже равно хэшу содержимого.
+        stem, suffix = os.path.splitext(os.path.basename(filename))
+        return self.storage.generate_filename(
+            sharded_name(self.upload_to.rstrip("/"), stem, suffix)
+        )
@@ -1,15 +1,32 @@
+import datetime
+import hashlib
+import io
 import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.test import APITestCase
 
-from .models import Photo
+from profiles.models import Profile
+
+from .models import Photo, PhotoUpload, release_photo_files
+from .processing import process_image, process_pending_photos
 from .serializers import MAX_UPLOAD_SIZE, PhotoSerializer
-from .views import PHOTO_UPLOAD_LIMIT
+from .uploads import UploadConflict, write_chunk
+from .views import PHOTO_UPLOAD_LIMIT, serve_media
 
 User = get_user_model()
 
@@ -40,9 +57,18 @@ class PhotoGalleryTestCase(APITestCase):
 
     def tearDown(self):
         for photo in Photo.objects.all():
+            for name in photo.renditions.values():
+                photo.image.storage.delete(name)
             if os.path.exists(photo.image.path):
                 os.remove(photo.image.path)
 
+    @staticmethod
+    def make_jpeg(width, height, name="photo.jpg", exif=None):
+        buffer = io.BytesIO()
+        image = Image.new("RGB", (width, height), (200, 80, 40))
+        image.save(buffer, "JPEG", exif=exif or Image.Exif())
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
     # --- Тесты доступа и листинга ---
 
     def test_list_own_photos(self):
@@ -57,6 +83,20 @@ class PhotoGalleryTestCase(APITestCase):
         self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(response.data["results"][0]["is_main"], True)
 
+    def test_list_conditional_get(self):
+        """Список фото отдает 304 по ETag и меняет ETag после удаления фото."""
+        photo = Photo.objects.create(user=self.user1, image=self.image_file)
+        self.client.force_authenticate(user=self.user1)
+
+        etag = self.client.get(self.list_url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.delete(reverse("photo-detail", kwargs={"pk": photo.pk}))
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_unauthenticated_access(self):
         """Неаутентифицированный пользователь не имеет доступа."""
         response = self.client.get(self.list_url)
@@ -138,6 +178,30 @@ class PhotoGalleryTestCase(APITestCase):
         photo1.refresh_from_db()
         self.assertFalse(photo1.is_main)
 
+    def test_replacing_image_restarts_processing(self):
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(300, 300))
+        process_pending_photos()
+        photo.refresh_from_db()
+        old_renditions = list(photo.renditions.values())
+
+        self.client.force_authenticate(user=self.user1)
+        detail_url = reverse("photo-detail", kwargs={"pk": photo.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                detail_url, {"image": self.make_jpeg(200, 100)}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], "processing")
+        photo.refresh_from_db()
+        self.assertEqual(photo.renditions, {})
+        self.assertFalse(any(photo.image.storage.exists(n) for n in old_renditions))
+
+        process_pending_photos()
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.Status.READY)
+        self.assertEqual(set(photo.renditions), {"128", "480", "1080"})
+
     def test_delete_own_photo(self):
         """Удаление своей фотографии."""
         photo1 = Photo.objects.create(
@@ -150,6 +214,263 @@ class PhotoGalleryTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Photo.objects.filter(user=self.user1).count(), 0)
 
+    def test_main_photo_path_follows_photos(self):
+        """Путь главной фотографии в профиле обновляется при изменениях."""
+        profile = Profile.objects.create(
+            user=self.user1, birth_date=datetime.date(1990, 1, 1), gender="M"
+        )
+        photo1 = Photo.objects.create(
+            user=self.user1,
+            image=self.image_file,
+            is_main=True,
+            status=Photo.Status.READY,
+        )
+        photo2 = Photo.objects.create(
+            user=self.user1,
+            image=SimpleUploadedFile("p2.gif", self.image_content_gif, "image/gif"),
+            status=Photo.Status.READY,
+        )
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.main_photo_path, photo1.image.name)
+        self.assertEqual(profile.main_photo, photo1.image.url)
+
+        photo1.delete()
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.main_photo_path, photo2.image.name)
+
+        photo2.delete()
+
+        profile.refresh_from_db()
+        self.assertIsNone(profile.main_photo)
+
+    def test_upload_is_processed_by_worker(self):
+        """
+        Загрузка сразу возвращает фото в статусе processing, а копии всех
+        размеров строит команда process_photos в пуле процессов.
+        """
+        Profile.objects.create(
+            user=self.user1, birth_date=datetime.date(1990, 1, 1), gender="M"
+        )
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            self.list_url, {"image": self.make_jpeg(2000, 1000)}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "processing")
+        self.assertEqual(response.data["sizes"], {})
+        self.assertEqual(Profile.objects.get(user=self.user1).main_photo_path, "")
+
+        call_command("process_photos", "--once", "--workers", "1", stdout=io.StringIO())
+
+        photo = Photo.objects.get(user=self.user1)
+        self.assertEqual(photo.status, Photo.Status.READY)
+        self.assertEqual(set(photo.renditions), {"128", "480", "1080"})
+
+        with photo.image.storage.open(photo.renditions["128"]) as rendition:
+            with Image.open(rendition) as image:
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.size, (128, 64))
+
+        response = self.client.get(self.list_url)
+        sizes = response.data["results"][0]["sizes"]
+        self.assertTrue(sizes["480"].endswith(".webp"))
+
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual(profile.main_photo_renditions, photo.renditions)
+
+    def test_processing_strips_exif_and_applies_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой стрелке
+        exif[0x010F] = "Camera"
+        photo = Photo.objects.create(
+            user=self.user1, image=self.make_jpeg(400, 200, exif=exif)
+        )
+
+        process_pending_photos()
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.Status.READY)
+        with photo.image.open("rb") as source, Image.open(source) as image:
+            self.assertEqual(image.size, (200, 400))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_invalid_upload_marked_failed(self):
+        photo = Photo.objects.create(
+            user=self.user1,
+            image=SimpleUploadedFile("bad.jpg", b"not an image", "image/jpeg"),
+        )
+
+        process_pending_photos()
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.Status.FAILED)
+        self.assertEqual(photo.renditions, {})
+
+    def test_claimed_photos_are_skipped(self):
+        """Фотографию, забранную другим обработчиком, повторно не берут."""
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(300, 300))
+        Photo.objects.filter(pk=photo.pk).update(claimed_at=timezone.now())
+
+        self.assertEqual(process_pending_photos(), 0)
+
+        stale = timezone.now() - datetime.timedelta(
+            seconds=settings.PHOTO_PROCESSING_CLAIM_TIMEOUT + 1
+        )
+        Photo.objects.filter(pk=photo.pk).update(claimed_at=stale)
+        self.assertEqual(process_pending_photos(), 1)
+
+    def test_result_discarded_if_image_replaced_meanwhile(self):
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(300, 300))
+        replaced = {}
+
+        def replace_image(data, *args):
+            # Пока фото обрабатывается, пользователь загружает новое.
+            replaced["photo"] = Photo.objects.get(pk=photo.pk)
+            replaced["photo"].image = self.make_jpeg(100, 100, name="new.jpg")
+            replaced["photo"].claimed_at = None
+            replaced["photo"].save()
+            return process_image(data, *args)
+
+        with mock.patch("gallery.processing.process_image", replace_image):
+            process_pending_photos()
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.Status.PROCESSING)
+        self.assertEqual(photo.renditions, {})
+        self.assertEqual(photo.image.name, replaced["photo"].image.name)
+
+    def test_broken_pool_marks_photo_failed(self):
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(300, 300))
+
+        class BrokenExecutor:
+            def submit(self, *args):
+                future = Future()
+                future.set_exception(BrokenProcessPool())
+                return future
+
+        with self.assertRaises(BrokenProcessPool):
+            process_pending_photos(BrokenExecutor())
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.Status.FAILED)
+
+    def test_delete_removes_renditions(self):
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(300, 300))
+        process_pending_photos()
+        photo.refresh_from_db()
+        names = list(photo.renditions.values())
+        self.assertTrue(all(photo.image.storage.exists(name) for name in names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+
+        self.assertFalse(any(photo.image.storage.exists(name) for name in names))
+
+    def test_identical_uploads_share_files(self):
+        """
+        Одинаковые загрузки хранятся одним файлом под хэшем содержимого, а
+        файл удаляется только вместе с последней ссылающейся фотографией.
+        """
+        data = self.make_jpeg(300, 200).read()
+        first = Photo.objects.create(
+            user=self.user1, image=SimpleUploadedFile("a.JPG", data, "image/jpeg")
+        )
+        second = Photo.objects.create(
+            user=self.user2, image=SimpleUploadedFile("b.jpg", data, "image/jpeg")
+        )
+
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(first.content_hash, digest)
+        self.assertEqual(first.image.name, f"profile_photos/{digest[:2]}/{digest}.jpg")
+        self.assertEqual(second.image.name, first.image.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending_photos()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        storage = first.image.storage
+
+        # Очищенный оригинал и копии тоже общие, исходная загрузка удалена.
+        self.assertNotEqual(first.content_hash, digest)
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(second.renditions, first.renditions)
+        self.assertFalse(storage.exists(f"profile_photos/{digest[:2]}/{digest}.jpg"))
+
+        names = [first.image.name, *first.renditions.values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(storage.exists(name) for name in names))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+    def test_file_deleted_before_commit_is_restored(self):
+        """
+        Если параллельное удаление другой фотографии убрало общий файл до
+        фиксации новой ссылки на него, файл записывается заново.
+        """
+        data = self.make_jpeg(300, 200).read()
+        with self.captureOnCommitCallbacks() as callbacks:
+            photo = Photo.objects.create(
+                user=self.user1, image=SimpleUploadedFile("a.jpg", data, "image/jpeg")
+            )
+        storage = photo.image.storage
+        storage.delete(photo.image.name)
+
+        for callback in callbacks:
+            callback()
+
+        with storage.open(photo.image.name) as restored:
+            self.assertEqual(restored.read(), data)
+
+    def test_media_served_as_immutable(self):
+        photo = Photo.objects.create(user=self.user1, image=self.image_file)
+        request = RequestFactory().get(f"/media/{photo.image.name}")
+
+        response = serve_media(
+            request, photo.image.name, document_root=settings.MEDIA_ROOT
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn(
+            f"max-age={settings.PHOTO_CACHE_MAX_AGE}", response["Cache-Control"]
+        )
+
+    def test_hash_photos_command_moves_legacy_files(self):
+        photo = Photo.objects.create(
+            user=self.user1, image=self.make_jpeg(300, 200), status=Photo.Status.READY
+        )
+        legacy_name = "profile_photos/legacy.jpg"
+        with photo.image.open("rb") as source:
+            photo.image.storage.save(legacy_name, source)
+        Photo.objects.filter(pk=photo.pk).update(image=legacy_name, content_hash="")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("hash_photos", stdout=io.StringIO())
+
+        photo.refresh_from_db()
+        self.assertTrue(photo.image.name.endswith(f"/{photo.content_hash}.jpg"))
+        self.assertEqual(set(photo.renditions), {"128", "480", "1080"})
+        self.assertFalse(photo.image.storage.exists(legacy_name))
+
+    def test_backfill_renditions_command(self):
+        photo = Photo.objects.create(user=self.user1, image=self.make_jpeg(600, 400))
+        process_pending_photos()
+        photo.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            Photo.objects.filter(pk=photo.pk).update(renditions={})
+            release_photo_files(renditions=photo.renditions)
+
+        call_command("backfill_renditions", stdout=io.StringIO())
+
+        photo.refresh_from_db()
+        self.assertEqual(set(photo.renditions), {"128", "480", "1080"})
+
     def test_delete_other_user_photo(self):
         """Попытка удаления чужой фотографии."""
         photo1 = Photo.objects.create(
@@ -162,3 +483,231 @@ class PhotoGalleryTestCase(APITestCase):
         response = self.client.delete(detail_url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(Photo.objects.filter(user=self.user1).count(), 1)
+
+    # --- Пакетные изменения галереи ---
+
+    def bulk_images(self, count):
+        return [
+            SimpleUploadedFile(f"bulk_{i}.gif", self.image_content_gif, "image/gif")
+            for i in range(count)
+        ]
+
+    def test_bulk_upload_reorder_and_set_main(self):
+        first = Photo.objects.create(
+            user=self.user1, image=self.image_file, is_main=True
+        )
+        second = Photo.objects.create(
+            user=self.user1, image=self.make_jpeg(10, 10), position=1
+        )
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            reverse("photo-bulk"),
+            {
+                "images": self.bulk_images(2),
+                "order": [second.pk, first.pk],
+                "main_index": 1,
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([photo["position"] for photo in response.data], [0, 1, 2, 3])
+        self.assertEqual(
+            [photo["id"] for photo in response.data][:2], [second.pk, first.pk]
+        )
+        main = Photo.objects.get(user=self.user1, is_main=True)
+        self.assertEqual(main.pk, response.data[3]["id"])
+
+        listed = self.client.get(self.list_url).data["results"]
+        self.assertEqual(
+            [photo["id"] for photo in listed], [photo["id"] for photo in response.data]
+        )
+
+    def test_bulk_file_deleted_before_commit_is_restored(self):
+        """Общий файл, удаленный до фиксации пачки, записывается заново."""
+        self.client.force_authenticate(user=self.user1)
+        # В настоящем запросе транзакция фиксируется до закрытия загруженных
+        # файлов; здесь колбэки выполняются уже после ответа.
+        with mock.patch(
+            "django.core.files.uploadedfile.InMemoryUploadedFile.close"
+        ), self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("photo-bulk"),
+                {"images": self.bulk_images(1)},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        photo = Photo.objects.get(pk=response.data[0]["id"])
+        photo.image.storage.delete(photo.image.name)
+
+        for callback in callbacks:
+            callback()
+
+        with photo.image.storage.open(photo.image.name) as restored:
+            self.assertEqual(restored.read(), self.image_content_gif)
+
+    def test_bulk_runs_constant_number_of_queries(self):
+        """Число запросов не зависит от количества загружаемых фотографий."""
+        Photo.objects.create(user=self.user1, image=self.image_file)
+        self.client.force_authenticate(user=self.user1)
+
+        counts = []
+        for size in (1, 4):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse("photo-bulk"),
+                    {"images": self.bulk_images(size), "main_index": 0},
+                    format="multipart",
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_rejects_incomplete_order(self):
+        first = Photo.objects.create(user=self.user1, image=self.image_file)
+        Photo.objects.create(user=self.user1, image=self.make_jpeg(10, 10))
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            reverse("photo-bulk"),
+            {"images": self.bulk_images(1), "order": [first.pk]},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Photo.objects.filter(user=self.user1).count(), 2)
+
+    def test_bulk_respects_photo_limit(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            reverse("photo-bulk"),
+            {"images": self.bulk_images(PHOTO_UPLOAD_LIMIT + 1)},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Photo.objects.filter(user=self.user1).exists())
+
+    def test_one_main_photo_per_user_enforced(self):
+        Photo.objects.create(user=self.user1, image=self.image_file, is_main=True)
+        other = Photo.objects.create(user=self.user1, image=self.make_jpeg(10, 10))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Photo.objects.filter(pk=other.pk).update(is_main=True)
+
+
+class PhotoUploadTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="up@test.com", password="p")
+        self.client.force_authenticate(user=self.user)
+        self.uploads_url = reverse("photo-upload-list")
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), (10, 120, 200)).save(buffer, "JPEG")
+        self.content = buffer.getvalue()
+
+    def tearDown(self):
+        for photo in Photo.objects.all():
+            photo.image.delete(save=False)
+
+    def initiate(self, **overrides):
+        data = {
+            "filename": "photo.jpg",
+            "content_type": "image/jpeg",
+            "size": len(self.content),
+            "sha256": hashlib.sha256(self.content).hexdigest(),
+            **overrides,
+        }
+        return self.client.post(self.uploads_url, data, format="json")
+
+    def send_chunk(self, upload_id, offset, chunk, **headers):
+        return self.client.put(
+            reverse("photo-upload-detail", kwargs={"pk": upload_id}),
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            **headers,
+        )
+
+    def test_chunked_upload_resumes_and_finalizes(self):
+        response = self.initiate()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data["id"]
+        self.assertEqual(response.data["offset"], 0)
+
+        middle = len(self.content) // 2
+        first, second = self.content[:middle], self.content[middle:]
+        response = self.send_chunk(
+            upload_id, 0, first, HTTP_X_CHUNK_SHA256=hashlib.sha256(first).hexdigest()
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["offset"], middle)
+
+        # Повтор уже принятой части после обрыва: сервер сообщает смещение.
+        response = self.send_chunk(upload_id, 0, first)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], middle)
+
+        detail_url = reverse("photo-upload-detail", kwargs={"pk": upload_id})
+        self.assertEqual(self.client.get(detail_url).data["offset"], middle)
+
+        self.send_chunk(upload_id, middle, second)
+        response = self.client.post(
+            reverse("photo-upload-finalize", kwargs={"pk": upload_id})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], "processing")
+        self.assertTrue(response.data["is_main"])
+        photo = Photo.objects.get(user=self.user)
+        with photo.image.open("rb") as source:
+            self.assertEqual(source.read(), self.content)
+        self.assertFalse(PhotoUpload.objects.exists())
+
+    def test_stale_chunk_does_not_truncate_accepted_data(self):
+        """Параллельная часть с тем же смещением не портит уже принятую."""
+        upload_id = self.initiate().data["id"]
+        stale = PhotoUpload.objects.get(pk=upload_id)
+        middle = len(self.content) // 2
+        self.send_chunk(upload_id, 0, self.content[:middle])
+
+        # Второй запрос прочитал загрузку до того, как первый принял часть.
+        with self.assertRaises(UploadConflict):
+            write_chunk(stale, io.BytesIO(b"x" * 10), 0, 10)
+
+        self.assertEqual(stale.received, middle)
+        with open(stale.temp_path, "rb") as source:
+            self.assertEqual(source.read(), self.content[:middle])
+
+    def test_initiate_rejects_oversized_file(self):
+        response = self.initiate(size=MAX_UPLOAD_SIZE + 1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("size", response.data)
+
+    def test_chunk_beyond_declared_size_rejected(self):
+        upload_id = self.initiate(size=10, sha256="").data["id"]
+        response = self.send_chunk(upload_id, 0, self.content)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_finalize_rejects_checksum_mismatch(self):
+        upload_id = self.initiate(sha256="0" * 64).data["id"]
+        self.send_chunk(upload_id, 0, self.content)
+
+        response = self.client.post(
+            reverse("photo-upload-finalize", kwargs={"pk": upload_id})
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Photo.objects.exists())
+
+    @override_settings(MAX_UPLOAD_SIZE=1000)
+    def test_multipart_upload_rejected_while_streaming(self):
+        """Файл больше лимита отклоняется обработчиком загрузки, а не после приема."""
+        for size in (5000, 200 * 1024):
+            upload = SimpleUploadedFile("big.gif", b"G" * size, "image/gif")
+            response = self.client.post(
+                reverse("photo-list"), {"image": upload}, format="multipart"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("Размер файла слишком большой", str(response.data["image"]))
@@ -0,0 +1,185 @@
+"""
+Загрузка фотографий: ранняя проверка размера и возобновляемая загрузка
+по частям.
+
+Протокол загрузки по частям:
+1. POST /api/photo-uploads/ {filename, content_type, size[, sha256]} —
+   размер и тип проверяются до передачи данных;
+2. PUT /api/photo-uploads/<id>/ с заголовком Upload-Offset и телом-частью
+   (необязательно X-Chunk-SHA256) — часть потоком пишется во временный файл
+   с указанного смещения, смещение должно совпадать с уже принятым объемом;
+3. GET /api/photo-uploads/<id>/ — узнать принятое смещение после обрыва;
+4. POST /api/photo-uploads/<id>/finalize/ — создать Photo из файла.
+"""
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import transaction
+from django.http import QueryDict
+from django.template.defaultfilters import filesizeformat
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Photo, PhotoUpload
+
+# Размер блока чтения тела запроса и временного файла.
+UPLOAD_READ_SIZE = 64 * 1024
+# Запас на заголовки multipart сверх размера самого файла.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def upload_too_large_message():
+    return (
+        f"Размер файла слишком большой. Максимальный размер: "
+        f"{filesizeformat(settings.MAX_UPLOAD_SIZE)}."
+    )
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Смещение не совпадает с уже принятым объемом."
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+    def __init__(self, detail=None):
+        super().__init__(detail or upload_too_large_message())
+
+
+class MaxUploadSizeHandler(FileUploadHandler):
+    """
+    Обработчик multipart-загрузки, который прекращает прием файла, как только
+    становится ясно, что он больше MAX_UPLOAD_SIZE: сначала по Content-Length
+    запроса (тело тогда не читается вовсе), затем по мере поступления данных.
+    Отклоненная загрузка помечается в request.upload_too_large. max_files —
+    сколько файлов допускается в одном запросе (для проверки Content-Length).
+    """
+
+    def __init__(self, request=None, max_files=1):
+        super().__init__(request)
+        self.max_files = max_files
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        self.request.upload_too_large = False
+        limit = self.max_files * (settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD)
+        if content_length > limit:
+            self.request.upload_too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            self.request.upload_too_large = True
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def write_chunk(upload, stream, offset, content_length, checksum=""):
+    """
+    Потоком пишет часть загрузки во временный файл с позиции offset, попутно
+    считая ее размер и SHA-256. Смещение должно совпадать с upload.received;
+    часть, выходящая за объявленный размер, отклоняется до записи (по
+    Content-Length). При несовпадении смещения возбуждается UploadConflict,
+    а upload.received содержит актуальное смещение.
+
+    Строка загрузки блокируется на время записи, поэтому параллельные части
+    с одним смещением пишутся по очереди: вторая получит UploadConflict, а
+    не перезапишет и не обрежет файл после первой.
+    """
+    with transaction.atomic():
+        upload.received = (
+            PhotoUpload.objects.select_for_update()
+            .values_list("received", flat=True)
+            .get(pk=upload.pk)
+        )
+        return _write_locked_chunk(upload, stream, offset, content_length, checksum)
+
+
+def _write_locked_chunk(upload, stream, offset, content_length, checksum):
+    if offset != upload.received:
+        raise UploadConflict()
+
+    remaining = upload.size - offset
+    if content_length > remaining:
+        raise UploadTooLarge("Часть выходит за объявленный размер файла.")
+
+    os.makedirs(settings.PHOTO_UPLOAD_TEMP_DIR, exist_ok=True)
+    mode = "r+b" if os.path.exists(upload.temp_path) else "wb"
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(upload.temp_path, mode) as target:
+        target.seek(offset)
+        while written < content_length:
+            block = stream.read(min(UPLOAD_READ_SIZE, content_length - written))
+            if not block:
+                break
+            digest.update(block)
+            target.write(block)
+            written += len(block)
+        target.truncate()
+
+    if written != content_length:
+        raise ValidationError({"error": "Часть получена не полностью."})
+    if checksum and checksum.lower() != digest.hexdigest():
+        raise ValidationError({"error": "Контрольная сумма части не совпадает."})
+
+    # Смещение сдвигается, только если его никто не изменил параллельно.
+    updated = PhotoUpload.objects.filter(pk=upload.pk, received=offset).update(
+        received=offset + written
+    )
+    if not updated:
+        upload.refresh_from_db(fields=["received"])
+        raise UploadConflict()
+    upload.received = offset + written
+    return upload
+
+
+def finalize_upload(upload):
+    """
+    Проверяет полноту и контрольную сумму загрузки, создает из временного
+    файла Photo (в статусе processing) и удаляет загрузку.
+    """
+    if upload.received != upload.size:
+        raise ValidationError(
+            {"error": "Загрузка не завершена.", "offset": upload.received}
+        )
+
+    # Файл читается один раз, в память (не больше MAX_UPLOAD_SIZE): из этих
+    # же байтов считается контрольная сумма и создается Photo, а содержимое
+    # нужно и после фиксации транзакции, когда временный файл уже удален.
+    with open(upload.temp_path, "rb") as source:
+        data = source.read()
+    if upload.sha256 and upload.sha256.lower() != hashlib.sha256(data).hexdigest():
+        upload.delete()
+        raise ValidationError(
+            {"error": "Контрольная сумма файла не совпадает. Начните загрузку заново."}
+        )
+
+    state = Photo.objects.gallery_state(upload.user)
+    photo = Photo(
+        user=upload.user,
+        is_main=state["count"] == 0,
+        position=state["next_position"],
+    )
+    photo.image.save(upload.filename, ContentFile(data), save=False)
+    photo.save()
+
+    upload.delete()
+    return photo
@@ -1,10 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import PhotoViewSet
+from .views import PhotoUploadViewSet, PhotoViewSet
 
 router = DefaultRouter()
 router.register(r"photos", PhotoViewSet, basename="photo")
+router.register(r"photo-uploads", PhotoUploadViewSet, basename="photo-upload")
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,14 +1,57 @@
-from rest_framework import serializers, viewsets
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from .models import Photo
-from .serializers import PhotoSerializer
+from users.conditional import ConditionalGetMixin
+
+from .models import Photo, PhotoUpload
+from .serializers import (PhotoBulkSerializer, PhotoSerializer,
+                          PhotoUploadSerializer)
+from .storage import is_immutable_name
+from .uploads import (MaxUploadSizeHandler, UploadConflict, finalize_upload,
+                      upload_too_large_message, write_chunk)
 
 # Create your views here.
 PHOTO_UPLOAD_LIMIT = 10
 
 
-class PhotoViewSet(viewsets.ModelViewSet):
+def check_photo_limit(user):
+    """
+    Проверяет лимит фотографий и возвращает состояние галереи (количество и
+    следующую позицию), посчитанное одним запросом.
+    """
+    state = Photo.objects.gallery_state(user)
+    if state["count"] >= PHOTO_UPLOAD_LIMIT:
+        raise serializers.ValidationError(
+            f"Вы достигли лимита в {PHOTO_UPLOAD_LIMIT} фотографий. Удалите старые фото, чтобы добавить новые."
+        )
+    return state
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Раздача медиафайлов в режиме разработки. Файлы с контентно-адресуемыми
+    именами отдаются как неизменяемые; в production те же заголовки для
+    MEDIA_URL должен ставить веб-сервер или CDN.
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code == 200 and is_immutable_name(path):
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.PHOTO_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    return response
+
+
+class PhotoViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint для управления фотографиями профиля аутентифицированного пользователя.
     """
@@ -20,7 +63,45 @@ class PhotoViewSet(viewsets.ModelViewSet):
         """
         Гарантирует, что пользователь может управлять только своими фотографиями.
         """
-        return Photo.objects.filter(user=self.request.user).order_by("-uploaded_at")
+        return Photo.objects.filter(user=self.request.user).order_by("position", "id")
+
+    def get_validators(self):
+        """
+        Валидатор списка — количество фотографий и время последнего изменения:
+        удаление меняет количество, остальные изменения — updated_at.
+        """
+        state = Photo.objects.filter(user=self.request.user).aggregate(
+            count=Count("id"), latest=Max("updated_at")
+        )
+        return [state["count"], state["latest"]], None
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Обработчик ставится до чтения тела, чтобы слишком большой файл
+        # отклонялся по Content-Length или по ходу приема, а не после
+        # буферизации всего запроса.
+        action = self.action_map.get(request.method.lower())
+        max_files = PHOTO_UPLOAD_LIMIT if action == "bulk" else 1
+        request.upload_handlers.insert(0, MaxUploadSizeHandler(request, max_files))
+        return super().initialize_request(request, *args, **kwargs)
+
+    def reject_oversized_upload(self, request):
+        request.data
+        if getattr(request, "upload_too_large", False):
+            raise ValidationError({"image": [upload_too_large_message()]})
+
+    def create(self, request, *args, **kwargs):
+        self.reject_oversized_upload(request)
+        return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        self.reject_oversized_upload(request)
+        return super().update(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         """
@@ -28,14 +109,111 @@ class PhotoViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
 
-        if self.get_queryset().count() >= PHOTO_UPLOAD_LIMIT:
-            raise serializers.ValidationError(
-                f"Вы достигли лимита в {PHOTO_UPLOAD_LIMIT} фотографий. Удалите старые фото, чтобы добавить новые."
+        state = check_photo_limit(user)
+        # Первая фотография сразу становится главной, без второго сохранения.
+        is_main = state["count"] == 0 or serializer.validated_data.get("is_main")
+
+        serializer.save(
+            user=user, position=state["next_position"], is_main=bool(is_main)
+        )
+
+    def perform_update(self, serializer):
+        """
+        Новое изображение проходит ту же обработку, что и загрузка: фотография
+        возвращается в статус processing, а прежние копии освобождаются.
+        """
+        if "image" in serializer.validated_data:
+            serializer.save(
+                status=Photo.Status.PROCESSING, renditions={}, claimed_at=None
+            )
+        else:
+            serializer.save()
+
+    @action(detail=False, methods=["post"], serializer_class=PhotoBulkSerializer)
+    def bulk(self, request):
+        """
+        Загружает несколько фотографий, меняет порядок и главную фотографию
+        одним запросом в одной транзакции. Возвращает все фотографии
+        пользователя в новом порядке.
+        """
+        self.reject_oversized_upload(request)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            photos = Photo.objects.apply_changes(
+                request.user, limit=PHOTO_UPLOAD_LIMIT, **serializer.validated_data
+            )
+        except ValueError as exc:
+            raise ValidationError({"error": str(exc)})
+
+        return Response(
+            PhotoSerializer(
+                photos, many=True, context=self.get_serializer_context()
+            ).data
+        )
+
+
+class PhotoUploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    API endpoint для возобновляемой загрузки фотографий по частям
+    (протокол описан в gallery.uploads).
+    """
+
+    serializer_class = PhotoUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return PhotoUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        check_photo_limit(self.request.user)
+        serializer.save(user=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        """
+        Принимает часть файла. Тело запроса не разбирается парсерами DRF,
+        а потоком пишется во временный файл.
+        """
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            content_length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {"error": "Укажите смещение части в заголовке Upload-Offset."}
+            )
+        if content_length <= 0:
+            raise ValidationError({"error": "Пустая часть загрузки."})
+
+        try:
+            write_chunk(
+                upload,
+                request.stream,
+                offset,
+                content_length,
+                checksum=request.headers.get("X-Chunk-SHA256", ""),
+            )
+        except UploadConflict as exc:
+            # Клиент продолжает загрузку с актуального смещения.
+            return Response(
+                {"error": exc.detail, "offset": upload.received},
+                status=exc.status_code,
             )
-        # ------------------------
+        return Response(self.get_serializer(upload).data)
 
-        photo_instance = serializer.save(user=user)
+    @action(detail=True, methods=["post"])
+    def finalize(self, request, pk=None):
+        upload = self.get_object()
+        check_photo_limit(request.user)
 
-        if self.get_queryset().count() == 1:
-            photo_instance.is_main = True
-            photo_instance.save()
+        photo = finalize_upload(upload)
+        return Response(
+            PhotoSerializer(photo, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED,
+        )
@@ -0,0 +1,456 @@
+"""
+Граф лайков в памяти процесса (включается settings.LIKE_GRAPH_ENABLED).
+
+Лайки хранятся как разреженная матрица смежности в формате CSR, индексом
+строки служит сам id пользователя: прямые ребра (кого лайкнул) и обратные
+(кто лайкнул), столбцы каждой строки отсортированы, id — int32, пока
+помещаются. Проверка лайка — бинарный поиск в строке, взаимные лайки —
+пересечение двух отсортированных строк, без обращения к базе.
+
+Граф загружается из Swipe пачками при старте сервера (start_like_graph из
+config/wsgi.py и config/asgi.py); пока он не загружен, запросы идут в базу.
+Изменения поверх CSR копятся в дельтах (добавленные и удаленные ребра по
+пользователям) и вливаются в CSR, когда дельт становится больше
+LIKE_GRAPH_MAX_DELTA. Свайпы своего процесса применяются сигналами после
+фиксации транзакции. Изменения других процессов догружает фоновый поток раз
+в LIKE_GRAPH_REFRESH_SECONDS: лайки новее водяного знака и удаления лайков
+из таблицы LikeRemoval. Чтение и изменение дельт идет под блокировкой графа.
+Тот же поток раз в LIKE_GRAPH_CHECK_SECONDS сверяет выборку пользователей
+живого графа с базой (check_like_graph), по запросу сверку выполняет
+LikeGraphCheckAPIView.
+"""
+
+import logging
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Max, Q
+
+logger = logging.getLogger(__name__)
+
+LOAD_CHUNK_SIZE = 100_000
+# Догрузка перечитывает столько последних id до водяного знака, чтобы не
+# пропустить свайпы, зафиксированные позже свайпов с большими id.
+REFRESH_OVERLAP = 1000
+
+FORWARD = 0
+REVERSE = 1
+
+
+def _index_dtype(max_id):
+    return np.int32 if max_id < 2**31 else np.int64
+
+
+def _csr(rows, cols, size, dtype):
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, cols[order].astype(dtype)
+
+
+def _read_rows(queryset, after_id, chunk_size):
+    """
+    Строки queryset с id больше after_id пачками: массив строк (id, свайпер,
+    цель).
+    """
+    while True:
+        rows = np.array(
+            queryset.filter(id__gt=after_id)
+            .order_by("id")
+            .values_list("id", "swiper_id", "swiped_user_id")[:chunk_size],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        if not len(rows):
+            return
+        yield rows
+        after_id = int(rows[-1, 0])
+
+
+def _read_likes(after_id, chunk_size):
+    from .models import Swipe
+
+    return _read_rows(Swipe.objects.filter(is_like=True), after_id, chunk_size)
+
+
+def _read_removals(after_id, chunk_size):
+    from .models import LikeRemoval
+
+    return _read_rows(LikeRemoval.objects.all(), after_id, chunk_size)
+
+
+def _last_removal_id():
+    from .models import LikeRemoval
+
+    return LikeRemoval.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+class LikeGraph:
+    """
+    watermark — id последнего учтенного лайка, removal_watermark — id
+    последнего учтенного удаления лайка (LikeRemoval).
+    """
+
+    def __init__(self, swipers=(), targets=(), watermark=0, removal_watermark=0):
+        self._lock = threading.RLock()
+        self._build(
+            np.asarray(swipers, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+        )
+        self.watermark = watermark
+        self.removal_watermark = removal_watermark
+        self.refreshed_at = time.monotonic()
+
+    @classmethod
+    def load(cls, chunk_size=LOAD_CHUNK_SIZE):
+        """
+        Строит граф по всем лайкам из базы, читая их пачками по id. Водяной
+        знак удалений берется до чтения лайков, чтобы удаления во время
+        загрузки догрузились при следующем обновлении.
+        """
+        removal_watermark = _last_removal_id()
+        chunks = list(_read_likes(0, chunk_size))
+        if not chunks:
+            return cls(removal_watermark=removal_watermark)
+        rows = np.concatenate(chunks)
+        return cls(
+            rows[:, 1],
+            rows[:, 2],
+            watermark=int(rows[-1, 0]),
+            removal_watermark=removal_watermark,
+        )
+
+    def reload(self, chunk_size=LOAD_CHUNK_SIZE):
+        """Перестраивает граф по базе заново."""
+        graph = LikeGraph.load(chunk_size)
+        with self._lock:
+            self._csr = graph._csr
+            self._added, self._removed = graph._added, graph._removed
+            self._delta_size = 0
+            self.watermark = graph.watermark
+            self.removal_watermark = graph.removal_watermark
+            self.refreshed_at = time.monotonic()
+
+    def _build(self, swipers, targets):
+        size = int(max(swipers.max(initial=0), targets.max(initial=0))) + 1
+        dtype = _index_dtype(size)
+        self._csr = (
+            _csr(swipers, targets, size, dtype),
+            _csr(targets, swipers, size, dtype),
+        )
+        self._added = ({}, {})
+        self._removed = ({}, {})
+        self._delta_size = 0
+
+    def _base_row(self, direction, user_id):
+        indptr, indices = self._csr[direction]
+        if user_id >= len(indptr) - 1:
+            return indices[:0]
+        return indices[indptr[user_id] : indptr[user_id + 1]]
+
+    def _neighbours(self, direction, user_id):
+        with self._lock:
+            row = self._base_row(direction, user_id)
+            removed = list(self._removed[direction].get(user_id, ()))
+            added = list(self._added[direction].get(user_id, ()))
+        if removed:
+            row = row[~np.isin(row, removed)]
+        if added:
+            row = np.union1d(row, np.array(added, dtype=np.int64))
+        return row
+
+    def likes(self, user_id):
+        """Отсортированный массив id пользователей, которых лайкнул user_id."""
+        return self._neighbours(FORWARD, user_id)
+
+    def likers(self, user_id):
+        """Отсортированный массив id пользователей, лайкнувших user_id."""
+        return self._neighbours(REVERSE, user_id)
+
+    def mutual(self, user_id):
+        """Id пользователей с взаимным лайком."""
+        return np.intersect1d(
+            self.likes(user_id), self.likers(user_id), assume_unique=True
+        )
+
+    def has_like(self, swiper_id, target_id):
+        with self._lock:
+            if target_id in self._removed[FORWARD].get(swiper_id, ()):
+                return False
+            if target_id in self._added[FORWARD].get(swiper_id, ()):
+                return True
+            row = self._base_row(FORWARD, swiper_id)
+        index = np.searchsorted(row, target_id)
+        return bool(index < len(row) and row[index] == target_id)
+
+    def is_mutual(self, user1_id, user2_id):
+        return self.has_like(user1_id, user2_id) and self.has_like(user2_id, user1_id)
+
+    def _change(self, swiper_id, target_id, add):
+        with self._lock:
+            for direction, source, target in (
+                (FORWARD, swiper_id, target_id),
+                (REVERSE, target_id, swiper_id),
+            ):
+                put, drop = (
+                    (self._added, self._removed)
+                    if add
+                    else (self._removed, self._added)
+                )
+                drop[direction].get(source, set()).discard(target)
+                put[direction].setdefault(source, set()).add(target)
+            self._delta_size += 1
+            if self._delta_size > settings.LIKE_GRAPH_MAX_DELTA:
+                self.compact()
+
+    def add_like(self, swiper_id, target_id):
+        with self._lock:
+            if not self.has_like(swiper_id, target_id):
+                self._change(swiper_id, target_id, add=True)
+
+    def add_likes(self, swiper_id, target_ids):
+        for target_id in target_ids:
+            self.add_like(swiper_id, target_id)
+
+    def remove_like(self, swiper_id, target_id):
+        with self._lock:
+            if self.has_like(swiper_id, target_id):
+                self._change(swiper_id, target_id, add=False)
+
+    def edges(self):
+        """Все прямые ребра с учетом дельт: массивы (свайперы, цели)."""
+        with self._lock:
+            indptr, indices = self._csr[FORWARD]
+            removed = [
+                (swiper, target)
+                for swiper, items in self._removed[FORWARD].items()
+                for target in items
+            ]
+            added = [
+                (swiper, target)
+                for swiper, items in self._added[FORWARD].items()
+                for target in items
+            ]
+        swipers = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        targets = indices.astype(np.int64)
+
+        if removed:
+            drop = np.array(removed, dtype=np.int64)
+            keep = ~np.isin(swipers * 2**32 + targets, drop[:, 0] * 2**32 + drop[:, 1])
+            swipers, targets = swipers[keep], targets[keep]
+
+        if added:
+            extra = np.array(added, dtype=np.int64)
+            swipers = np.concatenate([swipers, extra[:, 0]])
+            targets = np.concatenate([targets, extra[:, 1]])
+        return swipers, targets
+
+    def compact(self):
+        """Вливает дельты в CSR."""
+        with self._lock:
+            self._build(*self.edges())
+
+    def refresh(self, chunk_size=LOAD_CHUNK_SIZE):
+        """
+        Догружает изменения из базы: лайки новее водяного знака и удаления
+        лайков новее водяного знака удалений, оба с перекрытием
+        REFRESH_OVERLAP. Пары из удалений сверяются с базой, поэтому лайк,
+        поставленный заново после удаления, остается в графе.
+
+        Граф, не догружавшийся дольше LIKE_GRAPH_STALE_SECONDS, мог пропустить
+        уже очищенные удаления (см. LikeRemovalManager.prune) и
+        перестраивается заново.
+        """
+        from .models import Swipe
+
+        if time.monotonic() - self.refreshed_at > settings.LIKE_GRAPH_STALE_SECONDS:
+            self.reload(chunk_size)
+            return
+
+        started_at = time.monotonic()
+        # База читается без блокировки графа, чтобы не задерживать чтение.
+        likes = list(_read_likes(max(self.watermark - REFRESH_OVERLAP, 0), chunk_size))
+        removals = list(
+            _read_removals(max(self.removal_watermark - REFRESH_OVERLAP, 0), chunk_size)
+        )
+        removed_pairs = set()
+        still_liked = set()
+        if removals:
+            rows = np.concatenate(removals)
+            removed_pairs = set(map(tuple, rows[:, 1:].tolist()))
+            still_liked = set(
+                Swipe.objects.filter(
+                    is_like=True,
+                    swiper_id__in={swiper for swiper, _ in removed_pairs},
+                    swiped_user_id__in={target for _, target in removed_pairs},
+                ).values_list("swiper_id", "swiped_user_id")
+            )
+
+        with self._lock:
+            for rows in likes:
+                for swiper_id, target_id in rows[:, 1:].tolist():
+                    self.add_like(swiper_id, target_id)
+                self.watermark = max(self.watermark, int(rows[-1, 0]))
+            for swiper_id, target_id in removed_pairs - still_liked:
+                self.remove_like(swiper_id, target_id)
+            if removals:
+                self.removal_watermark = max(
+                    self.removal_watermark, int(removals[-1][-1, 0])
+                )
+            self.refreshed_at = started_at
+
+    def verify(self, user_ids):
+        """
+        Сверяет строки графа с базой для user_ids в обоих направлениях.
+        Возвращает список (user_id, направление, лишние в графе id,
+        недостающие в графе id) для расхождений.
+        """
+        from .models import Swipe
+
+        likes = Swipe.objects.filter(is_like=True)
+        expected = (
+            {user_id: set() for user_id in user_ids},
+            {user_id: set() for user_id in user_ids},
+        )
+        for swiper_id, target_id in likes.filter(
+            Q(swiper_id__in=user_ids) | Q(swiped_user_id__in=user_ids)
+        ).values_list("swiper_id", "swiped_user_id"):
+            if swiper_id in expected[FORWARD]:
+                expected[FORWARD][swiper_id].add(target_id)
+            if target_id in expected[REVERSE]:
+                expected[REVERSE][target_id].add(swiper_id)
+
+        mismatches = []
+        for direction, rows in enumerate(expected):
+            for user_id, neighbours in rows.items():
+                actual = set(self._neighbours(direction, user_id).tolist())
+                if actual != neighbours:
+                    mismatches.append(
+                        (
+                            user_id,
+                            "likes" if direction == FORWARD else "likers",
+                            sorted(actual - neighbours),
+                            sorted(neighbours - actual),
+                        )
+                    )
+        return mismatches
+
+
+def check_like_graph(graph, sample, seed=None):
+    """
+    Сверяет с базой живой граф на случайной выборке из sample пользователей
+    (0 — все): строки лайков и лайкнувших, а также взаимные лайки с таблицей
+    мэтчей. Возвращает словарь с количеством проверенных пользователей,
+    водяным знаком и списками расхождений.
+    """
+    from .models import Match
+
+    user_ids = list(get_user_model().objects.values_list("id", flat=True))
+    if sample and len(user_ids) > sample:
+        user_ids = random.Random(seed).sample(user_ids, sample)
+
+    matched = {user_id: set() for user_id in user_ids}
+    for user_id, partner_id in Match.objects.filter(user_id__in=user_ids).values_list(
+        "user_id", "partner_id"
+    ):
+        matched[user_id].add(partner_id)
+
+    match_mismatches = []
+    for user_id, partners in matched.items():
+        mutual = set(graph.mutual(user_id).tolist())
+        if mutual != partners:
+            match_mismatches.append(
+                (user_id, sorted(mutual - partners), sorted(partners - mutual))
+            )
+
+    return {
+        "checked": len(user_ids),
+        "watermark": graph.watermark,
+        "graph": graph.verify(user_ids),
+        "matches": match_mismatches,
+    }
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_like_graph():
+    """
+    Граф лайков процесса или None, если он отключен, не загружен при старте
+    или не догружался дольше LIKE_GRAPH_STALE_SECONDS: тогда запросы идут в
+    базу.
+    """
+    graph = loaded_like_graph()
+    if graph is None:
+        return None
+    if time.monotonic() - graph.refreshed_at > settings.LIKE_GRAPH_STALE_SECONDS:
+        return None
+    return graph
+
+
+def loaded_like_graph():
+    """Граф процесса, только если он включен и уже загружен."""
+    return _graph if settings.LIKE_GRAPH_ENABLED else None
+
+
+def load_like_graph():
+    """Загружает граф лайков процесса, если он включен и еще не загружен."""
+    global _graph
+    if not settings.LIKE_GRAPH_ENABLED:
+        return None
+
+    with _graph_lock:
+        if _graph is None:
+            _graph = LikeGraph.load()
+    return _graph
+
+
+def start_like_graph():
+    """
+    Загружает граф лайков при старте сервера и запускает фоновый поток его
+    догрузки и сверки с базой. Management-команды граф не загружают.
+    """
+    graph = load_like_graph()
+    if graph is not None:
+        threading.Thread(
+            target=_maintain, args=(graph,), name="like-graph", daemon=True
+        ).start()
+    return graph
+
+
+def _maintain(graph):
+    """
+    Раз в LIKE_GRAPH_REFRESH_SECONDS догружает граф и очищает старые
+    удаления, раз в LIKE_GRAPH_CHECK_SECONDS сверяет выборку пользователей с
+    базой и пишет расхождения в лог.
+    """
+    from .models import LikeRemoval
+
+    checked_at = time.monotonic()
+    while _graph is graph:
+        time.sleep(settings.LIKE_GRAPH_REFRESH_SECONDS)
+        try:
+            graph.refresh()
+            LikeRemoval.objects.prune()
+            if time.monotonic() - checked_at > settings.LIKE_GRAPH_CHECK_SECONDS:
+                checked_at = time.monotonic()
+                report = check_like_graph(graph, settings.LIKE_GRAPH_CHECK_SAMPLE)
+                if report["graph"] or report["matches"]:
+                    logger.error(
+                        "Граф лайков расходится с базой: строк %d, мэтчей %d",
+                        len(report["graph"]),
+                        len(report["matches"]),
+                    )
+        except Exception:
+            logger.exception("Не удалось обновить граф лайков")
+        finally:
+            connections.close_all()
+
+
+def reset_like_graph():
+    global _graph
+    _graph = None
@@ -0,0 +1,64 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from matches.ranking import CandidatePool, get_ranker
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время ранжирования синтетического пула кандидатов "
+        "(оценка и сортировка, без загрузки из базы)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--candidates",
+            type=int,
+            default=50000,
+            help="Размер пула кандидатов.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Сколько раз повторить замер.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        size = options["candidates"]
+        rng = np.random.default_rng(options["seed"])
+        now = timezone.now()
+        today = now.date().toordinal()
+        swipes = rng.integers(0, 1000, size)
+
+        pool = CandidatePool(
+            ids=np.arange(1, size + 1),
+            birth_days=today - rng.integers(18 * 365, 60 * 365, size),
+            city_ids=rng.integers(-1, 500, size),
+            likes_count=rng.zipf(2.0, size).clip(max=100000),
+            active_at=now.timestamp() - rng.exponential(14 * 86400, size),
+            swipes_total=swipes,
+            likes_given=rng.binomial(swipes, 0.4),
+            liked_viewer=rng.random(size) < 0.01,
+        )
+        ranker = get_ranker()
+        birth_day = today - 30 * 365
+
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            ranker.rank(pool, birth_day=birth_day, city_id=1, now=now)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Кандидатов: {size}, повторов: {len(timings)}, "
+                f"медиана: {statistics.median(timings):.2f} мс, "
+                f"минимум: {min(timings):.2f} мс."
+            )
+        )
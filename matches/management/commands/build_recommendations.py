@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from matches.recommendations import SWIPE_CHUNK_SIZE, build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Строит коллаборативные рекомендации по совместным лайкам. Читает "
+        "только свайпы новее прошлого запуска и пересчитывает рекомендации "
+        "их авторам."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Перечитать все свайпы и пересчитать рекомендации всем.",
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=None,
+            help="Сколько рекомендаций хранить на пользователя.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SWIPE_CHUNK_SIZE,
+            help="Сколько свайпов читать из базы за один запрос.",
+        )
+
+    def handle(self, *args, **options):
+        run = build_recommendations(
+            full=options["full"],
+            top_k=options["top_k"],
+            chunk_size=options["chunk_size"],
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Новых свайпов: {run.swipes_processed}, "
+                f"обновлено пользователей: {run.users_updated}, "
+                f"водяной знак: {run.last_swipe_id}."
+            )
+        )
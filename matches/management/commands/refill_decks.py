@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from matches.models import DeckCard
+
+
+class Command(BaseCommand):
+    help = (
+        "Пополняет колоды рекомендаций из очереди запросов, а также колоды, "
+        "опустившиеся ниже порога или устаревшие."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=None,
+            help="Сколько кандидатов добавлять за одно пополнение.",
+        )
+        parser.add_argument(
+            "--queued-only",
+            action="store_true",
+            help="Обработать только очередь запросов, без обхода всех колод.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help=(
+                "Обрабатывать очередь запросов непрерывно с такой паузой "
+                "(секунды), когда очередь пуста."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        refilled, added = DeckCard.objects.process_refill_requests(size=size)
+
+        if not options["queued_only"]:
+            User = get_user_model()
+            users = User.objects.filter(is_active=True, profile__isnull=False)
+            for user in users.iterator(chunk_size=500):
+                if DeckCard.objects.needs_refill(user):
+                    added += DeckCard.objects.refill(user, size=size)
+                    refilled += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пополнено колод: {refilled}, добавлено карточек: {added}."
+            )
+        )
+
+        poll_interval = options["poll_interval"]
+        if poll_interval is None:
+            return
+        while True:
+            count, _ = DeckCard.objects.process_refill_requests(size=size)
+            if not count:
+                time.sleep(poll_interval)
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def create_matches(apps, schema_editor):
+    Swipe = apps.get_model("matches", "Swipe")
+    Match = apps.get_model("matches", "Match")
+
+    reciprocal = Swipe.objects.filter(
+        swiper=OuterRef("swiped_user"), swiped_user=OuterRef("swiper"), is_like=True
+    )
+    pairs = (
+        Swipe.objects.filter(is_like=True)
+        .filter(Exists(reciprocal))
+        .values_list("swiper_id", "swiped_user_id")
+    )
+
+    batch = []
+    for user_id, partner_id in pairs.iterator(chunk_size=2000):
+        batch.append(Match(user_id=user_id, partner_id=partner_id))
+        if len(batch) >= 2000:
+            Match.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Match.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0003_discoverdeck_deckcard"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Match",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "partner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="matched_with",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="matches",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Мэтч",
+                "verbose_name_plural": "Мэтчи",
+                "unique_together": {("user", "partner")},
+            },
+        ),
+        migrations.RunPython(create_matches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0004_match"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contactrequest",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0005_contactrequest_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deckcard",
+            name="score",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="deckcard",
+            index=models.Index(
+                fields=["owner", "-score"], name="deckcard_owner_score_idx"
+            ),
+        ),
+    ]
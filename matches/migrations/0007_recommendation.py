@@ -0,0 +1,82 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0006_deckcard_score"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecommendationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("last_swipe_id", models.BigIntegerField(default=0)),
+                ("full", models.BooleanField(default=False)),
+                ("swipes_processed", models.PositiveBigIntegerField(default=0)),
+                ("users_updated", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Построение рекомендаций",
+                "verbose_name_plural": "Построения рекомендаций",
+                "get_latest_by": "finished_at",
+            },
+        ),
+        migrations.CreateModel(
+            name="Recommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommendations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Рекомендация",
+                "verbose_name_plural": "Рекомендации",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-score"], name="recommendation_user_idx"
+                    )
+                ],
+                "unique_together": {("user", "candidate")},
+            },
+        ),
+    ]
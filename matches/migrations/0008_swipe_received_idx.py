@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0007_recommendation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="swipe",
+            index=models.Index(
+                fields=["swiped_user", "is_like", "-timestamp", "swiper"],
+                name="swipe_received_idx",
+            ),
+        ),
+    ]
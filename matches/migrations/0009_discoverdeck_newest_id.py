@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:10
+
+from django.db import migrations, models
+from django.db.models import F, Value
+
+
+def split_cursor(apps, schema_editor):
+    # Прежний курсор шел по возрастанию id и становится границей новых
+    # пользователей; круговой обход начнется заново с новейших.
+    DiscoverDeck = apps.get_model("matches", "DiscoverDeck")
+    DiscoverDeck.objects.update(newest_id=F("cursor"), cursor=Value(0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0008_swipe_received_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="discoverdeck",
+            name="newest_id",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(split_cursor, migrations.RunPython.noop),
+    ]
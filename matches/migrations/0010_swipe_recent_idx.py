@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0009_discoverdeck_newest_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="swipe",
+            index=models.Index(
+                fields=["swiper", "-timestamp", "is_like"], name="swipe_recent_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0010_swipe_recent_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="discoverdeck",
+            name="refill_requested_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
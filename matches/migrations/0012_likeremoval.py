@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("matches", "0011_discoverdeck_refill_requested_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LikeRemoval",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("swiper_id", models.BigIntegerField()),
+                ("swiped_user_id", models.BigIntegerField()),
+                ("removed_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Удаленный лайк",
+                "verbose_name_plural": "Удаленные лайки",
+            },
+        ),
+    ]
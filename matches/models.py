@@ -1,14 +1,37 @@
-from datetime import date
+from datetime import timedelta
+from functools import partial, reduce
+from operator import or_
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import (Count, ExpressionWrapper, F, OuterRef, Subquery,
-                              fields)
-from django.db.models.functions import ExtractYear
+from django.db import models, transaction
+from django.db.models import Exists, F, Max, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from users.cache import bump_cache_version
+
+from .graph import get_like_graph, loaded_like_graph
+
+# Фильтры discover, с которыми кандидаты выбираются не из колоды, а живым
+# запросом (см. Swipe.get_viewable_profiles_queryset).
+LIVE_QUERY_FILTERS = ("gender", "city", "status", "min_age", "max_age", "radius_km")
+
+
+def uses_live_query(filters):
+    return any(name in filters for name in LIVE_QUERY_FILTERS)
+
+
+def _years_before(day, years):
+    """Возвращает дату на years лет раньше; 29 февраля переходит в 28-е."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
 
 # Create your models here.
 class SwipeManager(models.Manager):
@@ -33,45 +56,171 @@ class SwipeManager(models.Manager):
         )
 
     def received_likes(self, user):
-        """Возвращает QuerySet пользователей, которые лайкнули данного пользователя."""
-        return self.filter(swiped_user=user, is_like=True).values_list(
-            "swiper", flat=True
+        """
+        Возвращает список id пользователей, которые лайкнули данного
+        пользователя. При загруженном графе лайков (см. matches.graph) список
+        берется из памяти процесса.
+        """
+        graph = get_like_graph()
+        if graph is not None:
+            return graph.likers(user.pk).tolist()
+
+        return list(
+            self.filter(swiped_user=user, is_like=True).values_list("swiper", flat=True)
+        )
+
+    def unanswered_likers(self, user):
+        """
+        Возвращает QuerySet пользователей, которые лайкнули данного
+        пользователя и которых он еще не свайпнул (только активные и не
+        сотрудники, как в discover), с аннотацией liked_at — временем лайка.
+        Лайки читаются диапазоном индекса swipe_received_idx (swiped_user,
+        is_like, timestamp, swiper) в порядке времени, исключение ответов —
+        поиском по уникальному индексу (swiper, swiped_user).
+        """
+        User = get_user_model()
+
+        answered = self.filter(swiper=user, swiped_user=OuterRef("pk"))
+        return (
+            User.objects.filter(
+                given_swipes__swiped_user=user,
+                given_swipes__is_like=True,
+                is_active=True,
+                is_staff=False,
+            )
+            .exclude(Exists(answered))
+            .annotate(liked_at=F("given_swipes__timestamp"))
+            .select_related("profile")
+        )
+
+    def swiped_users(self, user, is_like=None):
+        """
+        Возвращает QuerySet пользователей, которых свайпнул данный пользователь,
+        с аннотацией swiped_at — временем свайпа. Строится через JOIN по
+        таблице свайпов вместо IN (подзапрос); is_like ограничивает выборку
+        лайками или дизлайками.
+        """
+        User = get_user_model()
+
+        lookup = {"received_swipes__swiper": user}
+        if is_like is not None:
+            lookup["received_swipes__is_like"] = is_like
+
+        return (
+            User.objects.filter(**lookup)
+            .annotate(swiped_at=F("received_swipes__timestamp"))
+            .select_related("profile")
         )
 
     def get_matches(self, user):
         """
         Возвращает QuerySet пользователей, с которыми есть взаимная симпатия (Match),
-        оптимизированный в один запрос с помощью подзапросов.
+        одним индексированным запросом по таблице мэтчей.
+
+        При загруженном графе лайков партнеры берутся из памяти процесса: без
+        взаимных лайков запрос не выполняется вовсе, иначе из таблицы мэтчей
+        читаются только профили и время мэтча этих партнеров.
         """
         User = get_user_model()
 
-        user_likes_them = (
-            Swipe.objects.filter(swiper=user, swiped_user=OuterRef("pk"), is_like=True)
-            .values("swiped_user_id")
-            .annotate(count=Count("swiped_user_id"))
-            .values("count")
-        )
+        graph = get_like_graph()
+        if graph is not None:
+            partner_ids = graph.mutual(user.pk).tolist()
+            if not partner_ids:
+                return User.objects.none()
+            return (
+                User.objects.filter(pk__in=partner_ids, matched_with__user=user)
+                .annotate(matched_at=F("matched_with__created_at"))
+                .select_related("profile")
+            )
 
-        they_like_user = (
-            Swipe.objects.filter(swiper=OuterRef("pk"), swiped_user=user, is_like=True)
-            .values("swiper_id")
-            .annotate(count=Count("swiper_id"))
-            .values("count")
+        return (
+            User.objects.filter(matched_with__user=user)
+            .annotate(matched_at=F("matched_with__created_at"))
+            .select_related("profile")
         )
 
-        queryset = (
-            User.objects.exclude(id=user.id)
-            .annotate(
-                liked_by_user=Subquery(
-                    user_likes_them, output_field=fields.IntegerField()
-                ),
-                likes_user=Subquery(they_like_user, output_field=fields.IntegerField()),
+    def create_batch(self, user, items):
+        """
+        Создает пачку свайпов пользователя за постоянное число запросов:
+        одна проверка существующих пользователей, одна проверка уже сделанных
+        свайпов, bulk_create, один агрегированный UPDATE счетчиков лайков и
+        одна проверка встречных лайков для мэтчей.
+
+        items — список словарей {"swiped_user_id", "is_like"}. Возвращает
+        список результатов в том же порядке.
+        """
+        from profiles.models import LikeCounterShard
+
+        User = get_user_model()
+
+        target_ids = {item["swiped_user_id"] for item in items}
+        existing_ids = set(
+            User.objects.filter(id__in=target_ids).values_list("id", flat=True)
+        )
+        swiped_ids = set(
+            self.filter(swiper=user, swiped_user_id__in=target_ids).values_list(
+                "swiped_user_id", flat=True
             )
-            .filter(liked_by_user__gte=1, likes_user__gte=1)
         )
 
-        queryset = queryset.select_related("profile")
-        return queryset
+        results = []
+        new_swipes = []
+        for item in items:
+            target_id = item["swiped_user_id"]
+            result = {"swiped_user_id": target_id, "status": "created"}
+
+            if target_id == user.id:
+                result.update(
+                    status="self", error="Вы не можете свайпнуть самого себя."
+                )
+            elif target_id not in existing_ids:
+                result.update(status="not_found", error="Пользователь не найден.")
+            elif target_id in swiped_ids:
+                result.update(
+                    status="duplicate", error="Вы уже свайпнули этого пользователя."
+                )
+            else:
+                swiped_ids.add(target_id)
+                new_swipes.append(
+                    Swipe(
+                        swiper=user, swiped_user_id=target_id, is_like=item["is_like"]
+                    )
+                )
+            results.append(result)
+
+        liked_ids = [swipe.swiped_user_id for swipe in new_swipes if swipe.is_like]
+
+        with transaction.atomic():
+            self.bulk_create(new_swipes, ignore_conflicts=True)
+
+            if liked_ids:
+                LikeCounterShard.objects.increment(liked_ids)
+
+                matched_ids = set(
+                    self.filter(
+                        swiper_id__in=liked_ids, swiped_user=user, is_like=True
+                    ).values_list("swiper_id", flat=True)
+                )
+                Match.objects.bulk_create(
+                    [
+                        Match(user_id=a, partner_id=b)
+                        for partner_id in matched_ids
+                        for a, b in ((user.id, partner_id), (partner_id, user.id))
+                    ],
+                    ignore_conflicts=True,
+                )
+            else:
+                matched_ids = set()
+
+        graph = loaded_like_graph()
+        if graph is not None and liked_ids:
+            transaction.on_commit(lambda: graph.add_likes(user.id, liked_ids))
+
+        for result in results:
+            if result["status"] == "created":
+                result["matched"] = result["swiped_user_id"] in matched_ids
+        return results
 
 
 class Swipe(models.Model):
@@ -96,6 +245,20 @@ class Swipe(models.Model):
         verbose_name = _("Свайп")
         verbose_name_plural = _("Свайпы")
         unique_together = ("swiper", "swiped_user")
+        indexes = [
+            # Недавние свайпы кандидата для признаков ранжирования
+            # (см. matches.ranking.CandidatePool.load).
+            models.Index(
+                fields=["swiper", "-timestamp", "is_like"],
+                name="swipe_recent_idx",
+            ),
+            # Входящие лайки пользователя по времени; swiper в ключе делает
+            # индекс покрывающим (см. SwipeManager.unanswered_likers).
+            models.Index(
+                fields=["swiped_user", "is_like", "-timestamp", "swiper"],
+                name="swipe_received_idx",
+            ),
+        ]
 
     def __str__(self):
         action = "Лайк" if self.is_like else "Дизлайк"
@@ -104,56 +267,540 @@ class Swipe(models.Model):
     @staticmethod
     def get_viewable_profiles_queryset(user, filters=None):
         """
-        Возвращает QuerySet ВСЕХ профилей, доступных для просмотра (еще не
+        Возвращает QuerySet профилей из колоды пользователя (еще не
         свайпнутых и не сам пользователь), с применением фильтров.
+
+        Без фильтров исключение уже просмотренных профилей происходит при
+        пополнении колоды (см. DeckCard.objects.refill), поэтому стоимость
+        запроса не зависит от длины истории свайпов. Профили из колоды
+        аннотируются оценкой ранжирования deck_score и сортируются по ней.
+
+        Колода ограничена DISCOVER_DECK_SIZE карточками и не знает о фильтрах,
+        поэтому с любым из LIVE_QUERY_FILTERS кандидаты выбираются из всех
+        профилей с исключением свайпнутых по уникальному индексу
+        (swiper, swiped_user), новые первыми.
+
+        Если переданы filters["origin"] (широта, долгота) и
+        filters["radius_km"], кандидаты дополнительно ограничиваются соседними
+        geohash-ячейками вокруг точки и аннотируются полем distance_km.
         """
-        excluded_users = [user.id]
-        already_swiped_ids = Swipe.objects.for_user(user).values_list(
-            "swiped_user_id", flat=True
-        )
-        excluded_users.extend(already_swiped_ids)
+        from profiles import geo
+        from profiles.models import Profile, normalize_city_name
 
-        profiles_qs = settings.AUTH_USER_MODEL.objects.exclude(id__in=excluded_users)
-        profiles_qs = profiles_qs.exclude(is_staff=True).filter(is_active=True)
+        filters = filters or {}
 
-        if filters:
-            if "gender" in filters:
-                profiles_qs = profiles_qs.filter(profile__gender=filters["gender"])
-            if "city" in filters:
+        live = uses_live_query(filters)
+        if live:
+            already_swiped = Swipe.objects.filter(
+                swiper=user, swiped_user=OuterRef("user_id")
+            )
+            profiles_qs = (
+                Profile.objects.filter(user__is_active=True, user__is_staff=False)
+                .exclude(user=user)
+                .exclude(Exists(already_swiped))
+            )
+        else:
+            profiles_qs = Profile.objects.filter(
+                user__deck_appearances__owner=user,
+                user__is_active=True,
+                user__is_staff=False,
+            ).annotate(deck_score=F("user__deck_appearances__score"))
+
+        if "radius_km" in filters:
+            latitude, longitude = filters["origin"]
+            precision = geo.precision_for_radius(latitude, filters["radius_km"])
+            if precision:
+                cells = geo.neighbour_cells(latitude, longitude, precision)
                 profiles_qs = profiles_qs.filter(
-                    profile__city__icontains=filters["city"]
+                    reduce(or_, (Q(geohash__startswith=cell) for cell in cells))
                 )
-            if "status" in filters:
-                profiles_qs = profiles_qs.filter(profile__status=filters["status"])
 
-            if "min_age" in filters or "max_age" in filters:
-                age_sql = ExpressionWrapper(
-                    ExtractYear(date.today()) - ExtractYear(F("profile__birth_date")),
-                    output_field=fields.IntegerField(),
-                )
-                profiles_qs = profiles_qs.annotate(age=age_sql)
+            profiles_qs = profiles_qs.annotate(
+                distance_km=geo.distance_expression(latitude, longitude)
+            ).filter(distance_km__lte=filters["radius_km"])
 
-                if "min_age" in filters:
-                    profiles_qs = profiles_qs.filter(age__gte=filters["min_age"])
-                if "max_age" in filters:
-                    profiles_qs = profiles_qs.filter(age__lte=filters["max_age"])
+        if "gender" in filters:
+            profiles_qs = profiles_qs.filter(gender=filters["gender"])
+        if "city" in filters:
+            profiles_qs = profiles_qs.filter(
+                city_ref__normalized_name=normalize_city_name(filters["city"])
+            )
+        if "status" in filters:
+            profiles_qs = profiles_qs.filter(status=filters["status"])
+
+        # Возраст переводится в диапазон дат рождения, чтобы фильтр
+        # использовал индекс по birth_date и совпадал с Profile.age.
+        today = timezone.now().date()
+        if "min_age" in filters:
+            profiles_qs = profiles_qs.filter(
+                birth_date__lte=_years_before(today, filters["min_age"])
+            )
+        if "max_age" in filters:
+            profiles_qs = profiles_qs.filter(
+                birth_date__gt=_years_before(today, filters["max_age"] + 1)
+            )
 
-        return profiles_qs.order_by("-date_joined")
+        ordering = "-user__date_joined" if live else "-deck_score"
+        return profiles_qs.select_related("user").order_by(ordering)
 
     @staticmethod
     def check_match_exists(user1, user2):
         """
-        Проверяет, существует ли взаимный лайк (мэтч) между user1 и user2.
+        Проверяет, существует ли взаимный лайк (мэтч) между user1 и user2
+        (пользователями или их id). При включенном графе лайков проверка
+        идет в памяти процесса.
         """
-        liked_1_to_2 = Swipe.objects.filter(
-            swiper=user1, swiped_user=user2, is_like=True
-        ).exists()
+        graph = get_like_graph()
+        if graph is not None:
+            return graph.is_mutual(
+                getattr(user1, "pk", user1), getattr(user2, "pk", user2)
+            )
 
-        liked_2_to_1 = Swipe.objects.filter(
-            swiper=user2, swiped_user=user1, is_like=True
+        return Match.objects.filter(user=user1, partner=user2).exists()
+
+
+class MatchManager(models.Manager):
+    def create_for_swipe(self, swipe):
+        """
+        Создает мэтч, если лайк взаимный. Мэтч хранится двумя направленными
+        записями (user -> partner), чтобы список мэтчей и проверка мэтча
+        были одним поиском по индексу. Возвращает True, если мэтч есть.
+        """
+        if not swipe.is_like:
+            return False
+
+        reciprocal = Swipe.objects.filter(
+            swiper_id=swipe.swiped_user_id,
+            swiped_user_id=swipe.swiper_id,
+            is_like=True,
         ).exists()
+        if not reciprocal:
+            return False
+
+        self.bulk_create(
+            [
+                Match(user_id=swipe.swiper_id, partner_id=swipe.swiped_user_id),
+                Match(user_id=swipe.swiped_user_id, partner_id=swipe.swiper_id),
+            ],
+            ignore_conflicts=True,
+        )
+        return True
+
+    def delete_between(self, user1_id, user2_id):
+        """Удаляет обе записи мэтча между пользователями."""
+        return self.filter(
+            Q(user_id=user1_id, partner_id=user2_id)
+            | Q(user_id=user2_id, partner_id=user1_id)
+        ).delete()
+
+
+class Match(models.Model):
+    """
+    Взаимная симпатия. Для каждой пары пользователей хранятся две записи:
+    (A, B) и (B, A).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="matches",
+    )
+    partner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="matched_with",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MatchManager()
+
+    class Meta:
+        verbose_name = _("Мэтч")
+        verbose_name_plural = _("Мэтчи")
+        unique_together = ("user", "partner")
+
+    def __str__(self):
+        return f"Мэтч {self.user_id} и {self.partner_id}"
+
+
+@receiver(post_save, sender=Swipe)
+def create_match_on_mutual_like(sender, instance, created, **kwargs):
+    if created:
+        instance.matched = Match.objects.create_for_swipe(instance)
+
+        graph = loaded_like_graph()
+        if graph is not None and instance.is_like:
+            transaction.on_commit(
+                lambda: graph.add_like(instance.swiper_id, instance.swiped_user_id)
+            )
+
+
+class LikeRemovalManager(models.Manager):
+    def prune(self):
+        """Удаляет записи старше LIKE_GRAPH_STALE_SECONDS (см. LikeGraph.refresh)."""
+        cutoff = timezone.now() - timedelta(seconds=settings.LIKE_GRAPH_STALE_SECONDS)
+        return self.filter(removed_at__lt=cutoff).delete()
+
+
+class LikeRemoval(models.Model):
+    """
+    Удаленный лайк. По этим записям графы лайков других процессов догружают
+    удаления (см. matches.graph); пользователи хранятся id без внешних
+    ключей, чтобы запись пережила удаление пользователя.
+    """
+
+    swiper_id = models.BigIntegerField()
+    swiped_user_id = models.BigIntegerField()
+    removed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    objects = LikeRemovalManager()
+
+    class Meta:
+        verbose_name = _("Удаленный лайк")
+        verbose_name_plural = _("Удаленные лайки")
+
+
+@receiver(post_delete, sender=Swipe)
+def delete_match_on_swipe_delete(sender, instance, **kwargs):
+    if instance.is_like:
+        Match.objects.delete_between(instance.swiper_id, instance.swiped_user_id)
+        LikeRemoval.objects.create(
+            swiper_id=instance.swiper_id, swiped_user_id=instance.swiped_user_id
+        )
+
+        graph = loaded_like_graph()
+        if graph is not None:
+            transaction.on_commit(
+                lambda: graph.remove_like(instance.swiper_id, instance.swiped_user_id)
+            )
+
+
+class DeckCardManager(models.Manager):
+    def for_owner(self, user):
+        """Возвращает QuerySet карточек колоды данного пользователя."""
+        return self.filter(owner=user)
+
+    def needs_refill(self, user):
+        """
+        Проверяет, опустилась ли колода ниже порога пополнения или устарели ли
+        оценки ее карточек (пополнение раньше DISCOVER_DECK_RESCORE_SECONDS).
+        """
+        low_watermark = settings.DISCOVER_DECK_LOW_WATERMARK
+        fresh_since = timezone.now() - timedelta(
+            seconds=settings.DISCOVER_DECK_RESCORE_SECONDS
+        )
+        fresh_cards = self.for_owner(user).filter(
+            owner__discover_deck__refilled_at__gte=fresh_since
+        )
+        return fresh_cards[:low_watermark].count() < low_watermark
+
+    def request_refill(self, user):
+        """
+        Ставит колоду пользователя в очередь пополнения. Само пополнение
+        выполняет команда refill_decks (см. process_refill_requests), а не
+        запрос пользователя. У колоды, уже стоящей в очереди, сохраняется
+        время первого запроса.
+        """
+        now = timezone.now()
+        queued = DiscoverDeck.objects.filter(owner=user).update(
+            refill_requested_at=Coalesce("refill_requested_at", now)
+        )
+        if not queued:
+            DiscoverDeck.objects.get_or_create(
+                owner=user, defaults={"refill_requested_at": now}
+            )
+
+    def process_refill_requests(self, limit=None, size=None):
+        """
+        Пополняет колоды из очереди, начиная с самых давних запросов.
+        Колода блокируется на время пополнения (skip_locked), поэтому
+        параллельные обработчики не пополняют одну колоду дважды. Возвращает
+        пару (пополнено колод, добавлено карточек).
+        """
+        deck_ids = DiscoverDeck.objects.filter(
+            refill_requested_at__isnull=False
+        ).order_by("refill_requested_at")
+        if limit:
+            deck_ids = deck_ids[:limit]
+
+        refilled = 0
+        added = 0
+        for deck_id in list(deck_ids.values_list("id", flat=True)):
+            with transaction.atomic():
+                deck = (
+                    DiscoverDeck.objects.select_for_update(
+                        skip_locked=True, of=("self",)
+                    )
+                    .select_related("owner")
+                    .filter(pk=deck_id, refill_requested_at__isnull=False)
+                    .first()
+                )
+                if deck is None:
+                    continue
+                added += self.refill(deck.owner, size=size)
+                refilled += 1
+        return refilled, added
+
+    def _scan(self, deck, seen, limit, exclude):
+        """
+        Возвращает до limit непросмотренных кандидатов не из exclude и
+        сдвигает курсоры колоды.
+
+        Сначала просматриваются пользователи, зарегистрировавшиеся после
+        deck.newest_id, затем продолжается круговой обход всех пользователей
+        от deck.cursor вниз, от новых к старым. Дойдя до самого старого, обход
+        начинается заново с новейших, поэтому пропущенные ранее пользователи
+        (еще без профиля или неактивные) рассматриваются снова. За одно
+        пополнение просматривается не больше DISCOVER_REFILL_SCAN_LIMIT
+        пользователей.
+        """
+        User = get_user_model()
+        candidates = User.objects.filter(
+            is_active=True, is_staff=False, profile__isnull=False
+        ).values_list("id", flat=True)
+        batch = limit * 2
+        budget = settings.DISCOVER_REFILL_SCAN_LIMIT
+
+        found = []
+        considered = set(exclude)
+
+        def consider(pk):
+            if pk not in seen and pk not in considered:
+                found.append(pk)
+            considered.add(pk)
+            return len(found) < limit
+
+        # Новые пользователи, по возрастанию id.
+        while len(found) < limit and budget > 0:
+            scanned = list(
+                candidates.filter(id__gt=deck.newest_id).order_by("id")[:batch]
+            )
+            if not scanned:
+                break
+            for pk in scanned:
+                deck.newest_id = pk
+                budget -= 1
+                if not consider(pk):
+                    break
+
+        # Круговой обход, от новых к старым.
+        wrapped = False
+        while len(found) < limit and budget > 0:
+            scanned = list(
+                candidates.filter(id__lt=deck.cursor).order_by("-id")[:batch]
+            )
+            if not scanned:
+                if wrapped:
+                    break
+                wrapped = True
+                deck.cursor = deck.newest_id + 1
+                continue
+            for pk in scanned:
+                deck.cursor = pk
+                budget -= 1
+                if not consider(pk):
+                    break
+
+        return found
+
+    def refill(self, user, size=None):
+        """
+        Пополняет колоду пользователя кандидатами, которых он еще не свайпал.
+
+        Пул из DISCOVER_REFILL_POOL кандидатов отбирается обходом пользователей
+        по id (см. _scan) и отсеивается в памяти по множеству просмотренных
+        (см. matches.seen), без соединения с таблицей свайпов. Кроме того, в
+        пул подмешиваются еще не просмотренные кандидаты из коллаборативных
+        рекомендаций (Recommendation) независимо от курсора.
+
+        Пул оценивается (см. matches.ranking) вместе с карточками, уже
+        лежащими в колоде, и в колоде остаются size лучших: новые карточки
+        добавляются, вытесненные удаляются (они вернутся в пул при следующем
+        круге обхода). Оценки оставшихся карточек не перезаписываются:
+        клиент может листать колоду keyset-курсором по ("-score", "-id"), и
+        смена оценки под курсором пропустила бы или повторила карточки.
+        Вызывается из команды refill_decks, а не из запроса пользователя.
+        Возвращает количество добавленных карточек.
+        """
+        from .ranking import get_ranker
+        from .seen import get_seen_set
+
+        User = get_user_model()
+        size = size or settings.DISCOVER_DECK_SIZE
+
+        deck, _ = DiscoverDeck.objects.get_or_create(owner=user)
+        if deck.refilled_at is None:
+            # Новая колода начинает обход с новейших пользователей.
+            deck.newest_id = User.objects.aggregate(newest=Max("id"))["newest"] or 0
+            deck.cursor = deck.newest_id + 1
+        seen = get_seen_set(user)
+
+        cards = {card.candidate_id: card for card in self.for_owner(user)}
+        in_deck = set(cards)
+        candidate_ids = self._scan(
+            deck, seen, max(size, settings.DISCOVER_REFILL_POOL), in_deck
+        )
+
+        recommended = [
+            pk
+            for pk in Recommendation.objects.for_user(user).values_list(
+                "candidate_id", flat=True
+            )[: settings.DISCOVER_RECOMMENDED_PER_REFILL]
+            if pk not in seen and pk not in candidate_ids
+        ]
+        candidate_ids.extend(pk for pk in recommended if pk not in in_deck)
+
+        scores = {}
+        if candidate_ids or cards:
+            scores = get_ranker().score_candidates(user, [*cards, *candidate_ids])
+        ranked = sorted(
+            [*cards, *candidate_ids], key=lambda pk: (-scores.get(pk, 0.0), -pk)
+        )
+        keep = set(ranked[:size])
+
+        added = [pk for pk in candidate_ids if pk in keep]
+        self.bulk_create(
+            [
+                DeckCard(owner=user, candidate_id=pk, score=scores.get(pk, 0.0))
+                for pk in added
+            ],
+            ignore_conflicts=True,
+        )
+        dropped = in_deck - keep
+        if dropped:
+            self.filter(owner=user, candidate_id__in=dropped).delete()
+        if added or dropped:
+            # Закэшированная выдача discover построена по старой колоде.
+            transaction.on_commit(partial(bump_cache_version, user.id))
+
+        deck.refilled_at = timezone.now()
+        deck.refill_requested_at = None
+        deck.save(
+            update_fields=["cursor", "newest_id", "refilled_at", "refill_requested_at"]
+        )
+        return len(added)
+
+    def discard(self, user, candidate_ids):
+        """Убирает из колоды пользователя карточки свайпнутых кандидатов."""
+        return self.filter(owner=user, candidate_id__in=candidate_ids).delete()
+
+
+class DiscoverDeck(models.Model):
+    """
+    Состояние материализованной колоды пользователя: id новейшего
+    просмотренного при пополнениях пользователя, курсор кругового обхода
+    пользователей от новых к старым (см. DeckCardManager._scan), время
+    последнего пополнения и время запроса пополнения, если колода стоит в
+    очереди (см. DeckCardManager.request_refill).
+    """
+
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="discover_deck",
+    )
+    cursor = models.BigIntegerField(default=0)
+    newest_id = models.BigIntegerField(default=0)
+    refilled_at = models.DateTimeField(null=True, blank=True)
+    refill_requested_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Колода рекомендаций")
+        verbose_name_plural = _("Колоды рекомендаций")
+
+
+class DeckCard(models.Model):
+    """
+    Карточка кандидата в колоде пользователя. Удаляется, как только владелец
+    колоды свайпает кандидата.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="deck_cards",
+    )
+    candidate = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="deck_appearances",
+    )
+    # Оценка ранжирования на момент пополнения колоды (см. matches.ranking).
+    score = models.FloatField(default=0)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DeckCardManager()
+
+    class Meta:
+        verbose_name = _("Карточка колоды")
+        verbose_name_plural = _("Карточки колоды")
+        unique_together = ("owner", "candidate")
+        indexes = [
+            models.Index(fields=["owner", "-score"], name="deckcard_owner_score_idx"),
+        ]
+
+
+class RecommendationManager(models.Manager):
+    def for_user(self, user):
+        """
+        Рекомендации пользователя по убыванию оценки, только для активных
+        кандидатов с профилем.
+        """
+        return self.filter(
+            user=user,
+            candidate__is_active=True,
+            candidate__is_staff=False,
+            candidate__profile__isnull=False,
+        ).order_by("-score")
+
+
+class Recommendation(models.Model):
+    """
+    Кандидат из коллаборативных рекомендаций пользователя (top-K по
+    совместным лайкам, см. matches.recommendations). Строки пользователя
+    целиком заменяются командой build_recommendations.
+    """
 
-        return liked_1_to_2 and liked_2_to_1
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recommendations",
+    )
+    candidate = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.FloatField()
+
+    objects = RecommendationManager()
+
+    class Meta:
+        verbose_name = _("Рекомендация")
+        verbose_name_plural = _("Рекомендации")
+        unique_together = ("user", "candidate")
+        indexes = [
+            models.Index(fields=["user", "-score"], name="recommendation_user_idx"),
+        ]
+
+
+class RecommendationRun(models.Model):
+    """
+    Запуск build_recommendations. last_swipe_id последнего завершенного
+    запуска — водяной знак: следующий запуск читает только свайпы новее.
+    """
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_swipe_id = models.BigIntegerField(default=0)
+    full = models.BooleanField(default=False)
+    swipes_processed = models.PositiveBigIntegerField(default=0)
+    users_updated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Построение рекомендаций")
+        verbose_name_plural = _("Построения рекомендаций")
+        get_latest_by = "finished_at"
 
 
 class MatchAction(models.Model):
@@ -207,6 +854,7 @@ class ContactRequest(models.Model):
     )
     sent_at = models.DateTimeField(auto_now_add=True)
     responded_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     sender_contact_email = models.EmailField(null=True, blank=True)
     receiver_contact_email = models.EmailField(null=True, blank=True)
@@ -0,0 +1,173 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+def _reverse_ordering(ordering):
+    return tuple(
+        field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+    )
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация по составному ключу (например, ("-sent_at", "-id")).
+
+    В отличие от стандартной CursorPagination, курсор хранит значения всех полей
+    сортировки, поэтому страница выбирается одним условием
+    (k1 < v1) OR (k1 = v1 AND k2 < v2) без OFFSET и без COUNT(*), а стоимость
+    запроса не зависит от глубины. Последнее поле сортировки должно быть
+    уникальным (обычно id), поля ключа не должны содержать NULL.
+    """
+
+    ordering = ("-id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor.reverse)
+        self.current_position = self.cursor.position if self.cursor else None
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.current_position is not None:
+            queryset = queryset.filter(
+                self._get_keyset_filter(ordering, self.current_position)
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_more = len(results) > self.page_size
+        has_cursor = self.current_position is not None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, has_cursor
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Возвращает ключ сортировки. View может переопределить его методом
+        get_pagination_ordering (например, для сортировки по расстоянию).
+        """
+        ordering = self.ordering
+        if hasattr(view, "get_pagination_ordering"):
+            ordering = view.get_pagination_ordering() or ordering
+
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.current_position
+
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.current_position
+
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get("r", ["0"])[0]))
+            position = json.loads(tokens["p"][0])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {"p": json.dumps(cursor.position, default=str)}
+        if cursor.reverse:
+            tokens["r"] = "1"
+
+        querystring = parse.urlencode(tokens)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            value = instance
+            for attr in field.lstrip("-").split("__"):
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            position.append(value)
+        return position
+
+    @staticmethod
+    def _get_keyset_filter(ordering, position):
+        """
+        Строит условие «строго после позиции» для составного ключа сортировки.
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+
+            equal_prefix = {ordering[i].lstrip("-"): position[i] for i in range(index)}
+            conditions.append(
+                Q(**equal_prefix, **{f"{name}__{lookup}": position[index]})
+            )
+        return reduce(or_, conditions)
+
+
+class DiscoverCursorPagination(KeysetCursorPagination):
+    ordering = ("-deck_score", "-id")
+
+
+class MatchCursorPagination(KeysetCursorPagination):
+    ordering = ("-matched_at", "-id")
+
+
+class SwipeHistoryCursorPagination(KeysetCursorPagination):
+    ordering = ("-swiped_at", "-id")
+
+
+class ReceivedLikesCursorPagination(KeysetCursorPagination):
+    ordering = ("-liked_at", "-id")
+
+
+class ContactRequestCursorPagination(KeysetCursorPagination):
+    ordering = ("-sent_at", "-id")
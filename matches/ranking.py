@@ -0,0 +1,246 @@
+"""
+Ранжирование кандидатов колоды рекомендаций.
+
+При пополнении колоды (DeckCard.objects.refill) пул кандидатов загружается
+несколькими запросами в массивы NumPy и оценивается одним векторизованным проходом
+без циклов по кандидатам. Оценка — взвешенная сумма признаков в диапазоне
+[0, 1]:
+
+- age — близость возраста к возрасту владельца колоды;
+- city — совпадение города из справочника;
+- popularity — likes_count в логарифмической шкале, нормированный по пулу;
+- recency — давность последней активности (период полураспада в днях):
+  последнего свайпа кандидата за DISCOVER_RANKING_STATS_DAYS дней, а без
+  свайпов — последнего входа или регистрации;
+- reciprocal — вероятность ответного лайка: 1, если кандидат уже лайкнул
+  владельца колоды, иначе сглаженная доля лайков среди свайпов кандидата
+  за последние DISCOVER_RANKING_STATS_DAYS дней;
+- collaborative — оценка из коллаборативных рекомендаций владельца колоды
+  (см. matches.recommendations), нормированная по пулу.
+
+Веса задаются в settings.DISCOVER_RANKING_WEIGHTS, класс ранжирования —
+в settings.DISCOVER_RANKER.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+FEATURES = ("age", "city", "popularity", "recency", "reciprocal", "collaborative")
+
+# Масштаб убывания признака age (годы разницы в возрасте).
+AGE_SCALE_YEARS = 5.0
+# Период полураспада признака recency (дни без активности).
+RECENCY_HALF_LIFE_DAYS = 7.0
+SECONDS_PER_DAY = 86400.0
+DAYS_PER_YEAR = 365.25
+
+
+class CandidatePool:
+    """
+    Признаки пула кандидатов: массивы одинаковой длины, выровненные по ids.
+    Даты хранятся числами (день по григорианскому календарю, Unix-время),
+    отсутствующий город — -1.
+    """
+
+    def __init__(
+        self,
+        ids,
+        birth_days,
+        city_ids,
+        likes_count,
+        active_at,
+        swipes_total=None,
+        likes_given=None,
+        liked_viewer=None,
+        recommended=None,
+    ):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        size = len(self.ids)
+        self.birth_days = np.asarray(birth_days, dtype=np.float64)
+        self.city_ids = np.asarray(city_ids, dtype=np.int64)
+        self.likes_count = np.asarray(likes_count, dtype=np.float64)
+        self.active_at = np.asarray(active_at, dtype=np.float64)
+        self.swipes_total = _or_zeros(swipes_total, size, np.float64)
+        self.likes_given = _or_zeros(likes_given, size, np.float64)
+        self.liked_viewer = _or_zeros(liked_viewer, size, bool)
+        self.recommended = _or_zeros(recommended, size, np.float64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, viewer, candidate_ids):
+        """
+        Загружает признаки кандидатов: запрос по профилям, агрегирующий
+        запрос по недавним свайпам кандидатов (диапазоны индекса
+        swipe_recent_idx, а не вся история; из него же берется время
+        последней активности), запрос лайков владельцу колоды
+        (по индексу swipe_received_idx) и запрос рекомендаций владельца.
+        """
+        from profiles.models import Profile
+
+        from .models import Recommendation, Swipe
+
+        rows = list(
+            Profile.objects.filter(user_id__in=candidate_ids)
+            .order_by("user_id")
+            .values_list(
+                "user_id",
+                "birth_date",
+                "city_ref_id",
+                "likes_count",
+                "user__last_login",
+                "user__date_joined",
+            )
+        )
+        if not rows:
+            return cls([], [], [], [], [])
+
+        ids, birth_dates, city_ids, likes, last_logins, joined = zip(*rows)
+        pool = cls(
+            ids,
+            [day.toordinal() for day in birth_dates],
+            [-1 if city_id is None else city_id for city_id in city_ids],
+            likes,
+            [
+                (last_login or date_joined).timestamp()
+                for last_login, date_joined in zip(last_logins, joined)
+            ],
+        )
+
+        since = timezone.now() - timedelta(days=settings.DISCOVER_RANKING_STATS_DAYS)
+        stats = list(
+            Swipe.objects.filter(swiper_id__in=ids, timestamp__gte=since)
+            .values("swiper_id")
+            .annotate(
+                total=Count("id"),
+                likes=Count("id", filter=Q(is_like=True)),
+                last_swipe=Max("timestamp"),
+            )
+            .values_list("swiper_id", "total", "likes", "last_swipe")
+        )
+        if stats:
+            swipers, totals, likes_given, last_swipes = zip(*stats)
+            index = np.searchsorted(pool.ids, np.asarray(swipers, dtype=np.int64))
+            pool.swipes_total[index] = totals
+            pool.likes_given[index] = likes_given
+            # last_login не обновляется при входе по JWT, поэтому активность
+            # определяется прежде всего по свайпам.
+            pool.active_at[index] = np.maximum(
+                pool.active_at[index], [moment.timestamp() for moment in last_swipes]
+            )
+
+        liked_viewer = np.array(
+            Swipe.objects.filter(
+                swiped_user=viewer, is_like=True, swiper_id__in=ids
+            ).values_list("swiper_id", flat=True),
+            dtype=np.int64,
+        )
+        pool.liked_viewer[np.searchsorted(pool.ids, liked_viewer)] = True
+
+        recommended = np.array(
+            Recommendation.objects.filter(
+                user=viewer, candidate_id__in=ids
+            ).values_list("candidate_id", "score"),
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        index = np.searchsorted(pool.ids, recommended[:, 0].astype(np.int64))
+        pool.recommended[index] = recommended[:, 1]
+        return pool
+
+
+def _or_zeros(values, size, dtype):
+    if values is None:
+        return np.zeros(size, dtype=dtype)
+    return np.asarray(values, dtype=dtype)
+
+
+class CandidateRanker:
+    """
+    Векторизованная оценка пула кандидатов для владельца колоды. weights
+    дополняют и переопределяют settings.DISCOVER_RANKING_WEIGHTS.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = {**settings.DISCOVER_RANKING_WEIGHTS, **(weights or {})}
+
+    def features(self, pool, birth_day=None, city_id=None, now=None):
+        """Возвращает словарь {признак: массив значений в [0, 1]}."""
+        now = (now or timezone.now()).timestamp()
+
+        if birth_day is None:
+            age = np.zeros(len(pool))
+        else:
+            years = np.abs(pool.birth_days - birth_day) / DAYS_PER_YEAR
+            age = np.exp(-years / AGE_SCALE_YEARS)
+
+        if city_id is None:
+            city = np.zeros(len(pool))
+        else:
+            city = (pool.city_ids == city_id).astype(np.float64)
+
+        popularity = np.log1p(pool.likes_count)
+        peak = popularity.max(initial=0.0)
+        if peak > 0:
+            popularity /= peak
+
+        idle_days = np.maximum(now - pool.active_at, 0.0) / SECONDS_PER_DAY
+        recency = np.exp2(-idle_days / RECENCY_HALF_LIFE_DAYS)
+
+        reciprocal = np.where(
+            pool.liked_viewer,
+            1.0,
+            (pool.likes_given + 1.0) / (pool.swipes_total + 2.0),
+        )
+
+        collaborative = pool.recommended.copy()
+        peak = collaborative.max(initial=0.0)
+        if peak > 0:
+            collaborative /= peak
+
+        return {
+            "age": age,
+            "city": city,
+            "popularity": popularity,
+            "recency": recency,
+            "reciprocal": reciprocal,
+            "collaborative": collaborative,
+        }
+
+    def score(self, pool, birth_day=None, city_id=None, now=None):
+        """Оценка каждого кандидата пула (массив той же длины)."""
+        features = self.features(pool, birth_day, city_id, now)
+        scores = np.zeros(len(pool))
+        for name in FEATURES:
+            weight = self.weights.get(name, 0.0)
+            if weight:
+                scores += weight * features[name]
+        return scores
+
+    def rank(self, pool, birth_day=None, city_id=None, now=None):
+        """
+        Возвращает (ids, scores) кандидатов по убыванию оценки; при равной
+        оценке первым идет больший id.
+        """
+        scores = self.score(pool, birth_day, city_id, now)
+        order = np.lexsort((-pool.ids, -scores))
+        return pool.ids[order], scores[order]
+
+    def score_candidates(self, viewer, candidate_ids):
+        """Загружает пул кандидатов и возвращает словарь {id: оценка}."""
+        pool = CandidatePool.load(viewer, candidate_ids)
+        profile = getattr(viewer, "profile", None)
+        birth_day = profile.birth_date.toordinal() if profile else None
+        city_id = profile.city_ref_id if profile else None
+
+        scores = self.score(pool, birth_day, city_id)
+        return dict(zip(pool.ids.tolist(), scores.tolist()))
+
+
+def get_ranker():
+    return import_string(settings.DISCOVER_RANKER)()
@@ -0,0 +1,367 @@
+"""
+Офлайн-рекомендации по совместным лайкам (item-item collaborative filtering).
+
+Свайпы — неявная обратная связь: разреженная матрица пользователь ×
+пользователь, где строка — свайпер, столбец — свайпнутый. Похожесть двух
+кандидатов — косинусная мера по лайкам: число пользователей, лайкнувших
+обоих, деленное на корень из произведения их популярности. Оценка кандидата c
+для пользователя u — сумма похожестей c на всех, кого u лайкнул:
+
+    score(u, c) = Σ_{i ∈ likes(u)} co(i, c) / sqrt(pop(i) · pop(c))
+
+Она считается без построения матрицы похожести целиком: от u к лайкнутым
+им кандидатам, от них к их лайкнувшим (не больше max_neighbors последних),
+от тех к их лайкам, и веса суммируются np.bincount.
+
+Между запусками хранится сам индекс лайков (CoLikeIndex) в снимке
+settings.RECOMMENDATION_MATRIX_PATH. Запуск дочитывает из базы пачками свайпы
+новее водяного знака (последнего учтенного id) с перекрытием SWIPE_OVERLAP id,
+отсеивает уже учтенные по id, дописывает новые ребра в индекс без его
+перестройки и пересчитывает рекомендации только их авторам. Удаленные свайпы
+в снимке не отражаются — их убирает полная перестройка (full=True); свайпы
+удаленных пользователей остаются в снимке, но при записи такие пользователи
+пропускаются.
+"""
+
+import logging
+import os
+import tempfile
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Recommendation, RecommendationRun, Swipe
+
+logger = logging.getLogger(__name__)
+
+SWIPE_CHUNK_SIZE = 100_000
+WRITE_BATCH_SIZE = 500
+# Догрузка перечитывает столько последних id до водяного знака, чтобы не
+# пропустить свайпы, зафиксированные позже свайпов с большими id (как
+# matches.graph.REFRESH_OVERLAP).
+SWIPE_OVERLAP = 1000
+
+
+def _id_dtype(max_id):
+    return np.int32 if max_id < 2**31 else np.int64
+
+
+class SwipeMatrix:
+    """
+    Свайпы в виде параллельных массивов (ребра разреженной матрицы): id
+    свайпа, id свайпера, id свайпнутого и признак лайка.
+    """
+
+    def __init__(self, swipe_ids=(), swipers=(), targets=(), likes=()):
+        self.swipe_ids = np.asarray(swipe_ids, dtype=np.int64)
+        self.swipers = np.asarray(swipers, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.likes = np.asarray(likes, dtype=bool)
+
+    def __len__(self):
+        return len(self.swipers)
+
+    @classmethod
+    def from_db(cls, after_id=0, known_ids=(), chunk_size=SWIPE_CHUNK_SIZE):
+        """
+        Читает из базы пачками по id свайпы с id больше after_id - SWIPE_OVERLAP,
+        кроме уже учтенных known_ids.
+        """
+        chunks = []
+        last_id = max(after_id - SWIPE_OVERLAP, 0)
+        while True:
+            rows = np.array(
+                Swipe.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "swiper_id", "swiped_user_id", "is_like")[
+                    :chunk_size
+                ],
+                dtype=np.int64,
+            ).reshape(-1, 4)
+            if not len(rows):
+                break
+            chunks.append(rows[~np.isin(rows[:, 0], known_ids)])
+            last_id = int(rows[-1, 0])
+
+        if not chunks:
+            return cls()
+        rows = np.concatenate(chunks)
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3].astype(bool))
+
+
+def _empty_csr():
+    return np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+
+def _reindex(indptr, cols, mapping, size):
+    """
+    Переносит CSR-представление в расширенное пространство номеров: mapping —
+    новые номера старых строк (по возрастанию).
+    """
+    counts = np.zeros(size, dtype=np.int64)
+    counts[mapping] = np.diff(indptr)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, mapping[cols]
+
+
+def _append(indptr, cols, rows, new_cols, size):
+    """
+    Добавляет ребра (rows, new_cols) в конец строк CSR-представления.
+    Сортируются только новые ребра, порядок внутри строки остается порядком
+    свайпов.
+    """
+    order = np.argsort(rows, kind="stable")
+    rows, new_cols = rows[order], new_cols[order]
+    # При равных позициях np.insert сохраняет порядок вставляемых значений.
+    cols = np.insert(cols, indptr[rows + 1], new_cols)
+    added = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=added[1:])
+    return indptr + added, cols
+
+
+def _ranges(starts, ends):
+    """Индексы всех полуинтервалов [starts[k], ends[k]) одним массивом."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+class CoLikeIndex:
+    """
+    Индексы матрицы лайков для расчета рекомендаций: id пользователей
+    сжимаются в плотные номера, лайки хранятся по строкам (кого лайкнул) и
+    по столбцам (кто лайкнул), все свайпы — по строкам для исключения уже
+    просмотренных.
+
+    Индекс сохраняется между запусками вместе с водяным знаком (id последнего
+    учтенного свайпа) и id свайпов окна перекрытия (последние SWIPE_OVERLAP
+    id), по которым отсеиваются уже учтенные свайпы при догрузке.
+    """
+
+    CSR = ("liked", "likers", "seen")
+
+    def __init__(self, max_neighbors=500):
+        self.max_neighbors = max_neighbors
+        self.ids = np.empty(0, dtype=np.int64)
+        for name in self.CSR:
+            self._set_csr(name, *_empty_csr())
+        self.popularity = np.empty(0, dtype=np.float64)
+        self.watermark = 0
+        self.recent_ids = np.empty(0, dtype=np.int64)
+
+    def _get_csr(self, name):
+        return getattr(self, f"{name}_ptr"), getattr(self, name)
+
+    def _set_csr(self, name, indptr, cols):
+        setattr(self, f"{name}_ptr", indptr)
+        setattr(self, name, cols)
+
+    @classmethod
+    def load(cls, path, max_neighbors=500):
+        """
+        Читает снимок индекса; если его нет или он старого формата,
+        возвращает пустой индекс.
+        """
+        index = cls(max_neighbors)
+        try:
+            with np.load(path) as data:
+                index.ids = data["ids"].astype(np.int64)
+                for name in cls.CSR:
+                    index._set_csr(
+                        name,
+                        data[f"{name}_ptr"].astype(np.int64),
+                        data[name].astype(np.int64),
+                    )
+                index.watermark = int(data["watermark"])
+                index.recent_ids = data["recent_ids"].astype(np.int64)
+        except (FileNotFoundError, KeyError):
+            return cls(max_neighbors)
+        index.popularity = np.diff(index.likers_ptr).astype(np.float64)
+        return index
+
+    def save(self, path):
+        """Атомарно записывает снимок в компактных типах."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        arrays = {
+            "ids": self.ids.astype(_id_dtype(self.ids.max(initial=0))),
+            "watermark": np.int64(self.watermark),
+            "recent_ids": self.recent_ids,
+        }
+        dtype = _id_dtype(len(self.ids))
+        for name in self.CSR:
+            indptr, cols = self._get_csr(name)
+            arrays[f"{name}_ptr"] = indptr
+            arrays[name] = cols.astype(dtype)
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                np.savez(target, **arrays)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def extend(self, matrix):
+        """
+        Добавляет в индекс свайпы matrix без перестройки: новые пользователи
+        получают номера, новые ребра дописываются в конец строк.
+        """
+        if len(matrix):
+            ids = np.union1d(self.ids, np.concatenate([matrix.swipers, matrix.targets]))
+            if len(ids) != len(self.ids):
+                mapping = np.searchsorted(ids, self.ids)
+                for name in self.CSR:
+                    self._set_csr(
+                        name, *_reindex(*self._get_csr(name), mapping, len(ids))
+                    )
+                self.ids = ids
+
+            size = len(self.ids)
+            swipers = np.searchsorted(self.ids, matrix.swipers)
+            targets = np.searchsorted(self.ids, matrix.targets)
+            liked_by, liked = swipers[matrix.likes], targets[matrix.likes]
+            for name, rows, cols in (
+                ("liked", liked_by, liked),
+                ("likers", liked, liked_by),
+                ("seen", swipers, targets),
+            ):
+                self._set_csr(name, *_append(*self._get_csr(name), rows, cols, size))
+            self.popularity = np.diff(self.likers_ptr).astype(np.float64)
+
+        self.watermark = max(self.watermark, int(matrix.swipe_ids.max(initial=0)))
+        recent_ids = np.concatenate([self.recent_ids, matrix.swipe_ids])
+        self.recent_ids = recent_ids[recent_ids > self.watermark - SWIPE_OVERLAP]
+
+    def swipers(self):
+        """Возвращает id всех пользователей, сделавших хотя бы один свайп."""
+        return self.ids[np.diff(self.seen_ptr) > 0]
+
+    def _tail(self, indptr, rows):
+        # Не больше max_neighbors последних (по порядку свайпов) элементов строки.
+        ends = indptr[rows + 1]
+        starts = np.maximum(indptr[rows], ends - self.max_neighbors)
+        return starts, ends
+
+    def scores(self, user_id):
+        """Возвращает массив оценок всех пользователей для user_id."""
+        scores = np.zeros(len(self.ids))
+        index = np.searchsorted(self.ids, user_id)
+        if index == len(self.ids) or self.ids[index] != user_id:
+            return scores
+
+        items = self.liked[self.liked_ptr[index] : self.liked_ptr[index + 1]]
+        if not len(items):
+            return scores
+
+        starts, ends = self._tail(self.likers_ptr, items)
+        likers = self.likers[_ranges(starts, ends)]
+        weights = np.repeat(1.0 / np.sqrt(self.popularity[items]), ends - starts)
+        others = likers != index
+        likers, weights = likers[others], weights[others]
+
+        starts, ends = self._tail(self.liked_ptr, likers)
+        co_liked = self.liked[_ranges(starts, ends)]
+        # Для пустого co_liked np.bincount возвращает целые числа.
+        scores = np.bincount(
+            co_liked, weights=np.repeat(weights, ends - starts), minlength=len(scores)
+        ).astype(np.float64, copy=False)
+        scores /= np.sqrt(np.maximum(self.popularity, 1.0))
+
+        scores[self.seen[self.seen_ptr[index] : self.seen_ptr[index + 1]]] = 0.0
+        scores[index] = 0.0
+        return scores
+
+    def top(self, user_id, k):
+        """Возвращает (id кандидатов, оценки) top-k по убыванию оценки."""
+        scores = self.scores(user_id)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return self.ids[candidates], scores[candidates]
+
+
+def _write(index, user_ids, top_k):
+    """
+    Записывает top-K рекомендаций пользователям user_ids пачками. Снимок
+    хранит свайпы удаленных пользователей, поэтому пользователи и кандидаты
+    пачки сверяются с таблицей пользователей, и удаленные пропускаются.
+    """
+    User = get_user_model()
+
+    updated = 0
+    for start in range(0, len(user_ids), WRITE_BATCH_SIZE):
+        batch = user_ids[start : start + WRITE_BATCH_SIZE].tolist()
+        tops = {user_id: index.top(user_id, top_k) for user_id in batch}
+        referenced = set(batch).union(
+            *(candidates.tolist() for candidates, _ in tops.values())
+        )
+        existing = set(
+            User.objects.filter(id__in=referenced).values_list("id", flat=True)
+        )
+
+        batch = [user_id for user_id in batch if user_id in existing]
+        rows = []
+        for user_id in batch:
+            candidates, scores = tops[user_id]
+            rows.extend(
+                Recommendation(user_id=user_id, candidate_id=candidate, score=score)
+                for candidate, score in zip(candidates.tolist(), scores.tolist())
+                if candidate in existing
+            )
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=batch).delete()
+            Recommendation.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+        updated += len(batch)
+    return updated
+
+
+def build_recommendations(
+    full=False, top_k=None, chunk_size=SWIPE_CHUNK_SIZE, path=None
+):
+    """
+    Дочитывает новые свайпы в снимок матрицы и пересчитывает top-K
+    рекомендаций их авторам (при full — всем, с чтением всех свайпов заново).
+    Возвращает завершенный RecommendationRun.
+    """
+    path = path or settings.RECOMMENDATION_MATRIX_PATH
+    top_k = top_k or settings.RECOMMENDATION_TOP_K
+    max_neighbors = settings.RECOMMENDATION_MAX_NEIGHBORS
+
+    last_run = (
+        RecommendationRun.objects.filter(finished_at__isnull=False)
+        .order_by("-finished_at")
+        .first()
+    )
+    index = (
+        CoLikeIndex(max_neighbors) if full else CoLikeIndex.load(path, max_neighbors)
+    )
+    if not full and (last_run is None or index.watermark != last_run.last_swipe_id):
+        # Первый запуск, или снимок потерян и не соответствует водяному знаку.
+        if last_run is not None:
+            logger.warning("Снимок индекса лайков устарел, полная перестройка")
+        index = CoLikeIndex(max_neighbors)
+        full = True
+
+    run = RecommendationRun.objects.create(full=full)
+    matrix = SwipeMatrix.from_db(index.watermark, index.recent_ids, chunk_size)
+    index.extend(matrix)
+
+    affected = index.swipers() if full else np.unique(matrix.swipers)
+    users_updated = _write(index, affected, top_k)
+    index.save(path)
+
+    run.last_swipe_id = index.watermark
+    run.swipes_processed = len(matrix)
+    run.users_updated = users_updated
+    run.finished_at = timezone.now()
+    run.save()
+    return run
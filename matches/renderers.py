@@ -0,0 +1,30 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def ndjson_line(item):
+    """Сериализует один объект в строку NDJSON (с переводом строки)."""
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + "\n"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Рендерер для формата NDJSON (один JSON-объект на строку).
+
+    Списки отдаются потоково самими view через StreamingHttpResponse; через
+    рендерер проходят только обычные ответы (например, ошибки), которые
+    записываются одной строкой.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if isinstance(data, list):
+            return "".join(ndjson_line(item) for item in data).encode(self.charset)
+        return ndjson_line(data).encode(self.charset)
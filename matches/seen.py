@@ -0,0 +1,196 @@
+"""
+Компактное множество «уже просмотренных» пользователей для каждого свайпера.
+
+SeenSet — упрощенный roaring bitmap: id разбиваются по старшим битам на
+контейнеры по 65536 значений. Разреженный контейнер хранится как
+отсортированный array('H') (2 байта на id), плотный — как битовая карта на
+8 КБ. Проверка принадлежности — бинарный поиск или один битовый тест.
+
+Множество кэшируется под версией пользователя (отдельный счетчик
+users.cache); свайпы увеличивают версию (см. mark_seen), поэтому
+параллельные обновления не затирают друг друга.
+"""
+
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users.cache import bump_cache_version, get_cache_version
+
+ARRAY_CONTAINER = 0
+BITMAP_CONTAINER = 1
+
+# Порог, после которого массив занимает больше места, чем битовая карта.
+ARRAY_MAX_SIZE = 4096
+BITMAP_BYTES = 65536 // 8
+
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<BI")
+CONTAINER_HEADER = struct.Struct("<QBI")
+
+SEEN_CACHE_KEY = "matches:seen:{user_id}:{version}"
+SEEN_VERSION_KEY = "matches:seen_version:{user_id}"
+
+
+class SeenSet:
+    def __init__(self, values=()):
+        self._containers = {}
+        self.update(values)
+
+    def add(self, value):
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+
+        if container is None:
+            self._containers[high] = array("H", [low])
+        elif isinstance(container, bytearray):
+            container[low >> 3] |= 1 << (low & 7)
+        else:
+            index = bisect_left(container, low)
+            if index < len(container) and container[index] == low:
+                return
+            container.insert(index, low)
+            if len(container) > ARRAY_MAX_SIZE:
+                self._containers[high] = self._to_bitmap(container)
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value):
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+
+        low = value & 0xFFFF
+        if isinstance(container, bytearray):
+            return bool(container[low >> 3] & (1 << (low & 7)))
+
+        index = bisect_left(container, low)
+        return index < len(container) and container[index] == low
+
+    def __len__(self):
+        return sum(
+            (
+                sum(bin(byte).count("1") for byte in container)
+                if isinstance(container, bytearray)
+                else len(container)
+            )
+            for container in self._containers.values()
+        )
+
+    @staticmethod
+    def _to_bitmap(values):
+        bitmap = bytearray(BITMAP_BYTES)
+        for low in values:
+            bitmap[low >> 3] |= 1 << (low & 7)
+        return bitmap
+
+    def to_bytes(self):
+        """Сериализует множество в компактное бинарное представление."""
+        chunks = [HEADER.pack(FORMAT_VERSION, len(self._containers))]
+        for high, container in sorted(self._containers.items()):
+            if isinstance(container, bytearray):
+                chunks.append(CONTAINER_HEADER.pack(high, BITMAP_CONTAINER, 0))
+                chunks.append(bytes(container))
+            else:
+                payload = array("H", container)
+                if sys.byteorder == "big":
+                    payload.byteswap()
+                chunks.append(
+                    CONTAINER_HEADER.pack(high, ARRAY_CONTAINER, len(payload))
+                )
+                chunks.append(payload.tobytes())
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        instance = cls()
+        version, count = HEADER.unpack_from(data, 0)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Неизвестная версия формата SeenSet: {version}")
+
+        offset = HEADER.size
+        for _ in range(count):
+            high, kind, size = CONTAINER_HEADER.unpack_from(data, offset)
+            offset += CONTAINER_HEADER.size
+
+            if kind == BITMAP_CONTAINER:
+                instance._containers[high] = bytearray(
+                    data[offset : offset + BITMAP_BYTES]
+                )
+                offset += BITMAP_BYTES
+            else:
+                container = array("H")
+                container.frombytes(data[offset : offset + size * 2])
+                if sys.byteorder == "big":
+                    container.byteswap()
+                instance._containers[high] = container
+                offset += size * 2
+        return instance
+
+
+def _cache_key(user_id, version):
+    return SEEN_CACHE_KEY.format(user_id=user_id, version=version)
+
+
+def build_seen_set(user):
+    """
+    Строит множество просмотренных пользователей из истории свайпов.
+
+    Версия читается до обращения к базе: если параллельный свайп изменит ее
+    после чтения истории, построенное множество запишется под устаревшей
+    версией и читаться не будет.
+    """
+    from .models import Swipe
+
+    version = get_cache_version(user.id, SEEN_VERSION_KEY)
+    swiped_ids = (
+        Swipe.objects.for_user(user)
+        .values_list("swiped_user_id", flat=True)
+        .iterator(chunk_size=5000)
+    )
+    seen = SeenSet(swiped_ids)
+    seen.add(user.id)
+
+    cache.set(
+        _cache_key(user.id, version), seen.to_bytes(), settings.SEEN_SET_CACHE_TIMEOUT
+    )
+    return seen
+
+
+def get_seen_set(user):
+    """Возвращает множество просмотренных пользователей из кэша или строит его."""
+    data = cache.get(_cache_key(user.id, get_cache_version(user.id, SEEN_VERSION_KEY)))
+    if data is None:
+        return build_seen_set(user)
+    return SeenSet.from_bytes(data)
+
+
+def mark_seen(user, user_ids):
+    """
+    Добавляет id в закэшированное множество после фиксации свайпов.
+
+    Вместо блокировки используется версия множества: запись увеличивает ее
+    атомарным incr и сохраняет дополненное множество под новой версией,
+    только если между чтением и incr версию никто не менял. Иначе
+    параллельное обновление могло потеряться, и множество будет построено
+    из базы при следующем чтении.
+    """
+    version = get_cache_version(user.id, SEEN_VERSION_KEY)
+    data = cache.get(_cache_key(user.id, version))
+    new_version = bump_cache_version(user.id, SEEN_VERSION_KEY)
+    if data is None or new_version != version + 1:
+        return
+
+    seen = SeenSet.from_bytes(data)
+    seen.update(user_ids)
+    cache.set(
+        _cache_key(user.id, new_version),
+        seen.to_bytes(),
+        settings.SEEN_SET_CACHE_TIMEOUT,
+    )
@@ -2,11 +2,13 @@ from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from profiles.serializers import ProfileSerializer
+from profiles.serializers import MatchStatusListSerializer, ProfileSerializer
 from users.models import CustomUser
 
 from .models import ContactRequest, MatchAction, Swipe
 
+SWIPE_BATCH_LIMIT = 500
+
 
 class SwipeSerializer(serializers.ModelSerializer):
     swiped_user_id = serializers.PrimaryKeyRelatedField(
@@ -40,12 +42,25 @@ class SwipeSerializer(serializers.ModelSerializer):
         return data
 
 
+class SwipeBatchItemSerializer(serializers.Serializer):
+    swiped_user_id = serializers.IntegerField(min_value=1)
+    is_like = serializers.BooleanField()
+
+
+class SwipeBatchSerializer(serializers.Serializer):
+    swipes = SwipeBatchItemSerializer(
+        many=True, allow_empty=False, max_length=SWIPE_BATCH_LIMIT
+    )
+
+
 class MatchSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
     email = serializers.ReadOnlyField()
 
     class Meta:
         model = get_user_model()
+        list_serializer_class = MatchStatusListSerializer
+        match_user_id_field = "id"
         fields = ["id", "email", "profile"]
 
 
@@ -1,13 +1,36 @@
+import io
+import json
+import os
+import tempfile
 from datetime import date, timedelta
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from profiles.models import Profile  # Убедитесь, что импорт корректен
+from gallery.models import Photo
+from profiles.geo import haversine_km
+from profiles.models import City, LikeCounterShard, Profile
+from users.cache import bump_cache_version, get_cache_version
 
-from .models import ContactRequest, Swipe
+from .graph import LikeGraph, get_like_graph, load_like_graph, reset_like_graph
+from .models import (ContactRequest, DeckCard, DiscoverDeck, LikeRemoval,
+                     Match, Recommendation, Swipe)
+from .pagination import (ContactRequestCursorPagination,
+                         ReceivedLikesCursorPagination)
+from .ranking import FEATURES, CandidatePool, CandidateRanker
+from .recommendations import CoLikeIndex, build_recommendations
+from .seen import SeenSet, get_seen_set, mark_seen
 
 User = get_user_model()
 
@@ -57,6 +80,36 @@ class SwipeTestCase(APITestCase):
         )
         self.user2.profile.refresh_from_db()
 
+    def test_reciprocal_like_reports_match(self):
+        """Встречный лайк создает мэтч и возвращает matched в ответе."""
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(
+            self.swipe_url, {"swiped_user_id": self.user2.id, "is_like": True}
+        )
+        self.assertFalse(response.data["matched"])
+
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(
+            self.swipe_url, {"swiped_user_id": self.user1.id, "is_like": True}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data["matched"])
+        self.assertTrue(Swipe.check_match_exists(self.user1, self.user2))
+        self.assertTrue(Swipe.check_match_exists(self.user2, self.user1))
+
+    def test_deleting_like_removes_match(self):
+        """Удаление лайка удаляет мэтч в обе стороны."""
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+        like = Swipe.objects.create(
+            swiper=self.user2, swiped_user=self.user1, is_like=True
+        )
+        self.assertEqual(Match.objects.count(), 2)
+
+        like.delete()
+
+        self.assertFalse(Match.objects.exists())
+
     def test_create_swipe_dislike(self):
         """Тест создания успешного дизлайка."""
         self.client.force_authenticate(user=self.user1)
@@ -97,6 +150,66 @@ class SwipeTestCase(APITestCase):
         self.assertTrue(found, f"Ожидаемая ошибка не найдена в ответах: {errors}")
 
 
+class SwipeBatchTestCase(APITestCase):
+    def setUp(self):
+        self.batch_url = reverse("swipe-batch")
+        self.users = [
+            User.objects.create_user(email=f"b{i}@test.com", password="p")
+            for i in range(4)
+        ]
+        for user in self.users:
+            Profile.objects.create(
+                user=user,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender="F",
+            )
+        self.me = self.users[0]
+
+    def test_batch_reports_result_per_item(self):
+        """Пачка свайпов создается целиком, а ошибки отражаются по элементам."""
+        u1, u2, u3 = self.users[1:]
+        Swipe.objects.create(swiper=u1, swiped_user=self.me, is_like=True)
+        Swipe.objects.create(swiper=self.me, swiped_user=u3, is_like=False)
+
+        self.client.force_authenticate(user=self.me)
+        payload = {
+            "swipes": [
+                {"swiped_user_id": u1.id, "is_like": True},
+                {"swiped_user_id": u2.id, "is_like": True},
+                {"swiped_user_id": u2.id, "is_like": False},
+                {"swiped_user_id": u3.id, "is_like": True},
+                {"swiped_user_id": self.me.id, "is_like": True},
+                {"swiped_user_id": 999999, "is_like": True},
+            ]
+        }
+        response = self.client.post(self.batch_url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "created", "duplicate", "duplicate", "self", "not_found"],
+        )
+        self.assertTrue(results[0]["matched"])
+        self.assertFalse(results[1]["matched"])
+
+        self.assertTrue(Swipe.check_match_exists(self.me, u1))
+        self.assertEqual(Swipe.objects.filter(swiper=self.me).count(), 3)
+        LikeCounterShard.objects.flush()
+        self.assertEqual(Profile.objects.get(user=u2).likes_count, 1)
+
+    def test_batch_query_count_is_constant(self):
+        """Количество запросов не зависит от размера пачки."""
+        self.client.force_authenticate(user=self.me)
+        payload = {
+            "swipes": [
+                {"swiped_user_id": user.id, "is_like": True} for user in self.users[1:]
+            ]
+        }
+        with self.assertNumQueries(9):
+            self.client.post(self.batch_url, payload, format="json")
+
+
 class MatchTestCase(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(email="u1@test.com", password="p1")
@@ -129,6 +242,21 @@ class MatchTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 0)
 
+    def test_matches_conditional_get(self):
+        """Список мэтчей отдает 304, пока не появился новый мэтч."""
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get(self.matches_url)["ETag"]
+
+        response = self.client.get(self.matches_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+
+        response = self.client.get(self.matches_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+
     def test_single_match(self):
         """Тест получения мэтча при взаимном лайке."""
 
@@ -143,6 +271,32 @@ class MatchTestCase(APITestCase):
         self.assertEqual(len(response.data["results"]), 1)
         self.assertEqual(response.data["results"][0]["email"], self.user2.email)
 
+    def test_is_matched_resolved_in_one_query(self):
+        """is_matched для всей страницы определяется одним запросом."""
+        partners = [self.user2, self.user3]
+        for i in range(3):
+            user = User.objects.create_user(email=f"m{i}@test.com", password="p")
+            Profile.objects.create(
+                user=user,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender="F",
+            )
+            partners.append(user)
+        for partner in partners:
+            Swipe.objects.create(swiper=self.user1, swiped_user=partner, is_like=True)
+            Swipe.objects.create(swiper=partner, swiped_user=self.user1, is_like=True)
+
+        self.client.force_authenticate(user=self.user1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.matches_url)
+
+        results = response.data["results"]
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(item["profile"]["is_matched"] for item in results))
+        # Валидатор ETag, выборка страницы и один запрос для is_matched.
+        match_queries = [q for q in queries if "matches_match" in q["sql"]]
+        self.assertEqual(len(match_queries), 3)
+
     def test_liked_history(self):
         """Тест эндпоинта /api/matches/liked/"""
         Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
@@ -153,8 +307,93 @@ class MatchTestCase(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["email"], self.user2.email)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["email"], self.user2.email)
+
+    def test_received_likes_exclude_answered(self):
+        """/api/matches/received/ — входящие лайки без уже свайпнутых, новые первыми"""
+        user4 = User.objects.create_user(email="u4@test.com", password="p4")
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+        Swipe.objects.create(swiper=self.user3, swiped_user=self.user1, is_like=True)
+        Swipe.objects.create(swiper=user4, swiped_user=self.user1, is_like=False)
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user3, is_like=False)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse("match-received"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        emails = [item["email"] for item in response.data["results"]]
+        self.assertEqual(emails, [self.user2.email])
+
+    def test_received_likes_exclude_inactive_and_staff(self):
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+        Swipe.objects.create(swiper=self.user3, swiped_user=self.user1, is_like=True)
+        self.user2.is_active = False
+        self.user2.save()
+        self.user3.is_staff = True
+        self.user3.save()
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse("match-received"))
+
+        self.assertEqual(response.data["results"], [])
+
+    @mock.patch.object(ReceivedLikesCursorPagination, "page_size", 2)
+    def test_received_likes_pages(self):
+        likers = [self.user2, self.user3]
+        for i in range(3):
+            likers.append(
+                User.objects.create_user(email=f"l{i}@test.com", password="p")
+            )
+        for liker in likers:
+            Swipe.objects.create(swiper=liker, swiped_user=self.user1, is_like=True)
+
+        self.client.force_authenticate(user=self.user1)
+        seen = []
+        url = reverse("match-received")
+        while url:
+            response = self.client.get(url)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, [user.id for user in reversed(likers)])
+
+    def test_received_likes_use_covering_index(self):
+        plan = (
+            Swipe.objects.unanswered_likers(self.user1)
+            .order_by("-liked_at", "-id")[:20]
+            .explain()
+        )
+        self.assertIn("swipe_received_idx", plan)
+
+    def test_history_ordered_by_swipe_time(self):
+        """История свайпов отсортирована по времени свайпа, новые первыми"""
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user3, is_like=False)
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse("match-history"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        emails = [item["email"] for item in response.data["results"]]
+        self.assertEqual(emails, [self.user2.email, self.user3.email])
+        self.assertIsNone(response.data["next"])
+
+    def test_history_ndjson_stream(self):
+        """Формат ndjson отдает историю потоком, по объекту на строку"""
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user3, is_like=False)
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse("match-history"), {"format": "ndjson"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        emails = [json.loads(line)["email"] for line in lines]
+        self.assertEqual(emails, [self.user3.email, self.user2.email])
 
 
 class ContactRequestTestCase(APITestCase):
@@ -264,3 +503,834 @@ class ContactRequestTestCase(APITestCase):
         response = self.client.patch(accept_url, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DiscoverDeckTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.discover_url = reverse("discover-list")
+        self.swipe_url = reverse("swipe-list")
+        self.user1 = User.objects.create_user(email="d1@test.com", password="p1")
+        self.user2 = User.objects.create_user(email="d2@test.com", password="p2")
+        self.user3 = User.objects.create_user(email="d3@test.com", password="p3")
+
+        for user, gender in (
+            (self.user1, "M"),
+            (self.user2, "F"),
+            (self.user3, "F"),
+        ):
+            Profile.objects.create(
+                user=user,
+                first_name=user.email,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender=gender,
+                city="Москва",
+            )
+
+    def tearDown(self):
+        for photo in Photo.objects.all():
+            photo.image.delete(save=False)
+
+    def discovered_emails(self):
+        response = self.client.get(self.discover_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item["first_name"] for item in response.data["results"]}
+
+    def refill_deck(self):
+        """Запрос ставит колоду в очередь, а обработчик очереди ее пополняет."""
+        self.client.get(self.discover_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            DeckCard.objects.process_refill_requests()
+
+    def test_discover_only_queues_refill(self):
+        """Запрос discover не пополняет колоду сам, а ставит ее в очередь."""
+        self.client.force_authenticate(user=self.user1)
+
+        self.assertEqual(self.discovered_emails(), set())
+        self.assertFalse(DeckCard.objects.for_owner(self.user1).exists())
+        deck = DiscoverDeck.objects.get(owner=self.user1)
+        self.assertIsNotNone(deck.refill_requested_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("refill_decks", queued_only=True, stdout=io.StringIO())
+
+        deck.refresh_from_db()
+        self.assertIsNone(deck.refill_requested_at)
+        self.assertEqual(self.discovered_emails(), {self.user2.email, self.user3.email})
+
+    def test_discover_excludes_self_and_swiped(self):
+        """В выдаче нет самого пользователя и уже свайпнутых профилей."""
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+
+        self.client.force_authenticate(user=self.user1)
+        self.refill_deck()
+
+        self.assertEqual(self.discovered_emails(), {self.user3.email})
+
+    def test_swipe_removes_card_from_deck(self):
+        """Свайп сразу убирает карточку из колоды."""
+        self.client.force_authenticate(user=self.user1)
+        self.refill_deck()
+        self.assertEqual(self.discovered_emails(), {self.user2.email, self.user3.email})
+
+        data = {"swiped_user_id": self.user2.id, "is_like": False}
+        self.client.post(self.swipe_url, data, format="json")
+
+        self.assertFalse(
+            DeckCard.objects.filter(owner=self.user1, candidate=self.user2).exists()
+        )
+        self.assertEqual(self.discovered_emails(), {self.user3.email})
+
+    def test_swipe_updates_cached_seen_set(self):
+        """Свайп добавляет пользователя в закэшированное множество просмотренных."""
+        self.assertNotIn(self.user2.id, get_seen_set(self.user1))
+
+        self.client.force_authenticate(user=self.user1)
+        data = {"swiped_user_id": self.user2.id, "is_like": True}
+        self.client.post(self.swipe_url, data, format="json")
+
+        self.assertIn(self.user2.id, get_seen_set(self.user1))
+
+    def test_concurrent_swipe_invalidates_cached_seen_set(self):
+        """Если версию множества изменил параллельный свайп, оно строится заново."""
+        get_seen_set(self.user1)
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user3, is_like=True)
+        Swipe.objects.create(swiper=self.user1, swiped_user=self.user2, is_like=True)
+
+        def bump_twice(user_id, key_template):
+            bump_cache_version(user_id, key_template)
+            return bump_cache_version(user_id, key_template)
+
+        with mock.patch("matches.seen.bump_cache_version", bump_twice):
+            mark_seen(self.user1, [self.user2.id])
+
+        seen = get_seen_set(self.user1)
+        self.assertIn(self.user2.id, seen)
+        self.assertIn(self.user3.id, seen)
+
+    def test_out_of_range_age_rejected(self):
+        self.client.force_authenticate(user=self.user1)
+        for params in ({"max_age": 20000}, {"min_age": -(10**9)}):
+            response = self.client.get(self.discover_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_age_filters_match_profile_age(self):
+        """Фильтры возраста совпадают с Profile.age на границе дня рождения."""
+        today = timezone.now().date()
+        self.user2.profile.birth_date = today.replace(year=today.year - 30)
+        self.user2.profile.save()
+        self.user3.profile.birth_date = today.replace(year=today.year - 30) + timedelta(
+            days=1
+        )
+        self.user3.profile.save()
+
+        self.assertEqual(Profile.objects.get(user=self.user2).age, 30)
+        self.assertEqual(Profile.objects.get(user=self.user3).age, 29)
+
+        self.client.force_authenticate(user=self.user1)
+
+        response = self.client.get(self.discover_url, {"min_age": 30})
+        self.assertEqual(
+            [item["first_name"] for item in response.data["results"]],
+            [self.user2.email],
+        )
+        response = self.client.get(self.discover_url, {"max_age": 29})
+        self.assertEqual(
+            [item["first_name"] for item in response.data["results"]],
+            [self.user3.email],
+        )
+
+    def test_city_filter_uses_city_reference(self):
+        """Фильтр по городу сравнивает нормализованное название из справочника."""
+        Profile.objects.filter(user=self.user3).update(
+            city_ref=City.objects.canonicalize("Санкт-Петербург")
+        )
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.discover_url, {"city": "санкт-петербург"})
+
+        self.assertEqual(
+            [item["first_name"] for item in response.data["results"]],
+            [self.user3.email],
+        )
+
+    def test_radius_filter_sorted_by_distance(self):
+        """Поиск по радиусу отсекает дальние профили и сортирует по расстоянию."""
+        coordinates = {
+            self.user1: (55.7558, 37.6173),  # Москва, центр
+            self.user2: (55.7000, 37.5000),  # ~9 км
+            self.user3: (55.7600, 37.6200),  # ~0.5 км
+        }
+        for user, (latitude, longitude) in coordinates.items():
+            user.profile.latitude = latitude
+            user.profile.longitude = longitude
+            user.profile.save()
+        far_away = User.objects.create_user(email="d5@test.com", password="p5")
+        Profile.objects.create(
+            user=far_away,
+            first_name=far_away.email,
+            birth_date=date.today() - timedelta(days=25 * 365),
+            gender="F",
+            latitude=59.9386,  # Санкт-Петербург
+            longitude=30.3141,
+        )
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(
+            self.discover_url, {"radius_km": 20, "ordering": "distance"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [item["first_name"] for item in results],
+            [self.user3.email, self.user2.email],
+        )
+        self.assertAlmostEqual(
+            results[1]["distance_km"],
+            haversine_km(55.7558, 37.6173, 55.7000, 37.5000),
+            places=0,
+        )
+        self.assertNotIn("latitude", results[0])
+
+    def test_radius_filter_requires_own_coordinates(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.discover_url, {"radius_km": 20})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_discover_response_cached_until_swipe(self):
+        """Повторный запрос отдается из кэша, свайп сбрасывает кэш пользователя."""
+        self.client.force_authenticate(user=self.user1)
+        self.refill_deck()
+        self.assertEqual(self.discovered_emails(), {self.user2.email, self.user3.email})
+
+        with self.assertNumQueries(0):
+            cached = self.discovered_emails()
+        self.assertEqual(cached, {self.user2.email, self.user3.email})
+
+        data = {"swiped_user_id": self.user2.id, "is_like": False}
+        self.client.post(self.swipe_url, data, format="json")
+        self.assertEqual(self.discovered_emails(), {self.user3.email})
+
+    def test_discover_cache_key_normalizes_filters(self):
+        """Запросы, отличающиеся регистром города, используют одну запись кэша."""
+        self.client.force_authenticate(user=self.user1)
+        self.client.get(self.discover_url, {"city": "Москва", "gender": "F"})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.discover_url, {"gender": "F", "city": " москва "}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_change_invalidates_discover_cache(self):
+        self.client.force_authenticate(user=self.user1)
+        version = get_cache_version(self.user1.id)
+
+        self.user1.profile.bio = "Новое описание"
+        self.user1.profile.save()
+
+        self.assertNotEqual(get_cache_version(self.user1.id), version)
+
+    @override_settings(DISCOVER_CACHE_TIMEOUT=0)
+    def test_query_count_does_not_grow_with_photos(self):
+        """Количество запросов discover не зависит от числа профилей с фото."""
+        self.client.force_authenticate(user=self.user1)
+
+        def add_candidate_with_photo(index):
+            user = User.objects.create_user(email=f"ph{index}@test.com", password="p")
+            Profile.objects.create(
+                user=user,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender="F",
+            )
+            Photo.objects.create(
+                user=user,
+                image=SimpleUploadedFile(
+                    f"ph{index}.gif", b"GIF89a", content_type="image/gif"
+                ),
+                status=Photo.Status.READY,
+            )
+
+        add_candidate_with_photo(0)
+        self.refill_deck()
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(self.discover_url)
+        self.assertEqual(len(response.data["results"]), 3)
+
+        for index in range(1, 6):
+            add_candidate_with_photo(index)
+        self.refill_deck()
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(self.discover_url)
+        self.assertEqual(len(response.data["results"]), 8)
+
+        self.assertEqual(len(small_page), len(large_page))
+        with_photo = [i for i in response.data["results"] if i["main_photo_url"]]
+        self.assertEqual(len(with_photo), 6)
+        self.assertTrue(
+            with_photo[0]["main_photo_url"].startswith("/media/profile_photos/")
+        )
+
+    def test_refill_picks_up_new_users(self):
+        """Пополнение колоды добавляет зарегистрировавшихся позже пользователей."""
+        self.assertEqual(DeckCard.objects.refill(self.user1), 2)
+
+        newcomer = User.objects.create_user(email="d4@test.com", password="p4")
+        Profile.objects.create(
+            user=newcomer,
+            birth_date=date.today() - timedelta(days=25 * 365),
+            gender="F",
+        )
+
+        self.assertEqual(DeckCard.objects.refill(self.user1), 1)
+        self.assertEqual(DeckCard.objects.for_owner(self.user1).count(), 3)
+
+    def test_refill_rescans_skipped_users(self):
+        """Пользователь без профиля при пополнении попадает в колоду позже."""
+        late = User.objects.create_user(email="d4@test.com", password="p4")
+        self.assertEqual(DeckCard.objects.refill(self.user1), 2)
+
+        Profile.objects.create(
+            user=late,
+            birth_date=date.today() - timedelta(days=25 * 365),
+            gender="F",
+        )
+
+        self.assertEqual(DeckCard.objects.refill(self.user1), 1)
+        self.assertIn(
+            late.id,
+            DeckCard.objects.for_owner(self.user1).values_list(
+                "candidate_id", flat=True
+            ),
+        )
+
+    @override_settings(
+        DISCOVER_DECK_SIZE=2, DISCOVER_REFILL_POOL=2, DISCOVER_CACHE_TIMEOUT=0
+    )
+    def test_filters_find_candidates_beyond_deck(self):
+        """Фильтры ищут среди всех пользователей, а не только в колоде."""
+        for index in range(3):
+            user = User.objects.create_user(email=f"m{index}@test.com", password="p")
+            Profile.objects.create(
+                user=user,
+                first_name=user.email,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender="M",
+            )
+        self.client.force_authenticate(user=self.user1)
+        self.refill_deck()
+        self.assertEqual(self.discovered_emails(), {"m1@test.com", "m2@test.com"})
+
+        response = self.client.get(self.discover_url, {"gender": "F"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["first_name"] for item in response.data["results"]],
+            [self.user3.email, self.user2.email],
+        )
+
+    def test_discover_ordered_by_ranking_score(self):
+        """Кандидат, уже лайкнувший пользователя, идет в колоде первым."""
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+
+        self.client.force_authenticate(user=self.user1)
+        self.refill_deck()
+        response = self.client.get(self.discover_url)
+
+        names = [item["first_name"] for item in response.data["results"]]
+        self.assertEqual(names, [self.user2.email, self.user3.email])
+        cards = DeckCard.objects.for_owner(self.user1)
+        self.assertGreater(
+            cards.get(candidate=self.user2).score, cards.get(candidate=self.user3).score
+        )
+
+    @override_settings(DISCOVER_DECK_SIZE=1)
+    def test_refill_keeps_best_of_wider_pool(self):
+        """В колоду попадает лучший кандидат пула, а не первый по обходу."""
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+
+        DeckCard.objects.refill(self.user1)
+
+        self.assertEqual(
+            list(
+                DeckCard.objects.for_owner(self.user1).values_list(
+                    "candidate", flat=True
+                )
+            ),
+            [self.user2.id],
+        )
+
+    @override_settings(DISCOVER_DECK_SIZE=1, DISCOVER_DECK_LOW_WATERMARK=1)
+    def test_stale_deck_is_rescored(self):
+        """
+        Переоценка устаревшей колоды вытесняет карточки, ставшие хуже новых
+        кандидатов.
+        """
+        DeckCard.objects.refill(self.user1)
+        self.assertEqual(
+            DeckCard.objects.get(owner=self.user1).candidate_id, self.user3.id
+        )
+
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user1, is_like=True)
+        DiscoverDeck.objects.filter(owner=self.user1).update(
+            refilled_at=timezone.now() - timedelta(days=1)
+        )
+        self.assertTrue(DeckCard.objects.needs_refill(self.user1))
+        DeckCard.objects.refill(self.user1)
+
+        self.assertEqual(
+            DeckCard.objects.get(owner=self.user1).candidate_id, self.user2.id
+        )
+
+    def test_recent_swipes_outrank_fresh_idle_account(self):
+        """Давний аккаунт с недавними свайпами активнее нового, но бездействующего."""
+        now = timezone.now()
+        User.objects.filter(pk=self.user2.pk).update(
+            date_joined=now - timedelta(days=400), last_login=None
+        )
+        User.objects.filter(pk=self.user3.pk).update(
+            date_joined=now - timedelta(days=10), last_login=None
+        )
+        Swipe.objects.create(swiper=self.user2, swiped_user=self.user3, is_like=False)
+
+        pool = CandidatePool.load(self.user1, [self.user2.id, self.user3.id])
+        weights = dict.fromkeys(FEATURES, 0.0)
+        weights["recency"] = 1.0
+        ids, _ = CandidateRanker(weights).rank(pool, now=now)
+
+        self.assertEqual(list(ids), [self.user2.id, self.user3.id])
+
+    def test_rescore_keeps_scores_under_cursor(self):
+        """Переоценка не меняет оценки оставшихся карточек, по которым листают."""
+        DeckCard.objects.refill(self.user1)
+        card = DeckCard.objects.get(owner=self.user1, candidate=self.user3)
+
+        Swipe.objects.create(swiper=self.user3, swiped_user=self.user1, is_like=True)
+        DiscoverDeck.objects.filter(owner=self.user1).update(
+            refilled_at=timezone.now() - timedelta(days=1)
+        )
+        DeckCard.objects.refill(self.user1)
+
+        self.assertEqual(DeckCard.objects.get(pk=card.pk).score, card.score)
+
+
+class RecommendationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_override = override_settings(
+            RECOMMENDATION_MATRIX_PATH=os.path.join(directory.name, "matrix.npz")
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.users = {}
+        for name in "abcde":
+            user = User.objects.create_user(email=f"{name}@rec.com", password="p")
+            Profile.objects.create(
+                user=user,
+                birth_date=date.today() - timedelta(days=25 * 365),
+                gender="F",
+            )
+            self.users[name] = user
+
+        for swiper, target in (("b", "d"), ("b", "e"), ("c", "d"), ("c", "e")):
+            self.like(swiper, target)
+        self.like("a", "d")
+
+    def like(self, swiper, target):
+        Swipe.objects.create(
+            swiper=self.users[swiper], swiped_user=self.users[target], is_like=True
+        )
+
+    def recommended(self, name):
+        return list(
+            Recommendation.objects.for_user(self.users[name]).values_list(
+                "candidate__email", flat=True
+            )
+        )
+
+    def test_recommends_co_liked_candidates(self):
+        """Тот, кого лайкают вместе с уже лайкнутыми, попадает в рекомендации."""
+        run = build_recommendations()
+
+        self.assertTrue(run.full)
+        self.assertEqual(run.swipes_processed, 5)
+        self.assertEqual(self.recommended("a"), ["e@rec.com"])
+        # Уже свайпнутые кандидаты не рекомендуются.
+        self.assertEqual(self.recommended("b"), [])
+
+    def test_incremental_run_reads_only_new_swipes(self):
+        build_recommendations()
+
+        run = build_recommendations()
+        self.assertFalse(run.full)
+        self.assertEqual((run.swipes_processed, run.users_updated), (0, 0))
+
+        self.like("c", "a")
+        self.like("b", "a")
+        self.like("e", "d")
+        run = build_recommendations()
+
+        self.assertEqual((run.swipes_processed, run.users_updated), (3, 3))
+        self.assertEqual(run.last_swipe_id, Swipe.objects.latest("id").id)
+        self.assertEqual(self.recommended("e"), ["a@rec.com"])
+
+    def test_incremental_run_picks_up_late_committed_swipes(self):
+        """Свайп, зафиксированный позже свайпов с большими id, не теряется."""
+        late = Swipe.objects.create(
+            swiper=self.users["e"], swiped_user=self.users["b"], is_like=True
+        )
+        late_id = late.id
+        late.delete()
+        self.like("e", "c")
+        build_recommendations()
+
+        Swipe.objects.create(
+            id=late_id,
+            swiper=self.users["e"],
+            swiped_user=self.users["a"],
+            is_like=True,
+        )
+        run = build_recommendations()
+
+        self.assertEqual((run.swipes_processed, run.users_updated), (1, 1))
+        self.assertEqual(build_recommendations().swipes_processed, 0)
+
+    def test_incremental_index_matches_full_rebuild(self):
+        """Дописанный по частям индекс совпадает с построенным заново."""
+        build_recommendations()
+        self.like("c", "a")
+        self.like("e", "d")
+        build_recommendations()
+        incremental = CoLikeIndex.load(settings.RECOMMENDATION_MATRIX_PATH)
+
+        build_recommendations(full=True)
+        rebuilt = CoLikeIndex.load(settings.RECOMMENDATION_MATRIX_PATH)
+
+        for name in ("ids", "liked_ptr", "liked", "likers_ptr", "likers", "seen"):
+            self.assertEqual(
+                getattr(incremental, name).tolist(), getattr(rebuilt, name).tolist()
+            )
+
+    def test_incremental_run_skips_deleted_users(self):
+        """Свайпы удаленных пользователей в снимке не ломают запись рекомендаций."""
+        build_recommendations()
+        self.like("c", "a")
+        self.like("a", "b")
+        deleted = [self.users["c"].id, self.users["e"].id]
+        self.users["c"].delete()
+        self.users["e"].delete()
+
+        run = build_recommendations()
+
+        self.assertFalse(run.full)
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.users_updated, 1)
+        self.assertFalse(
+            Recommendation.objects.filter(candidate_id__in=deleted).exists()
+        )
+
+    def test_refill_blends_in_recommendations(self):
+        """Рекомендованный кандидат попадает в колоду даже позади курсора."""
+        build_recommendations()
+        DiscoverDeck.objects.create(owner=self.users["a"])
+
+        with mock.patch.object(DeckCard.objects, "_scan", return_value=[]):
+            DeckCard.objects.refill(self.users["a"])
+
+        self.assertEqual(
+            list(
+                DeckCard.objects.for_owner(self.users["a"]).values_list(
+                    "candidate__email", flat=True
+                )
+            ),
+            ["e@rec.com"],
+        )
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("build_recommendations", "--top-k", "5", stdout=out)
+        self.assertIn("обновлено пользователей: 3", out.getvalue())
+
+
+class LikeGraphTestCase(SimpleTestCase):
+    def setUp(self):
+        self.graph = LikeGraph([1, 1, 2, 3, 3], [2, 3, 1, 1, 2], watermark=5)
+
+    def test_adjacency(self):
+        self.assertEqual(self.graph.likes(1).tolist(), [2, 3])
+        self.assertEqual(self.graph.likers(1).tolist(), [2, 3])
+        self.assertEqual(self.graph.mutual(1).tolist(), [2, 3])
+        self.assertEqual(self.graph.mutual(2).tolist(), [1])
+        self.assertTrue(self.graph.has_like(3, 2))
+        self.assertFalse(self.graph.is_mutual(2, 3))
+        self.assertEqual(self.graph.likes(100).tolist(), [])
+
+    @override_settings(LIKE_GRAPH_MAX_DELTA=100)
+    def test_incremental_changes(self):
+        self.graph.add_like(2, 3)
+        self.graph.add_like(7, 1)
+        self.graph.remove_like(1, 3)
+
+        self.assertTrue(self.graph.is_mutual(2, 3))
+        self.assertEqual(self.graph.likers(1).tolist(), [2, 3, 7])
+        self.assertEqual(self.graph.mutual(1).tolist(), [2])
+        self.assertEqual(self.graph.likes(1).tolist(), [2])
+
+    @override_settings(LIKE_GRAPH_MAX_DELTA=1)
+    def test_compaction_keeps_edges(self):
+        self.graph.add_like(2, 3)
+        self.graph.remove_like(1, 3)
+
+        self.assertEqual(self.graph._delta_size, 0)
+        self.assertEqual(self.graph.likes(1).tolist(), [2])
+        self.assertEqual(self.graph.likers(3).tolist(), [2])
+        self.assertTrue(self.graph.is_mutual(2, 3))
+
+
+@override_settings(LIKE_GRAPH_ENABLED=True, LIKE_GRAPH_REFRESH_SECONDS=3600)
+class LikeGraphManagerTestCase(APITestCase):
+    def setUp(self):
+        reset_like_graph()
+        self.addCleanup(reset_like_graph)
+        self.a, self.b, self.c = (
+            User.objects.create_user(email=f"{name}@graph.com", password="p")
+            for name in "abc"
+        )
+        self.like(self.a, self.b)
+        self.like(self.b, self.a)
+        self.like(self.c, self.a)
+
+    def like(self, swiper, target):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Swipe.objects.create(swiper=swiper, swiped_user=target, is_like=True)
+
+    def test_not_used_until_loaded(self):
+        """Граф загружается при старте сервера, а не первым запросом."""
+        self.assertIsNone(get_like_graph())
+        self.assertTrue(Swipe.check_match_exists(self.a, self.b))
+        self.assertIsNone(get_like_graph())
+
+    def test_answers_from_graph(self):
+        graph = load_like_graph()
+        self.assertEqual(graph.likers(self.a.id).tolist(), [self.b.id, self.c.id])
+        self.assertTrue(Swipe.check_match_exists(self.a, self.b.id))
+        self.assertFalse(Swipe.check_match_exists(self.a, self.c))
+
+        # Проверка мэтча и входящие лайки не обращаются к таблице свайпов.
+        with self.assertNumQueries(0):
+            Swipe.check_match_exists(self.a, self.b)
+            self.assertEqual(
+                Swipe.objects.received_likes(self.a), [self.b.id, self.c.id]
+            )
+            self.assertFalse(Swipe.objects.get_matches(self.c).exists())
+
+        self.assertEqual(list(Swipe.objects.get_matches(self.a)), [self.b])
+
+    def test_applies_swipe_events(self):
+        load_like_graph()
+        self.like(self.a, self.c)
+        self.assertTrue(Swipe.check_match_exists(self.c, self.a))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Swipe.objects.get(swiper=self.b, swiped_user=self.a).delete()
+        self.assertFalse(Swipe.check_match_exists(self.a, self.b))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Swipe.objects.create_batch(
+                self.b, [{"swiped_user_id": self.c.id, "is_like": True}]
+            )
+        self.assertIn(self.b.id, get_like_graph().likers(self.c.id))
+
+    def test_refresh_picks_up_other_writers(self):
+        graph = load_like_graph()
+        Swipe.objects.bulk_create(
+            [Swipe(swiper=self.a, swiped_user=self.c, is_like=True)]
+        )
+        self.assertFalse(graph.has_like(self.a.id, self.c.id))
+
+        graph.refresh()
+
+        self.assertTrue(graph.is_mutual(self.a.id, self.c.id))
+        self.assertEqual(graph.watermark, Swipe.objects.latest("id").id)
+
+    def test_refresh_replays_deletes_of_other_writers(self):
+        """Удаление лайка в другом процессе убирает мэтч из графа."""
+        graph = load_like_graph()
+        # Без выполнения on_commit граф этого процесса не узнает об удалении.
+        Swipe.objects.get(swiper=self.b, swiped_user=self.a).delete()
+        Swipe.objects.get(swiper=self.c, swiped_user=self.a).delete()
+        Swipe.objects.create(swiper=self.c, swiped_user=self.a, is_like=True)
+        self.assertTrue(Swipe.check_match_exists(self.a, self.b))
+
+        graph.refresh()
+
+        self.assertFalse(Swipe.check_match_exists(self.a, self.b))
+        self.assertEqual(graph.likers(self.a.id).tolist(), [self.c.id])
+        self.assertEqual(graph.removal_watermark, LikeRemoval.objects.latest("id").id)
+
+    def test_stale_graph_not_used(self):
+        graph = load_like_graph()
+        graph.refreshed_at -= settings.LIKE_GRAPH_STALE_SECONDS + 1
+        self.assertIsNone(get_like_graph())
+
+        graph.refresh()
+
+        self.assertIs(get_like_graph(), graph)
+
+    def test_check_endpoint_samples_live_graph(self):
+        url = reverse("like-graph-check")
+        admin = User.objects.create_user(
+            email="admin@graph.com", password="p", is_staff=True
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        graph = load_like_graph()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["graph"], response.data["matches"]), ([], []))
+
+        # Расхождение живого графа с базой, которое свежая загрузка бы не
+        # показала.
+        graph.remove_like(self.b.id, self.a.id)
+        response = self.client.get(url, {"sample": 0})
+        self.assertEqual(len(response.data["matches"]), 2)
+        self.assertIn(
+            {
+                "user_id": self.a.id,
+                "direction": "likers",
+                "extra": [],
+                "missing": [self.b.id],
+            },
+            response.data["graph"],
+        )
+
+        self.client.force_authenticate(user=self.a)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CandidateRankerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        today = self.now.date().toordinal()
+        self.pool = CandidatePool(
+            ids=[1, 2, 3],
+            birth_days=[today - 25 * 365, today - 45 * 365, today - 26 * 365],
+            city_ids=[7, 7, -1],
+            likes_count=[0, 500, 10],
+            active_at=[self.now.timestamp()] * 3,
+            swipes_total=[10, 10, 0],
+            likes_given=[1, 9, 0],
+            liked_viewer=[False, False, True],
+        )
+        self.viewer = {"birth_day": today - 25 * 365, "city_id": 7, "now": self.now}
+
+    def test_scores_whole_pool(self):
+        ids, scores = CandidateRanker().rank(self.pool, **self.viewer)
+
+        self.assertEqual(len(scores), 3)
+        self.assertEqual(list(ids), [3, 1, 2])
+        self.assertTrue((scores[:-1] >= scores[1:]).all())
+
+    def test_weights_are_pluggable(self):
+        weights = dict.fromkeys(FEATURES, 0.0)
+        weights["popularity"] = 1.0
+
+        ids, _ = CandidateRanker(weights).rank(self.pool, **self.viewer)
+
+        self.assertEqual(list(ids), [2, 3, 1])
+
+    def test_features_are_normalized(self):
+        features = CandidateRanker().features(self.pool, **self.viewer)
+
+        self.assertEqual(set(features), set(FEATURES))
+        for values in features.values():
+            self.assertTrue(((values >= 0) & (values <= 1)).all())
+
+
+class KeysetPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="k0@test.com", password="p0")
+        self.request_url = reverse("contact-request-list")
+
+        sent_at = timezone.now()
+        for i in range(1, 8):
+            receiver = User.objects.create_user(email=f"k{i}@test.com", password="p")
+            ContactRequest.objects.create(sender=self.user, receiver=receiver)
+        # Одинаковое время отправки: порядок определяется только по id.
+        ContactRequest.objects.update(sent_at=sent_at)
+
+    @mock.patch.object(ContactRequestCursorPagination, "page_size", 3)
+    def test_walks_all_pages_without_duplicates(self):
+        """Курсор проходит все страницы по (sent_at, id) без пропусков и повторов."""
+        self.client.force_authenticate(user=self.user)
+
+        seen = []
+        url = self.request_url
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(
+            ContactRequest.objects.order_by("-sent_at", "-id").values_list(
+                "id", flat=True
+            )
+        )
+        self.assertEqual(seen, expected)
+
+    @mock.patch.object(ContactRequestCursorPagination, "page_size", 3)
+    def test_previous_link_returns_previous_page(self):
+        """Ссылка previous возвращает предыдущую страницу в исходном порядке."""
+        self.client.force_authenticate(user=self.user)
+
+        first = self.client.get(self.request_url).data
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+
+        self.assertEqual(
+            [item["id"] for item in back["results"]],
+            [item["id"] for item in first["results"]],
+        )
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.request_url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SeenSetTestCase(SimpleTestCase):
+    def test_membership(self):
+        seen = SeenSet([1, 5, 70000, 2**40 + 3])
+
+        for value in (1, 5, 70000, 2**40 + 3):
+            self.assertIn(value, seen)
+        for value in (0, 2, 65541, 2**40):
+            self.assertNotIn(value, seen)
+        self.assertEqual(len(seen), 4)
+
+    def test_dense_container_switches_to_bitmap(self):
+        seen = SeenSet(range(0, 20000, 2))
+
+        self.assertEqual(len(seen), 10000)
+        self.assertIn(19998, seen)
+        self.assertNotIn(19999, seen)
+
+    def test_roundtrip_is_compact(self):
+        values = range(0, 10_000_000, 1000)
+        data = SeenSet(values).to_bytes()
+        restored = SeenSet.from_bytes(data)
+
+        self.assertEqual(len(restored), 10000)
+        self.assertIn(9_999_000, restored)
+        self.assertNotIn(9_999_001, restored)
+        self.assertLess(len(data), 32 * 1024)
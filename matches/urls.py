@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (ContactRequestViewSet, DiscoverListAPIView,
-                    MatchListViewSet, SwipeViewSet)
+                    LikeGraphCheckAPIView, MatchListViewSet, SwipeViewSet)
 
 router = DefaultRouter()
 router.register(r"swipes", SwipeViewSet, basename="swipe")
@@ -12,4 +12,9 @@ router.register(r"contact-requests", ContactRequestViewSet, basename="contact-re
 urlpatterns = [
     path("", include(router.urls)),
     path("discover/", DiscoverListAPIView.as_view(), name="discover-list"),
+    path(
+        "like-graph/check/",
+        LikeGraphCheckAPIView.as_view(),
+        name="like-graph-check",
+    ),
 ]
@@ -1,20 +1,67 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.http import StreamingHttpResponse
 from rest_framework import generics, mixins, status, views, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from gallery.models import ready_photos_prefetch
+from profiles.models import LikeCounterShard, normalize_city_name
 from profiles.serializers import ProfileSerializer
-
-from .models import ContactRequest, Swipe
+from users.cache import bump_cache_version, get_cache_version
+from users.conditional import ConditionalGetMixin
+
+from .graph import check_like_graph, get_like_graph
+from .models import (LIVE_QUERY_FILTERS, ContactRequest, DeckCard, Match,
+                     Swipe, uses_live_query)
+from .pagination import (ContactRequestCursorPagination,
+                         DiscoverCursorPagination, MatchCursorPagination,
+                         ReceivedLikesCursorPagination,
+                         SwipeHistoryCursorPagination)
+from .renderers import NDJSONRenderer, ndjson_line
+from .seen import mark_seen
 from .serializers import (ContactRequestSerializer, MatchSerializer,
-                          SwipeSerializer)
+                          SwipeBatchSerializer, SwipeSerializer)
 
 # Create your views here.
 User = get_user_model()
 
+MAX_DISCOVER_RADIUS_KM = 500
+MAX_DISCOVER_AGE = 150
+DISCOVER_CACHE_KEY = "matches:discover:{user_id}:{version}:{query_hash}"
+# Параметры запроса, от которых зависит ответ discover.
+DISCOVER_CACHE_PARAMS = (
+    "gender",
+    "city",
+    "status",
+    "min_age",
+    "max_age",
+    "radius_km",
+    "ordering",
+    DiscoverCursorPagination.cursor_query_param,
+)
+HISTORY_STREAM_CHUNK_SIZE = 500
+
+# История свайпов: keyset-пагинация по времени свайпа и потоковый NDJSON.
+HISTORY_ACTION_OPTIONS = {
+    "pagination_class": SwipeHistoryCursorPagination,
+    "renderer_classes": [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer],
+}
+# Входящие лайки: тот же формат, keyset по времени лайка.
+RECEIVED_ACTION_OPTIONS = {
+    **HISTORY_ACTION_OPTIONS,
+    "pagination_class": ReceivedLikesCursorPagination,
+}
+
 
 class SwipeViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     """
@@ -26,48 +73,152 @@ class SwipeViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     serializer_class = SwipeSerializer
     permission_classes = [IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        """
+        Создает свайп и сообщает в ответе, случился ли мэтч.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        matched = self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+
+        return Response(
+            {**serializer.data, "matched": matched},
+            status=status.HTTP_201_CREATED,
+            headers=headers,
+        )
+
     def perform_create(self, serializer):
-        swipe_instance = serializer.save(swiper=self.request.user)
+        with transaction.atomic():
+            # Мэтч создается в той же транзакции обработчиком post_save.
+            swipe_instance = serializer.save(swiper=self.request.user)
+
+            if swipe_instance.is_like:
+                LikeCounterShard.objects.increment([swipe_instance.swiped_user_id])
+
+        matched = swipe_instance.matched
+        if swipe_instance.is_like and not matched:
+            # Встречный лайк мог быть записан параллельной транзакцией,
+            # которую мы еще не видели: перепроверяем после фиксации.
+            matched = Match.objects.create_for_swipe(swipe_instance)
+
+        DeckCard.objects.discard(self.request.user, [swipe_instance.swiped_user_id])
+        mark_seen(self.request.user, [swipe_instance.swiped_user_id])
+        bump_cache_version(self.request.user.id)
+        return matched
+
+    @action(detail=False, methods=["post"], serializer_class=SwipeBatchSerializer)
+    def batch(self, request):
+        """
+        Принимает пачку свайпов (например, накопленных клиентом офлайн) и
+        возвращает результат по каждому элементу, включая новые мэтчи.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        target_user_profile = swipe_instance.swiped_user.profile
+        results = Swipe.objects.create_batch(
+            request.user, serializer.validated_data["swipes"]
+        )
 
-        if swipe_instance.is_like:
-            target_user_profile.likes_count += 1
+        created_ids = [
+            result["swiped_user_id"]
+            for result in results
+            if result["status"] == "created"
+        ]
+        if created_ids:
+            DeckCard.objects.discard(request.user, created_ids)
+            mark_seen(request.user, created_ids)
+            bump_cache_version(request.user.id)
 
-        target_user_profile.save()
+        return Response({"results": results})
 
 
-class MatchListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class MatchListViewSet(
+    ConditionalGetMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
     serializer_class = MatchSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MatchCursorPagination
 
     def get_queryset(self):
         """DRF вызовет этот метод автоматически для ListModelMixin."""
         user = self.request.user
-        return Swipe.objects.get_matches(user)
+        return Swipe.objects.get_matches(user).prefetch_related(
+            ready_photos_prefetch("photos")
+        )
 
-    @action(detail=False, methods=["get"])
-    def history(self, request):
-        swiped_ids = Swipe.objects.for_user(request.user).values_list(
-            "swiped_user_id", flat=True
+    def get_validators(self):
+        """
+        Валидатор списка мэтчей: количество и время последнего мэтча плюс время
+        последнего изменения профилей партнеров (главное фото тоже меняет его).
+        """
+        state = Match.objects.filter(user=self.request.user).aggregate(
+            count=Count("id"),
+            latest=Max("created_at"),
+            partners=Max("partner__profile__updated_at"),
         )
-        history_users = User.objects.filter(id__in=swiped_ids)
-        serializer = MatchSerializer(history_users, many=True)
-        return Response(serializer.data)
+        return [state["count"], state["latest"], state["partners"]], None
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
+
+    def _swipe_history_response(self, queryset):
+        """
+        Отдает историю свайпов постранично или, при запросе формата NDJSON,
+        потоком без пагинации с постоянным расходом памяти.
+        """
+        queryset = queryset.prefetch_related(ready_photos_prefetch("photos"))
+
+        if self.request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                self._stream_ndjson(queryset.order_by(*self.paginator.ordering)),
+                content_type=NDJSONRenderer.media_type,
+            )
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def _stream_ndjson(self, queryset):
+        """Сериализует QuerySet пачками по HISTORY_STREAM_CHUNK_SIZE объектов."""
+        chunk = []
+        for user in queryset.iterator(chunk_size=HISTORY_STREAM_CHUNK_SIZE):
+            chunk.append(user)
+            if len(chunk) == HISTORY_STREAM_CHUNK_SIZE:
+                yield self._render_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield self._render_chunk(chunk)
+
+    def _render_chunk(self, chunk):
+        serializer = self.get_serializer(chunk, many=True)
+        return "".join(ndjson_line(item) for item in serializer.data)
+
+    @action(detail=False, methods=["get"], **HISTORY_ACTION_OPTIONS)
+    def history(self, request):
+        return self._swipe_history_response(Swipe.objects.swiped_users(request.user))
 
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["get"], **HISTORY_ACTION_OPTIONS)
     def liked(self, request):
-        liked_ids = Swipe.objects.liked_by(request.user)
-        liked_users = User.objects.filter(id__in=liked_ids)
-        serializer = MatchSerializer(liked_users, many=True)
-        return Response(serializer.data)
+        return self._swipe_history_response(
+            Swipe.objects.swiped_users(request.user, is_like=True)
+        )
 
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["get"], **HISTORY_ACTION_OPTIONS)
     def disliked(self, request):
-        disliked_ids = Swipe.objects.disliked_by(request.user)
-        disliked_users = User.objects.filter(id__in=disliked_ids)
-        serializer = MatchSerializer(disliked_users, many=True)
-        return Response(serializer.data)
+        return self._swipe_history_response(
+            Swipe.objects.swiped_users(request.user, is_like=False)
+        )
+
+    @action(detail=False, methods=["get"], **RECEIVED_ACTION_OPTIONS)
+    def received(self, request):
+        """Кто лайкнул пользователя, без уже свайпнутых им, новые первыми."""
+        return self._swipe_history_response(
+            Swipe.objects.unanswered_likers(request.user)
+        )
 
 
 class MatchListAPIView(views.APIView):
@@ -91,6 +242,54 @@ class MatchListAPIView(views.APIView):
         return Response(serializer.data)
 
 
+class LikeGraphCheckAPIView(views.APIView):
+    """
+    Сверяет с базой граф лайков обслуживающего процесса на случайной выборке
+    пользователей (параметры sample и seed). Только для администраторов.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        graph = get_like_graph()
+        if graph is None:
+            return Response(
+                {"error": "Граф лайков в этом процессе не используется."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        try:
+            sample = int(
+                request.query_params.get("sample", settings.LIKE_GRAPH_CHECK_SAMPLE)
+            )
+            seed = request.query_params.get("seed")
+            seed = None if seed is None else int(seed)
+        except ValueError:
+            raise ValidationError(
+                detail="Параметры 'sample' и 'seed' должны быть целыми числами."
+            )
+
+        report = check_like_graph(graph, sample, seed)
+        report["graph"] = [
+            {
+                "user_id": user_id,
+                "direction": direction,
+                "extra": extra,
+                "missing": missing,
+            }
+            for user_id, direction, extra, missing in report["graph"]
+        ]
+        report["matches"] = [
+            {
+                "user_id": user_id,
+                "mutual_without_match": mutual,
+                "match_without_mutual": matched,
+            }
+            for user_id, mutual, matched in report["matches"]
+        ]
+        return Response(report)
+
+
 class DiscoverListAPIView(generics.ListAPIView):
     """
     API endpoint для получения списка доступных профилей с фильтрацией и пагинацией.
@@ -98,6 +297,41 @@ class DiscoverListAPIView(generics.ListAPIView):
 
     permission_classes = [IsAuthenticated]
     serializer_class = ProfileSerializer
+    pagination_class = DiscoverCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        """
+        Отдает страницу из кэша, если тот же запрос уже выполнялся и с тех пор
+        версия кэша пользователя не менялась.
+        """
+        cache_key = self.get_cache_key()
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        cache.set(cache_key, response.data, settings.DISCOVER_CACHE_TIMEOUT)
+        return response
+
+    def get_cache_key(self):
+        """
+        Ключ кэша: пользователь, версия его кэша и хэш нормализованных
+        параметров запроса (включая курсор).
+        """
+        params = []
+        for name in DISCOVER_CACHE_PARAMS:
+            value = self.request.query_params.get(name, "").strip()
+            if name == "city":
+                value = normalize_city_name(value)
+            if value:
+                params.append((name, value))
+
+        user_id = self.request.user.id
+        return DISCOVER_CACHE_KEY.format(
+            user_id=user_id,
+            version=get_cache_version(user_id),
+            query_hash=hashlib.sha256(urlencode(params).encode()).hexdigest(),
+        )
 
     def get_queryset(self):
 
@@ -120,11 +354,72 @@ class DiscoverListAPIView(generics.ListAPIView):
                             detail=f"Неверный формат возраста для параметра "
                             f"'{k}'. Ожидается целое число."
                         )
+                    if not 0 <= clean_filters[k] <= MAX_DISCOVER_AGE:
+                        raise ValidationError(
+                            detail=f"Возраст в параметре '{k}' должен быть от 0 "
+                            f"до {MAX_DISCOVER_AGE}."
+                        )
                 else:
                     clean_filters[k] = v
 
+        user = self.request.user
+        radius_km = self.request.query_params.get("radius_km")
+        if radius_km:
+            clean_filters.update(self.get_radius_filters(radius_km))
+        # Запрос только читает колоду: пополнение и переоценка выполняются
+        # командой refill_decks, здесь колода лишь ставится в очередь.
+        if not uses_live_query(clean_filters) and DeckCard.objects.needs_refill(user):
+            DeckCard.objects.request_refill(user)
+
+        return Swipe.get_viewable_profiles_queryset(
+            user, clean_filters
+        ).prefetch_related(ready_photos_prefetch("user__photos"))
+
+    def get_radius_filters(self, radius_km):
+        """Проверяет радиус и берет центр поиска из координат профиля."""
+        try:
+            radius_km = float(radius_km)
+        except ValueError:
+            raise ValidationError(
+                detail="Неверный формат параметра 'radius_km'. Ожидается число."
+            )
+        if not 0 < radius_km <= MAX_DISCOVER_RADIUS_KM:
+            raise ValidationError(
+                detail=f"Радиус должен быть больше 0 и не больше "
+                f"{MAX_DISCOVER_RADIUS_KM} км."
+            )
+
+        profile = getattr(self.request.user, "profile", None)
+        if profile is None or profile.latitude is None or profile.longitude is None:
+            raise ValidationError(
+                detail="Для поиска по радиусу укажите координаты в своем профиле."
+            )
+
+        return {
+            "radius_km": radius_km,
+            "origin": (profile.latitude, profile.longitude),
+        }
+
+    def get_pagination_ordering(self):
+        """
+        Колода отдается по оценке ранжирования. Поиск с фильтрами идет мимо
+        колоды: по новизне или, при поиске по радиусу и по запросу, по
+        расстоянию.
+        """
+        params = {
+            name for name in LIVE_QUERY_FILTERS if self.request.query_params.get(name)
+        }
+        if not uses_live_query(params):
+            return None
+        if (
+            "radius_km" in params
+            and self.request.query_params.get("ordering") == "distance"
+        ):
+            return ("distance_km", "id")
+        return ("-user__date_joined", "-id")
 
-class ContactRequestViewSet(viewsets.ModelViewSet):
+
+class ContactRequestViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint для управления запросами на контакт.
     Пользователи видят только свои отправленные и полученные запросы.
@@ -132,11 +427,29 @@ class ContactRequestViewSet(viewsets.ModelViewSet):
 
     serializer_class = ContactRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ContactRequestCursorPagination
 
     def get_queryset(self):
         return ContactRequest.objects.filter(
             Q(sender=self.request.user) | Q(receiver=self.request.user)
+        ).select_related("sender", "receiver")
+
+    def get_validators(self):
+        """Валидатор списка запросов: количество и последний updated_at."""
+        state = (
+            ContactRequest.objects.filter(
+                Q(sender=self.request.user) | Q(receiver=self.request.user)
+            )
+            .order_by()
+            .aggregate(count=Count("id"), latest=Max("updated_at"))
         )
+        return [state["count"], state["latest"]], None
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        return super().list(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         """
@@ -0,0 +1,99 @@
+"""
+Отсортированный индекс городов в памяти процесса для автодополнения.
+
+Каждый город индексируется по полному нормализованному названию и по каждому
+слову названия, поэтому «петер» находит и «Петербург», и «Санкт-Петербург».
+Поиск по префиксу — бинарный поиск по отсортированному списку ключей.
+"""
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .models import City, normalize_city_name
+
+WORD_SEPARATOR = re.compile(r"[\s\-]+")
+
+# Максимальное количество просматриваемых ключей на один запрос.
+MAX_SCANNED_KEYS = 500
+
+
+def _index_keys(normalized_name):
+    keys = {normalized_name}
+    keys.update(word for word in WORD_SEPARATOR.split(normalized_name) if word)
+    return keys
+
+
+class CityIndex:
+    def __init__(self):
+        self._entries = []
+        self._keys = []
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        return (
+            self._built_at is None
+            or time.monotonic() - self._built_at > settings.CITY_INDEX_TTL
+        )
+
+    def rebuild(self):
+        entries = []
+        for city_id, name, normalized_name in City.objects.values_list(
+            "id", "name", "normalized_name"
+        ).iterator():
+            for key in _index_keys(normalized_name):
+                entries.append((key, name, city_id))
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._keys = [entry[0] for entry in entries]
+            self._built_at = time.monotonic()
+
+    def add(self, city):
+        """Добавляет в индекс город, созданный в текущем процессе."""
+        if self._built_at is None:
+            return
+
+        with self._lock:
+            for key in _index_keys(city.normalized_name):
+                entry = (key, city.name, city.id)
+                insort(self._entries, entry)
+                self._keys.insert(bisect_left(self._keys, key), key)
+
+    def search(self, query, limit=10):
+        """
+        Возвращает до limit городов, название или одно из слов названия
+        которых начинается с query. Полные совпадения префикса идут первыми.
+        """
+        prefix = normalize_city_name(query)
+        if not prefix:
+            return []
+
+        if self._is_stale():
+            self.rebuild()
+
+        with self._lock:
+            start = bisect_left(self._keys, prefix)
+            matches = []
+            for key, name, city_id in self._entries[start : start + MAX_SCANNED_KEYS]:
+                if not key.startswith(prefix):
+                    break
+                matches.append((key, name, city_id))
+
+        found = {}
+        for key, name, city_id in matches:
+            is_name_prefix = normalize_city_name(name).startswith(prefix)
+            rank = (not is_name_prefix, name)
+            if city_id not in found or rank < found[city_id][0]:
+                found[city_id] = (rank, name)
+
+        ranked = sorted(found.items(), key=lambda item: item[1][0])
+        return [{"id": city_id, "name": name} for city_id, (_, name) in ranked[:limit]]
+
+
+city_index = CityIndex()
@@ -0,0 +1,111 @@
+"""
+Geohash-кодирование координат профилей и отбор соседних ячеек для поиска
+по радиусу.
+
+Профили хранят geohash максимальной точности; для поиска выбирается такая
+длина префикса, при которой ячейка не меньше радиуса, и тогда все точки
+в радиусе от центра лежат в центральной ячейке или в одной из восьми соседних.
+Такой отбор — это несколько диапазонных сканирований индекса по geohash.
+"""
+
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Кодирует координаты в geohash заданной длины."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            bounds[0] = middle
+        else:
+            bits <<= 1
+            bounds[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Размер ячейки geohash в градусах: (широта, долгота)."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 - lon_bits
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def precision_for_radius(latitude, radius_km):
+    """
+    Возвращает максимальную длину geohash, ячейка которой на данной широте
+    не меньше радиуса по обеим осям, или 0, если радиус больше любой ячейки.
+    """
+    lat_shift = min(radius_km / KM_PER_DEGREE, 90.0)
+    edge_latitude = min(abs(latitude) + lat_shift, 89.9)
+    lon_scale = math.cos(math.radians(edge_latitude))
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = cell_size(precision)
+        lat_km = lat_deg * KM_PER_DEGREE
+        lon_km = lon_deg * KM_PER_DEGREE * lon_scale
+        if lat_km >= radius_km and lon_km >= radius_km:
+            return precision
+    return 0
+
+
+def neighbour_cells(latitude, longitude, precision):
+    """Возвращает центральную ячейку и ее соседей (до девяти префиксов)."""
+    lat_deg, lon_deg = cell_size(precision)
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        lat = latitude + d_lat * lat_deg
+        if lat > 90.0 or lat < -90.0:
+            continue
+        for d_lon in (-1, 0, 1):
+            lon = (longitude + d_lon * lon_deg + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу между двумя точками в километрах."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def distance_expression(latitude, longitude):
+    """
+    Выражение для аннотации QuerySet профилей расстоянием (км) до точки.
+    """
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+    half_d_lat = (Radians(F("latitude")) - Value(lat0)) / 2
+    half_d_lon = (Radians(F("longitude")) - Value(lon0)) / 2
+    a = Power(Sin(half_d_lat), 2) + Value(math.cos(lat0)) * Cos(
+        Radians(F("latitude"))
+    ) * Power(Sin(half_d_lon), 2)
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a), output_field=FloatField())
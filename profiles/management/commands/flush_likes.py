@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from profiles.models import LikeCounterShard
+
+
+class Command(BaseCommand):
+    help = "Переносит накопленные в шардах лайки в Profile.likes_count."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Сколько профилей обновлять одним UPDATE.",
+        )
+
+    def handle(self, *args, **options):
+        flushed = LikeCounterShard.objects.flush(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Обновлено профилей: {flushed}."))
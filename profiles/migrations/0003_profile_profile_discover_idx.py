@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0002_remove_profile_avatar"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="profile",
+            index=models.Index(
+                fields=["gender", "status", "birth_date"], name="profile_discover_idx"
+            ),
+        ),
+    ]
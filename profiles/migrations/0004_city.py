@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копии profiles.models.clean_city_name и normalize_city_name на момент
+# миграции: миграция не должна зависеть от текущего кода моделей.
+def clean_city_name(name):
+    return " ".join(name.split())
+
+
+def normalize_city_name(name):
+    return clean_city_name(name).casefold().replace("ё", "е")
+
+
+def fill_city_ref(apps, schema_editor):
+    City = apps.get_model("profiles", "City")
+    Profile = apps.get_model("profiles", "Profile")
+
+    names = Profile.objects.exclude(city="").values_list("city", flat=True)
+    for name in list(names.distinct()):
+        city, _ = City.objects.get_or_create(
+            normalized_name=normalize_city_name(name),
+            defaults={"name": clean_city_name(name)},
+        )
+        Profile.objects.filter(city=name).update(city=city.name, city_ref=city)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0003_profile_profile_discover_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="City",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="Название")),
+                ("normalized_name", models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                "verbose_name": "Город",
+                "verbose_name_plural": "Города",
+            },
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="city_ref",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="profiles",
+                to="profiles.city",
+                verbose_name="Город из справочника",
+            ),
+        ),
+        migrations.RunPython(fill_city_ref, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0004_city"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="geohash",
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="latitude",
+            field=models.FloatField(blank=True, null=True, verbose_name="Широта"),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="longitude",
+            field=models.FloatField(blank=True, null=True, verbose_name="Долгота"),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:56
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_main_photo_path(apps, schema_editor):
+    Photo = apps.get_model("gallery", "Photo")
+    Profile = apps.get_model("profiles", "Profile")
+
+    main_photo = (
+        Photo.objects.filter(user_id=OuterRef("user_id"))
+        .order_by("-is_main", "-uploaded_at")
+        .values("image")[:1]
+    )
+    Profile.objects.update(main_photo_path=Coalesce(Subquery(main_photo), Value("")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gallery", "0001_initial"),
+        ("profiles", "0006_likecountershard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="main_photo_path",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_main_photo_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("profiles", "0008_profile_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="main_photo_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,7 +1,18 @@
+import random
+from collections import defaultdict
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+from users.cache import bump_cache_version
+
+from . import geo
+
 # Create your models here.
 STATUS_CHOICES = (
     ("search", "В поиске"),
@@ -16,6 +27,62 @@ GENDER_CHOICES = (
 )
 
 
+def clean_city_name(name):
+    """Убирает лишние пробелы в названии города."""
+    return " ".join(name.split())
+
+
+def normalize_city_name(name):
+    """Ключ для сравнения названий городов без учета регистра и «ё»."""
+    return clean_city_name(name).casefold().replace("ё", "е")
+
+
+class CityManager(models.Manager):
+    def canonicalize(self, name):
+        """
+        Возвращает город из справочника по произвольно введенному названию,
+        создавая его, если такого города еще нет.
+        """
+        city, created = self.get_or_create(
+            normalized_name=normalize_city_name(name),
+            defaults={"name": clean_city_name(name)},
+        )
+        if created:
+            from .cities import city_index
+
+            city_index.add(city)
+        return city
+
+
+class City(models.Model):
+    name = models.CharField(max_length=100, verbose_name="Название")
+    normalized_name = models.CharField(max_length=100, unique=True)
+
+    objects = CityManager()
+
+    class Meta:
+        verbose_name = "Город"
+        verbose_name_plural = "Города"
+
+    def __str__(self):
+        return self.name
+
+
+class ProfileQuerySet(models.QuerySet):
+    def with_pending_likes(self):
+        """
+        Добавляет аннотацию pending_likes — лайки, еще не перенесенные из
+        шардов счетчика в likes_count.
+        """
+        pending = (
+            LikeCounterShard.objects.filter(user_id=OuterRef("user_id"))
+            .values("user_id")
+            .annotate(total=Sum("delta"))
+            .values("total")
+        )
+        return self.annotate(pending_likes=Coalesce(Subquery(pending), 0))
+
+
 class Profile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile"
@@ -33,6 +100,18 @@ class Profile(models.Model):
     birth_date = models.DateField(null=False, blank=False, verbose_name="Дата рождения")
 
     city = models.CharField(max_length=100, blank=False)
+    city_ref = models.ForeignKey(
+        City,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="profiles",
+        verbose_name="Город из справочника",
+    )
+
+    latitude = models.FloatField(null=True, blank=True, verbose_name="Широта")
+    longitude = models.FloatField(null=True, blank=True, verbose_name="Долгота")
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)
 
     bio = models.TextField(
         max_length=500, blank=True, verbose_name="О себе и увлечения"
@@ -49,19 +128,72 @@ class Profile(models.Model):
 
     likes_count = models.PositiveIntegerField(default=0)
 
+    main_photo_path = models.CharField(max_length=255, blank=True, editable=False)
+    main_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProfileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["gender", "status", "birth_date"],
+                name="profile_discover_idx",
+            ),
+        ]
+
     @property
     def main_photo(self):
-        main = self.user.photos.filter(is_main=True).first()
-        if main:
-            return main.image.url
-        fallback = self.user.photos.first()
-        if fallback:
-            return fallback.image.url
-        return None
+        """
+        URL главной фотографии (или первой, если главная не выбрана) из
+        денормализованного пути, который поддерживает gallery.sync_main_photo.
+        """
+        if not self.main_photo_path:
+            return None
+
+        from gallery.models import Photo
+
+        return Photo._meta.get_field("image").storage.url(self.main_photo_path)
 
     def __str__(self):
         return f"Профиль пользователя {self.user.email}"
 
+    def _canonicalize_city(self):
+        """Приводит город к записи из справочника городов."""
+        if not self.city:
+            self.city_ref = None
+            return
+        if (
+            self.city_ref_id is not None
+            and Profile.city_ref.is_cached(self)
+            and self.city_ref.normalized_name == normalize_city_name(self.city)
+        ):
+            self.city = self.city_ref.name
+            return
+        self.city_ref = City.objects.canonicalize(self.city)
+        self.city = self.city_ref.name
+
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ""
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "city" in update_fields:
+            self._canonicalize_city()
+
+        if update_fields is not None:
+            extra_fields = {"updated_at"}
+            if {"latitude", "longitude"} & set(update_fields):
+                extra_fields.add("geohash")
+            if "city" in update_fields:
+                extra_fields.add("city_ref")
+            kwargs["update_fields"] = {*update_fields, *extra_fields}
+
+        super().save(*args, **kwargs)
+
     @property
     def age(self):
         if self.birth_date:
@@ -75,3 +207,89 @@ class Profile(models.Model):
                 )
             )
         return None
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    bump_cache_version(instance.user_id)
+
+
+class LikeCounterShardManager(models.Manager):
+    def increment(self, user_ids):
+        """
+        Добавляет по одному лайку каждому пользователю из user_ids. Все
+        инкременты пачки попадают в один случайный шард: параллельные лайки
+        одного популярного профиля распределяются по разным строкам и не
+        конкурируют за блокировку строки Profile.
+        """
+        shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+        self.bulk_create(
+            [LikeCounterShard(user_id=user_id, shard=shard) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        self.filter(user_id__in=user_ids, shard=shard).update(delta=F("delta") + 1)
+
+    def flush(self, batch_size=500):
+        """
+        Переносит накопленные дельты в Profile.likes_count пачками по
+        batch_size пользователей: один UPDATE профилей и один UPDATE шардов на
+        пачку. Возвращает количество обновленных профилей.
+        """
+        flushed = 0
+        while True:
+            with transaction.atomic():
+                shards = list(
+                    self.select_for_update()
+                    .exclude(delta=0)
+                    .order_by("user_id")
+                    .values_list("id", "user_id", "delta")[:batch_size]
+                )
+                if not shards:
+                    return flushed
+
+                totals = defaultdict(int)
+                for _, user_id, delta in shards:
+                    totals[user_id] += delta
+
+                Profile.objects.filter(user_id__in=totals).update(
+                    updated_at=timezone.now(),
+                    likes_count=F("likes_count")
+                    + Case(
+                        *[
+                            When(user_id=uid, then=Value(d))
+                            for uid, d in totals.items()
+                        ],
+                        output_field=models.IntegerField(),
+                    ),
+                )
+                self.filter(id__in=[shard_id for shard_id, _, _ in shards]).update(
+                    delta=F("delta")
+                    - Case(
+                        *[When(id=sid, then=Value(d)) for sid, _, d in shards],
+                        output_field=models.IntegerField(),
+                    )
+                )
+                flushed += len(totals)
+
+
+class LikeCounterShard(models.Model):
+    """
+    Шард счетчика лайков. Лайки сначала накапливаются в шардах, а затем
+    периодически переносятся в Profile.likes_count командой flush_likes.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="like_counter_shards",
+    )
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)
+
+    objects = LikeCounterShardManager()
+
+    class Meta:
+        verbose_name = "Шард счетчика лайков"
+        verbose_name_plural = "Шарды счетчика лайков"
+        unique_together = ("user", "shard")
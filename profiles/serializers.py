@@ -1,24 +1,62 @@
 from datetime import date, timedelta
 
+from django.db import models
 from rest_framework import serializers
 
+from gallery.models import Photo
+from gallery.renditions import rendition_urls
 from gallery.serializers import PhotoSerializer
-from matches.models import Swipe
+from matches.models import Match, Swipe
 
 from .models import Profile
 
 
+class MatchStatusListSerializer(serializers.ListSerializer):
+    """
+    Списочный сериализатор, который определяет взаимные симпатии для всех
+    пользователей страницы одним запросом и передает результат дочерним
+    сериализаторам через контекст (ключ "match_status").
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        items = list(data)
+
+        request = self.context.get("request")
+        if request and request.user.is_authenticated and items:
+            user_ids = [
+                getattr(item, self.child.Meta.match_user_id_field) for item in items
+            ]
+            matched_ids = set(
+                Match.objects.filter(
+                    user=request.user, partner_id__in=user_ids
+                ).values_list("partner_id", flat=True)
+            )
+            match_status = self.context.setdefault("match_status", {})
+            match_status.update(
+                {user_id: user_id in matched_ids for user_id in user_ids}
+            )
+
+        return super().to_representation(items)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     gender = serializers.CharField(source="get_gender_display")
     status = serializers.CharField(source="get_status_display")
     age = serializers.ReadOnlyField()
     main_photo_url = serializers.ReadOnlyField(source="main_photo")
+    main_photo_sizes = serializers.SerializerMethodField()
     is_matched = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
+    likes_count = serializers.SerializerMethodField()
 
     photos = PhotoSerializer(many=True, source="user.photos", read_only=True)
 
     class Meta:
         model = Profile
+        list_serializer_class = MatchStatusListSerializer
+        match_user_id_field = "user_id"
         fields = [
             "id",
             "user",
@@ -32,26 +70,59 @@ class ProfileSerializer(serializers.ModelSerializer):
             "bio",
             "status",
             "is_private",
+            "latitude",
+            "longitude",
+            "distance_km",
             "likes_count",
             "main_photo_url",
+            "main_photo_sizes",
             "is_matched",
             "photos",
         ]
+        extra_kwargs = {
+            "latitude": {"write_only": True, "min_value": -90, "max_value": 90},
+            "longitude": {"write_only": True, "min_value": -180, "max_value": 180},
+        }
         read_only_fields = [
             "user",
             "likes_count",
             "age",
             "main_photo_url",
+            "main_photo_sizes",
             "is_matched",
+            "distance_km",
             "photos",
         ]
 
+    def get_likes_count(self, obj):
+        """
+        Счетчик лайков; если QuerySet аннотирован with_pending_likes(),
+        учитываются и еще не перенесенные из шардов лайки.
+        """
+        return obj.likes_count + getattr(obj, "pending_likes", 0)
+
+    def get_main_photo_sizes(self, obj):
+        """Уменьшенные копии главной фотографии из денормализованного поля."""
+        return rendition_urls(
+            obj.main_photo_renditions, Photo._meta.get_field("image").storage
+        )
+
+    def get_distance_km(self, obj):
+        """Расстояние до профиля, если выдача строилась по радиусу."""
+        distance = getattr(obj, "distance_km", None)
+        if distance is None:
+            return None
+        return round(distance, 1)
+
     def get_is_matched(self, obj):
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            current_user = request.user
-            target_user = obj.user
-            return Swipe.check_match_exists(current_user, target_user)
+            if obj.user_id == request.user.id:
+                return False
+            match_status = self.context.get("match_status", {})
+            if obj.user_id in match_status:
+                return match_status[obj.user_id]
+            return Swipe.check_match_exists(request.user, obj.user_id)
         return False
 
     def to_representation(self, instance):
@@ -65,11 +136,27 @@ class ProfileSerializer(serializers.ModelSerializer):
         )
         ret.pop("birth_date", None)
 
+        if is_owner:
+            ret["latitude"] = instance.latitude
+            ret["longitude"] = instance.longitude
+
         if instance.is_private and not is_owner:
             ret["last_name"] = "Скрыто"
             ret.pop("birth_date", None)
         return ret
 
+    def validate(self, attrs):
+        """
+        Координаты задаются только парой: широта вместе с долготой.
+        """
+        latitude = attrs.get("latitude", getattr(self.instance, "latitude", None))
+        longitude = attrs.get("longitude", getattr(self.instance, "longitude", None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError(
+                "Широта и долгота должны указываться вместе."
+            )
+        return attrs
+
     def validate_birth_date(self, value):
         min_age_date = date.today() - timedelta(days=365 * 18 + 5)
         if value > min_age_date:
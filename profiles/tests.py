@@ -1,10 +1,13 @@
 import datetime
 
+from django.test import SimpleTestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from profiles.models import Profile
+from profiles import geo
+from profiles.cities import city_index
+from profiles.models import City, LikeCounterShard, Profile
 from users.models import CustomUser
 
 
@@ -34,6 +37,26 @@ class ProfileTests(APITestCase):
         self.assertEqual(response.data["first_name"], "Test")
         self.assertIn("is_matched", response.data)
 
+    def test_conditional_get_returns_not_modified(self):
+        """Повторный запрос с валидаторами получает 304, пока профиль не изменен."""
+        response = self.client.get(self.profile_url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            self.profile_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(self.profile_url, {"bio": "Обновлено"}, format="json")
+        response = self.client.get(self.profile_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
     def test_update_profile_city(self):
         """
         Проверяем, что пользователь может обновить свой город.
@@ -45,6 +68,59 @@ class ProfileTests(APITestCase):
         self.assertEqual(self.profile.city, "New City Name")
         self.assertEqual(response.data["city"], "New City Name")
 
+    def test_fresh_likes_count_includes_pending(self):
+        """
+        Проверяем, что ?fresh=true учитывает еще не перенесенные лайки.
+        """
+        LikeCounterShard.objects.increment([self.user.id])
+        LikeCounterShard.objects.increment([self.user.id])
+
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.data["likes_count"], 0)
+
+        response = self.client.get(self.profile_url, {"fresh": "true"})
+        self.assertEqual(response.data["likes_count"], 2)
+
+    def test_flush_likes(self):
+        """
+        Проверяем перенос лайков из шардов в Profile.likes_count.
+        """
+        for _ in range(5):
+            LikeCounterShard.objects.increment([self.user.id])
+
+        self.assertEqual(LikeCounterShard.objects.flush(), 1)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.likes_count, 5)
+        self.assertFalse(LikeCounterShard.objects.exclude(delta=0).exists())
+        self.assertEqual(LikeCounterShard.objects.flush(), 0)
+
+    def test_city_is_canonicalized(self):
+        """
+        Проверяем, что введенный город приводится к записи из справочника.
+        """
+        moscow = City.objects.canonicalize("Москва")
+
+        data = {"city": "  москва "}
+        response = self.client.patch(self.profile_url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.city, "Москва")
+        self.assertEqual(self.profile.city_ref, moscow)
+        self.assertEqual(City.objects.filter(name="Москва").count(), 1)
+
+    def test_city_is_canonicalized_on_model_save(self):
+        """Город приводится к справочнику и при сохранении профиля в обход API."""
+        self.assertEqual(self.profile.city_ref.name, "Test City")
+
+        self.profile.city = " test  CITY "
+        self.profile.save(update_fields=["city"])
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.city, "Test City")
+        self.assertEqual(City.objects.count(), 1)
+
     def test_age_validation(self):
         """
         Проверяем, что нельзя установить возраст младше 18 лет.
@@ -62,3 +138,63 @@ class ProfileTests(APITestCase):
         )
 
         self.assertNotIn("non_field_errors", response.data)
+
+
+class CityAutocompleteTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email="cities@example.com", password="password123"
+        )
+        for name in ("Москва", "Санкт-Петербург", "Петрозаводск", "Мурманск"):
+            City.objects.canonicalize(name)
+        city_index.rebuild()
+
+        self.url = reverse("city-autocomplete")
+        self.client.force_authenticate(user=self.user)
+
+    def test_prefix_search(self):
+        """
+        Проверяем поиск по началу названия и по началу слова в названии.
+        """
+        response = self.client.get(self.url, {"q": "пет"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [city["name"] for city in response.data],
+            ["Петрозаводск", "Санкт-Петербург"],
+        )
+
+    def test_new_city_is_searchable(self):
+        """
+        Проверяем, что новый город сразу доступен для автодополнения.
+        """
+        City.objects.canonicalize("Мытищи")
+
+        response = self.client.get(self.url, {"q": "м"})
+
+        self.assertEqual(
+            [city["name"] for city in response.data],
+            ["Москва", "Мурманск", "Мытищи"],
+        )
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode(self):
+        """
+        Проверяем кодирование на эталонном значении.
+        """
+        self.assertEqual(geo.encode(57.64911, 10.40744, precision=11), "u4pruydqqvj")
+
+    def test_neighbour_cells_cover_radius(self):
+        """
+        Проверяем, что точки в пределах радиуса попадают в отобранные ячейки.
+        """
+        latitude, longitude, radius_km = 55.7558, 37.6173, 5
+        precision = geo.precision_for_radius(latitude, radius_km)
+        cells = geo.neighbour_cells(latitude, longitude, precision)
+
+        self.assertLessEqual(len(cells), 9)
+        for d_lat, d_lon in ((0.044, 0), (-0.044, 0), (0, 0.078), (0.03, -0.05)):
+            point = (latitude + d_lat, longitude + d_lon)
+            self.assertLessEqual(geo.haversine_km(latitude, longitude, *point), 5)
+            self.assertIn(geo.encode(*point)[:precision], cells)
@@ -1,11 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import ProfileViewSet
+from .views import CityAutocompleteAPIView, ProfileViewSet
 
 router = DefaultRouter()
 router.register(r"profile", ProfileViewSet, basename="profile")
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("cities/", CityAutocompleteAPIView.as_view(), name="city-autocomplete"),
 ]
@@ -1,14 +1,18 @@
-from rest_framework import mixins, status, viewsets
+from rest_framework import mixins, status, views, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from users.conditional import ConditionalGetMixin
+
+from .cities import city_index
 from .models import Profile
 from .serializers import ProfileSerializer
 
 
 # Create your views here.
 class ProfileViewSet(
+    ConditionalGetMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -25,11 +29,37 @@ class ProfileViewSet(
     def get_queryset(self):
         """
         Гарантирует, что пользователь может видеть/редактировать только свой профиль.
+        С параметром ?fresh=true счетчик лайков учитывает еще не перенесенные
+        из шардов лайки.
+        """
+        queryset = Profile.objects.filter(user=self.request.user).select_related("user")
+        if self.request.query_params.get("fresh") in ("1", "true"):
+            queryset = queryset.with_pending_likes()
+        return queryset
+
+    def get_validators(self):
+        """
+        Валидатор профиля — его updated_at. С ?fresh счетчик лайков может
+        измениться без изменения профиля, поэтому условный ответ не дается.
         """
-        return Profile.objects.filter(user=self.request.user)
+        if self.action != "me" or self.request.query_params.get("fresh"):
+            return None
+
+        updated_at = (
+            Profile.objects.filter(user=self.request.user)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        if updated_at is None:
+            return None
+        return [updated_at.isoformat()], updated_at
 
     @action(detail=False, methods=["get", "put", "patch"])
     def me(self, request, *args, **kwargs):
+        not_modified = self.check_not_modified(request)
+        if not_modified is not None:
+            return not_modified
+
         profile = self.get_queryset().first()
         if not profile:
             return Response(
@@ -47,3 +77,20 @@ class ProfileViewSet(
             return Response(serializer.data)
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class CityAutocompleteAPIView(views.APIView):
+    """
+    API endpoint для автодополнения городов по префиксу: /api/cities/?q=мос
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "")
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 10)), 50))
+        except ValueError:
+            limit = 10
+
+        return Response(city_index.search(query, limit=limit))
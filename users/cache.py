@@ -0,0 +1,53 @@
+"""
+Версии пользовательского кэша ответов.
+
+Ключи закэшированных ответов включают текущую версию пользователя. Изменения,
+влияющие на его выдачу (свайпы, профиль, фотографии), увеличивают версию:
+старые записи перестают читаться и истекают по таймауту, удалять их по
+одной не нужно. Счетчик хранится в том же бэкенде кэша, поэтому схема
+работает и с locmem/file-кэшем на одном узле, и с общим кэшем для всех воркеров.
+"""
+
+import time
+
+from django.core.cache import cache
+
+CACHE_VERSION_KEY = "users:cache_version:{user_id}"
+
+
+def _cache_key(user_id, key_template):
+    return key_template.format(user_id=user_id)
+
+
+def _initial_version():
+    # Начальная версия зависит от времени: если счетчик вытеснен из кэша,
+    # новое значение не совпадет ни с одной из уже выданных версий.
+    return time.time_ns() // 1000
+
+
+def get_cache_version(user_id, key_template=CACHE_VERSION_KEY):
+    """
+    Возвращает текущую версию кэша пользователя. key_template задает
+    отдельный счетчик (по умолчанию — версия закэшированных ответов).
+    """
+    key = _cache_key(user_id, key_template)
+    version = cache.get(key)
+    if version is None:
+        version = _initial_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(user_id, key_template=CACHE_VERSION_KEY):
+    """
+    Инвалидирует закэшированные ответы пользователя (или записи счетчика
+    key_template). Возвращает новую версию.
+    """
+    key = _cache_key(user_id, key_template)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, None)
+        return version
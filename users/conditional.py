@@ -0,0 +1,73 @@
+"""
+Условные GET-запросы (ETag / Last-Modified).
+
+View считает дешевый валидатор ресурса (обычно один агрегирующий запрос по
+updated_at) до выборки и сериализации данных. Если клиент прислал совпадающий
+If-None-Match или If-Modified-Since, сразу возвращается 304 Not Modified.
+"""
+
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    Примесь для view, поддерживающих условные GET-запросы.
+
+    View переопределяет get_validators и возвращает пару
+    (список частей ETag, время последнего изменения или None) либо None,
+    если валидатор посчитать нельзя. Обработчик действия вызывает
+    check_not_modified(request) до основной работы.
+    """
+
+    def get_validators(self):
+        return None
+
+    def check_not_modified(self, request):
+        """Возвращает ответ 304, если ресурс не изменился, иначе None."""
+        if request.method not in ("GET", "HEAD"):
+            return None
+
+        validators = self.get_validators()
+        if validators is None:
+            return None
+
+        etag_parts, last_modified = validators
+        source = ":".join(
+            str(part)
+            for part in (
+                request.user.pk,
+                request.get_full_path(),
+                request.accepted_renderer.format,
+                *etag_parts,
+            )
+        )
+        self._etag = quote_etag(hashlib.sha1(source.encode()).hexdigest())
+        self._last_modified = (
+            int(last_modified.timestamp()) if last_modified is not None else None
+        )
+
+        response = get_conditional_response(
+            request, etag=self._etag, last_modified=self._last_modified
+        )
+        if response is not None:
+            self._patch_headers(response)
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "_etag", None) and response.status_code == 200:
+            self._patch_headers(response)
+        return response
+
+    def _patch_headers(self, response):
+        response["ETag"] = self._etag
+        if self._last_modified is not None:
+            response["Last-Modified"] = http_date(self._last_modified)
+        # Ответ зависит от пользователя: кэшировать только на клиенте и
+        # всегда перепроверять по валидатору.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Authorization", "Cookie"))
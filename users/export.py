@@ -0,0 +1,244 @@
+"""
+Потоковая выгрузка персональных данных пользователя.
+
+Архив собирается на лету: записи читаются из базы через QuerySet.iterator()
+(серверные курсоры там, где они поддерживаются), файлы фотографий читаются
+блоками, а готовые байты отдаются наружу по мере накопления. Поэтому расход
+памяти не зависит от объема истории пользователя.
+
+Поддерживаются два формата:
+- zip — по файлу NDJSON на раздел и оригиналы фотографий в photos/;
+- ndjson — один поток записей вида {"type": раздел, "data": запись}; файлы
+  фотографий идут в конце записями photo_file с содержимым в base64, по
+  записи на блок файла.
+"""
+
+import base64
+import json
+import os
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+EXPORT_FORMATS = ("zip", "ndjson")
+
+# Размер пачки строк, читаемых из базы за один раз.
+EXPORT_CHUNK_SIZE = 2000
+# Размер блока чтения файлов фотографий.
+FILE_CHUNK_SIZE = 64 * 1024
+# Сколько байт копить перед отдачей очередного куска ответа.
+STREAM_FLUSH_SIZE = 256 * 1024
+
+PROFILE_FIELDS = (
+    "first_name",
+    "last_name",
+    "middle_name",
+    "gender",
+    "birth_date",
+    "city",
+    "latitude",
+    "longitude",
+    "bio",
+    "status",
+    "is_private",
+    "likes_count",
+)
+
+
+class _StreamBuffer:
+    """Неперематываемый файловый объект, накапливающий записанные байты."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _line(record):
+    return (
+        json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+    ).encode("utf-8")
+
+
+def _sections(user):
+    """
+    Возвращает пары (раздел, итератор записей). QuerySet'ы ленивые: запрос
+    выполняется только при переходе к соответствующему разделу.
+    """
+    from gallery.models import Photo
+    from matches.models import ContactRequest, Match, MatchAction, Swipe
+    from profiles.models import Profile
+
+    def rows(queryset):
+        return queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    involved = Q(sender=user) | Q(receiver=user)
+
+    return (
+        (
+            "account",
+            iter(
+                [{"id": user.id, "email": user.email, "date_joined": user.date_joined}]
+            ),
+        ),
+        ("profile", rows(Profile.objects.filter(user=user).values(*PROFILE_FIELDS))),
+        (
+            "swipes",
+            rows(
+                Swipe.objects.for_user(user)
+                .order_by("id")
+                .values("swiped_user_id", "is_like", "timestamp")
+            ),
+        ),
+        (
+            "matches",
+            rows(
+                Match.objects.filter(user=user)
+                .order_by("id")
+                .values("partner_id", "created_at")
+            ),
+        ),
+        (
+            "match_actions",
+            rows(
+                MatchAction.objects.filter(involved)
+                .order_by("id")
+                .values("sender_id", "receiver_id", "sent_at")
+            ),
+        ),
+        (
+            "contact_requests",
+            rows(
+                ContactRequest.objects.filter(involved)
+                .order_by("id")
+                .values(
+                    "sender_id",
+                    "receiver_id",
+                    "status",
+                    "sent_at",
+                    "responded_at",
+                    "sender_contact_email",
+                    "receiver_contact_email",
+                )
+            ),
+        ),
+        (
+            "photos",
+            rows(
+                Photo.objects.filter(user=user)
+                .order_by("id")
+                .values("id", "image", "is_main", "position", "uploaded_at")
+            ),
+        ),
+    )
+
+
+def _photo_files(user):
+    """Возвращает пары (имя в архиве, Photo) для файлов фотографий."""
+    from gallery.models import Photo
+
+    photos = Photo.objects.filter(user=user).order_by("id").only("id", "image")
+    for photo in photos.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield f"photos/{photo.id}_{os.path.basename(photo.image.name)}", photo
+
+
+def _photo_file_records(user):
+    """
+    Записи photo_file: блоки файлов фотографий в base64 по порядку смещений.
+    Содержимое файла — конкатенация декодированных блоков с одним photo_id.
+    """
+    for name, photo in _photo_files(user):
+        try:
+            source = photo.image.open("rb")
+        except OSError:
+            continue
+
+        offset = 0
+        with source:
+            for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b""):
+                yield {
+                    "photo_id": photo.id,
+                    "name": name,
+                    "offset": offset,
+                    "content": base64.b64encode(chunk).decode("ascii"),
+                }
+                offset += len(chunk)
+
+
+def iter_ndjson_export(user):
+    """Отдает выгрузку одним потоком NDJSON."""
+    buffer = []
+    size = 0
+    sections = (*_sections(user), ("photo_file", _photo_file_records(user)))
+    for section, records in sections:
+        for record in records:
+            line = _line({"type": section, "data": record})
+            buffer.append(line)
+            size += len(line)
+            if size >= STREAM_FLUSH_SIZE:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_zip_export(user):
+    """
+    Отдает выгрузку zip-архивом. ZipFile пишет в неперематываемый буфер, поэтому
+    размеры и контрольные суммы записываются после данных каждого файла, а
+    готовые байты можно отдавать клиенту сразу.
+    """
+    buffer = _StreamBuffer()
+    date_time = timezone.localtime().timetuple()[:6]
+
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for section, records in _sections(user):
+            with archive.open(f"{section}.ndjson", "w") as entry:
+                for record in records:
+                    entry.write(_line(record))
+                    if buffer.size >= STREAM_FLUSH_SIZE:
+                        yield buffer.pop()
+
+        for name, photo in _photo_files(user):
+            # Изображения уже сжаты, поэтому хранятся без повторного сжатия.
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            try:
+                source = photo.image.open("rb")
+            except OSError:
+                continue
+
+            with source, archive.open(info, "w") as entry:
+                for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b""):
+                    entry.write(chunk)
+                    if buffer.size >= STREAM_FLUSH_SIZE:
+                        yield buffer.pop()
+
+    yield buffer.pop()
+
+
+def iter_export(user, export_format="zip"):
+    """Возвращает итератор байтов выгрузки в заданном формате."""
+    if export_format == "ndjson":
+        return iter_ndjson_export(user)
+    return iter_zip_export(user)
+
+
+def export_filename(user, export_format="zip"):
+    return f"relatehub-export-{user.id}.{export_format}"
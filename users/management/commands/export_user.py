@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from users.export import EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Выгружает персональные данные пользователя в zip- или NDJSON-файл."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="Email или id пользователя.")
+        parser.add_argument("output", help="Путь к файлу выгрузки.")
+        parser.add_argument(
+            "--format",
+            dest="export_format",
+            choices=EXPORT_FORMATS,
+            default="zip",
+            help="Формат выгрузки.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        identifier = options["user"]
+        lookup = {"id": identifier} if identifier.isdigit() else {"email": identifier}
+
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {identifier} не найден.")
+
+        written = 0
+        with open(options["output"], "wb") as output:
+            for chunk in iter_export(user, options["export_format"]):
+                output.write(chunk)
+                written += len(chunk)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Выгрузка пользователя {user.email} записана в {options['output']} "
+                f"({written} байт)."
+            )
+        )
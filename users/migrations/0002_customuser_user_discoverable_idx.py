@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_staff", False)),
+                fields=["id"],
+                name="user_discoverable_idx",
+            ),
+        ),
+    ]
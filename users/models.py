@@ -1,6 +1,7 @@
 from django.contrib.auth.models import (AbstractBaseUser, PermissionsMixin,
                                         UserManager)
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
@@ -44,5 +45,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            # Кандидаты для колоды рекомендаций: активные пользователи без
+            # прав персонала, просматриваемые по возрастанию id.
+            models.Index(
+                fields=["id"],
+                condition=Q(is_active=True, is_staff=False),
+                name="user_discoverable_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.email
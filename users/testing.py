@@ -0,0 +1,123 @@
+"""
+Проверки бюджета запросов эндпоинтов для тестов.
+
+QueryBudgetMixin.assertQueryBudget запрашивает эндпоинт дважды, каждый раз
+после добавления строк в ответ, и проверяет, что число запросов к базе не
+превышает бюджет и не растет вместе с ответом (признак N+1). На PostgreSQL
+для каждого SELECT по таблицам из WATCHED_MODELS дополнительно строится план
+(EXPLAIN с выключенным enable_seqscan) и последовательное чтение этих таблиц
+считается ошибкой: оно остается в плане, только если подходящего индекса нет.
+"""
+
+import re
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver
+
+# Таблицы, последовательное чтение которых недопустимо.
+WATCHED_MODELS = ("matches.Swipe", "profiles.Profile", "matches.ContactRequest")
+# Сколько строк добавлять в ответ перед первым и вторым запросом.
+FANOUT = (2, 5)
+
+
+def _walk(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def collection_routes(app_labels):
+    """
+    Имена GET-маршрутов приложений app_labels без параметров в URL —
+    списков и других ответов, размер которых зависит от данных.
+    """
+    names = set()
+    for pattern in _walk(get_resolver().url_patterns):
+        callback = pattern.callback
+        if callback.__module__.split(".")[0] not in app_labels:
+            continue
+        if pattern.pattern.regex.groups:
+            continue
+
+        actions = getattr(callback, "actions", None)
+        if actions is not None:
+            allows_get = "get" in actions
+        else:
+            allows_get = hasattr(getattr(callback, "view_class", None), "get")
+        if allows_get and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def _watched_tables():
+    return [apps.get_model(label)._meta.db_table for label in WATCHED_MODELS]
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, url, seed, max_queries, params=None):
+        """
+        Вызывает seed(n) перед каждым из двух GET-запросов к url; seed должен
+        добавить n строк в ответ. Проверяет, что ответ вырос, а число
+        запросов одинаково и не больше max_queries.
+        """
+        counts = []
+        sizes = []
+        for rows in FANOUT:
+            seed(rows)
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, params)
+                if response.streaming:
+                    content = b"".join(response.streaming_content)
+                else:
+                    content = response.content
+
+            self.assertEqual(response.status_code, 200, content[:500])
+            self.assertNoSequentialScans(context.captured_queries)
+            counts.append(len(context.captured_queries))
+            sizes.append(len(content))
+
+        self.assertGreater(sizes[1], sizes[0], f"{url}: seed не меняет ответ")
+        self.assertEqual(
+            counts[0],
+            counts[1],
+            f"{url}: число запросов растет с размером ответа ({counts})",
+        )
+        self.assertLessEqual(
+            counts[1], max_queries, f"{url}: {counts[1]} запросов вместо {max_queries}"
+        )
+
+    def assertNoSequentialScans(self, queries):
+        """На PostgreSQL проверяет планы SELECT-запросов к WATCHED_MODELS."""
+        if connection.vendor != "postgresql":
+            return
+
+        tables = _watched_tables()
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                for query in queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    if not any(f'"{table}"' in sql for table in tables):
+                        continue
+
+                    cursor.execute(f"EXPLAIN {sql}")
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                    scanned = [
+                        table
+                        for table in tables
+                        if re.search(rf"Seq Scan on {table}\b", plan)
+                    ]
+                    self.assertFalse(
+                        scanned,
+                        f"Последовательное чтение {', '.join(scanned)}:\n{sql}\n{plan}",
+                    )
+            finally:
+                cursor.execute("RESET enable_seqscan")
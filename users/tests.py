@@ -1,8 +1,27 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from functools import partial
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from gallery.models import Photo
+from matches.graph import load_like_graph, reset_like_graph
+from matches.models import ContactRequest, DeckCard, DiscoverDeck, Swipe
+from profiles.models import City, Profile
 from users.models import CustomUser
+from users.testing import QueryBudgetMixin, collection_routes
 
 
 class UserAuthenticationTests(APITestCase):
@@ -43,3 +62,270 @@ class UserAuthenticationTests(APITestCase):
         data = {"email": "invalid-email", "password": "password"}
         response = self.client.post(self.register_url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("user-export")
+        self.user = CustomUser.objects.create_user(email="me@test.com", password="p")
+        self.other = CustomUser.objects.create_user(
+            email="other@test.com", password="p"
+        )
+        Profile.objects.create(
+            user=self.user, first_name="Я", birth_date=date(1995, 1, 1), city="Москва"
+        )
+        Swipe.objects.create(swiper=self.user, swiped_user=self.other, is_like=True)
+        Swipe.objects.create(swiper=self.other, swiped_user=self.user, is_like=True)
+        ContactRequest.objects.create(sender=self.other, receiver=self.user)
+        self.photo = Photo.objects.create(
+            user=self.user,
+            image=SimpleUploadedFile(
+                "me.gif", b"GIF89a-data", content_type="image/gif"
+            ),
+        )
+
+    def tearDown(self):
+        for photo in Photo.objects.all():
+            photo.image.delete(save=False)
+
+    def test_zip_export(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        swipes = archive.read("swipes.ndjson").decode().splitlines()
+        self.assertEqual(len(swipes), 1)
+        self.assertEqual(json.loads(swipes[0])["swiped_user_id"], self.other.id)
+        self.assertEqual(len(archive.read("matches.ndjson").splitlines()), 1)
+        self.assertEqual(len(archive.read("contact_requests.ndjson").splitlines()), 1)
+        self.assertEqual(json.loads(archive.read("profile.ndjson"))["first_name"], "Я")
+
+        photo_name = f"photos/{self.photo.id}_{os.path.basename(self.photo.image.name)}"
+        self.assertEqual(archive.read(photo_name), b"GIF89a-data")
+
+    def test_ndjson_export(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"archive": "ndjson"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        types = [record["type"] for record in records]
+        self.assertEqual(types.count("swipes"), 1)
+        self.assertEqual(types.count("photos"), 1)
+        self.assertEqual(records[0]["data"]["email"], self.user.email)
+
+        # Файлы фотографий встроены блоками в base64, как photos/ в zip.
+        blocks = [
+            record["data"] for record in records if record["type"] == "photo_file"
+        ]
+        self.assertEqual({block["photo_id"] for block in blocks}, {self.photo.id})
+        content = b"".join(base64.b64decode(block["content"]) for block in blocks)
+        self.assertEqual(content, b"GIF89a-data")
+
+    @mock.patch("users.export.FILE_CHUNK_SIZE", 4)
+    def test_ndjson_export_splits_photo_files(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"archive": "ndjson"})
+
+        blocks = [
+            json.loads(line)["data"]
+            for line in b"".join(response.streaming_content).decode().splitlines()
+            if json.loads(line)["type"] == "photo_file"
+        ]
+        self.assertEqual([block["offset"] for block in blocks], [0, 4, 8])
+        content = b"".join(base64.b64decode(block["content"]) for block in blocks)
+        self.assertEqual(content, b"GIF89a-data")
+
+    def test_export_rejects_unknown_format(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {"archive": "tar"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_requires_authentication(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_user_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.zip")
+            call_command("export_user", self.user.email, path, stdout=io.StringIO())
+
+            with zipfile.ZipFile(path) as archive:
+                self.assertIn("swipes.ndjson", archive.namelist())
+
+
+@override_settings(CITY_INDEX_TTL=-1)
+class EndpointQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Бюджет запросов GET-маршрутов коллекций: тест test_<имя маршрута> на
+    каждый маршрут, число запросов не растет с числом строк в ответе.
+    """
+
+    APPS = ("users", "profiles", "matches", "gallery")
+
+    def setUp(self):
+        self.counter = 0
+        self.user = self.make_user()
+        self.client.force_authenticate(user=self.user)
+
+    def make_user(self):
+        """Пользователь с профилем и двумя обработанными фотографиями."""
+        self.counter += 1
+        user = CustomUser.objects.create_user(
+            email=f"user{self.counter}@budget.com", password="p"
+        )
+        Profile.objects.create(user=user, birth_date=date(1995, 1, 1), gender="F")
+        Photo.objects.bulk_create(
+            Photo(
+                user=user,
+                image=f"profile_photos/{user.id}-{position}.jpg",
+                is_main=position == 0,
+                position=position,
+                status=Photo.Status.READY,
+            )
+            for position in range(2)
+        )
+        return user
+
+    def add_photos(self, rows):
+        start = self.user.photos.count()
+        Photo.objects.bulk_create(
+            Photo(
+                user=self.user,
+                image=f"profile_photos/{self.user.id}-{position}.jpg",
+                position=position,
+                status=Photo.Status.READY,
+            )
+            for position in range(start, start + rows)
+        )
+
+    def make_users(self, rows):
+        return [self.make_user() for _ in range(rows)]
+
+    def swipe(self, rows, is_like=True, incoming=False):
+        for other in self.make_users(rows):
+            swiper, target = (other, self.user) if incoming else (self.user, other)
+            Swipe.objects.create(swiper=swiper, swiped_user=target, is_like=is_like)
+
+    def match(self, rows):
+        for other in self.make_users(rows):
+            Swipe.objects.create(swiper=other, swiped_user=self.user, is_like=True)
+            Swipe.objects.create(swiper=self.user, swiped_user=other, is_like=True)
+
+    def test_every_collection_route_has_budget(self):
+        budgeted = {
+            name.removeprefix("test_").replace("_", "-")
+            for name in dir(self)
+            if name.startswith("test_")
+        }
+        self.assertEqual(collection_routes(self.APPS) - budgeted, set())
+
+    def test_user_list(self):
+        self.assertQueryBudget(reverse("user-list"), self.make_users, 2)
+
+    def test_user_export(self):
+        self.assertQueryBudget(
+            reverse("user-export"), self.swipe, 7, {"archive": "ndjson"}
+        )
+
+    def test_profile_me(self):
+        self.assertQueryBudget(reverse("profile-me"), self.add_photos, 3)
+
+    def test_city_autocomplete(self):
+        def seed(rows):
+            for _ in range(rows):
+                self.counter += 1
+                City.objects.canonicalize(f"Городок {self.counter}")
+
+        self.assertQueryBudget(reverse("city-autocomplete"), seed, 1, {"q": "гор"})
+
+    def test_match_list(self):
+        self.assertQueryBudget(reverse("match-list"), self.match, 4)
+
+    def test_match_history(self):
+        self.assertQueryBudget(reverse("match-history"), self.swipe, 3)
+
+    def test_match_liked(self):
+        self.assertQueryBudget(reverse("match-liked"), self.swipe, 3)
+
+    def test_match_disliked(self):
+        self.assertQueryBudget(
+            reverse("match-disliked"), partial(self.swipe, is_like=False), 3
+        )
+
+    def test_match_received(self):
+        self.assertQueryBudget(
+            reverse("match-received"), partial(self.swipe, incoming=True), 3
+        )
+
+    @override_settings(LIKE_GRAPH_ENABLED=True)
+    def test_like_graph_check(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=["is_staff"])
+        reset_like_graph()
+        self.addCleanup(reset_like_graph)
+        graph = load_like_graph()
+
+        def seed(rows):
+            self.match(rows)
+            graph.refresh()
+
+        self.assertQueryBudget(reverse("like-graph-check"), seed, 3)
+
+    def test_contact_request_list(self):
+        def seed(rows):
+            for other in self.make_users(rows):
+                ContactRequest.objects.create(sender=other, receiver=self.user)
+
+        self.assertQueryBudget(reverse("contact-request-list"), seed, 2)
+
+    def test_photo_list(self):
+        self.assertQueryBudget(reverse("photo-list"), self.add_photos, 3)
+
+    def add_deck_cards(self, rows):
+        DeckCard.objects.bulk_create(
+            DeckCard(owner=self.user, candidate=other)
+            for other in self.make_users(rows)
+        )
+
+    @override_settings(DISCOVER_DECK_LOW_WATERMARK=1)
+    def test_discover_list(self):
+        # Колода свежая и полная: только чтение колоды.
+        DiscoverDeck.objects.create(owner=self.user, refilled_at=timezone.now())
+
+        self.assertQueryBudget(reverse("discover-list"), self.add_deck_cards, 4)
+
+    def test_discover_list_short_deck(self):
+        # Колода ниже порога пополнения: запрос ставит ее в очередь, само
+        # пополнение выполняет refill_decks.
+        DiscoverDeck.objects.create(owner=self.user, refilled_at=timezone.now())
+
+        self.assertQueryBudget(reverse("discover-list"), self.add_deck_cards, 5)
+        self.assertIsNotNone(
+            DiscoverDeck.objects.get(owner=self.user).refill_requested_at
+        )
+
+    @override_settings(DISCOVER_DECK_LOW_WATERMARK=1)
+    def test_discover_list_stale_deck(self):
+        # Оценки колоды устарели: запрос ставит ее в очередь на переоценку.
+        DiscoverDeck.objects.create(
+            owner=self.user, refilled_at=timezone.now() - timedelta(days=1)
+        )
+
+        self.assertQueryBudget(reverse("discover-list"), self.add_deck_cards, 5)
+        self.assertIsNotNone(
+            DiscoverDeck.objects.get(owner=self.user).refill_requested_at
+        )
+
+    def test_discover_list_filtered(self):
+        # С фильтрами кандидаты выбираются живым запросом мимо колоды.
+        self.assertQueryBudget(
+            reverse("discover-list"), self.make_users, 3, {"gender": "F"}
+        )
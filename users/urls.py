@@ -1,11 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CustomUserViewSet
+from .views import CustomUserViewSet, ExportAPIView
 
 router = DefaultRouter()
 router.register(r"users", CustomUserViewSet, basename="user")
 
 urlpatterns = [
+    path("me/export/", ExportAPIView.as_view(), name="user-export"),
     path("", include(router.urls)),
 ]
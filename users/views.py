@@ -1,7 +1,10 @@
-from rest_framework import status, viewsets
+from django.http import StreamingHttpResponse
+from rest_framework import status, views, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from .export import EXPORT_FORMATS, export_filename, iter_export
 from .models import CustomUser
 from .serializers import CustomUserCreateSerializer, CustomUserSerializer
 
@@ -14,7 +17,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     пользователей через этот ViewSet напрямую (регистрация будет отдельным процессом).
     """
 
-    queryset = CustomUser.objects.all().order_by("-date_joined")
+    queryset = CustomUser.objects.select_related("profile").order_by("-date_joined")
     serializer_class = CustomUserSerializer
     permission_classes = [AllowAny]
 
@@ -47,3 +50,33 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
+
+
+class ExportAPIView(views.APIView):
+    """
+    Потоковая выгрузка персональных данных текущего пользователя:
+    свайпы, мэтчи, запросы на контакт, профиль и фотографии.
+    Параметр archive выбирает формат: zip (по умолчанию) или ndjson.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    content_types = {
+        "zip": "application/zip",
+        "ndjson": "application/x-ndjson",
+    }
+
+    def get(self, request):
+        export_format = request.query_params.get("archive", "zip")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"archive": f"Допустимые форматы: {', '.join(EXPORT_FORMATS)}."}
+            )
+
+        response = StreamingHttpResponse(
+            iter_export(request.user, export_format),
+            content_type=self.content_types[export_format],
+        )
+        filename = export_filename(request.user, export_format)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response